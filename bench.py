@@ -0,0 +1,518 @@
+from contextlib import redirect_stdout
+from itertools import cycle, islice
+from parsers import available_backends, convert_to_number, extract_table_data, extract_token_rows, get_backend, raw_trader_row
+from types import SimpleNamespace
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+# Benchmarks for the parsers, the numeric conversion, the database writes and the read API,
+# run against the recorded pages in fixtures/ and a scratch SQLite database. The scrape group
+# drives Chrome against stub_server.py and only runs when asked for.
+#
+#   python bench.py                                   run everything but scrape
+#   python bench.py --only parse convert              run some groups
+#   python bench.py --save bench_baseline.json        write the results as the new baseline
+#   python bench.py --compare bench_baseline.json     fail on regressions against the baseline
+#   python bench.py --write-fixtures                  regenerate fixtures/
+
+FIXTURES_DIR = os.getenv('BENCH_FIXTURES', 'fixtures')
+TOKEN_FIXTURE = os.path.join('pages', 'index.html')
+TRADER_FIXTURE = os.path.join('fragments', 'top-traders', '{period}.html')
+PERIODS = ['30d', '7d', '3d', '1d']
+
+# Scratch database, recreated on every run
+BENCH_DATABASE = os.getenv('BENCH_DATABASE', 'bench.db')
+# Minimum time spent on each CPU benchmark, it is repeated until then
+BENCH_MIN_TIME = float(os.getenv('BENCH_MIN_TIME', '1'))
+# Token rows written by the store benchmarks, and tokens whose four top traders tables are written
+BENCH_TOKENS = int(os.getenv('BENCH_TOKENS', '2000'))
+BENCH_TRADER_TOKENS = int(os.getenv('BENCH_TRADER_TOKENS', '50'))
+# Requests per API benchmark and how many are in flight at once
+BENCH_API_REQUESTS = int(os.getenv('BENCH_API_REQUESTS', '2000'))
+BENCH_API_CONCURRENCY = int(os.getenv('BENCH_API_CONCURRENCY', '50'))
+# Tokens visited by the scrape benchmark and the stub server latency per response
+BENCH_SCRAPE_TOKENS = int(os.getenv('BENCH_SCRAPE_TOKENS', '5'))
+BENCH_STUB_LATENCY = float(os.getenv('BENCH_STUB_LATENCY', '0.05'))
+# Times every group is run; each result is the median over the runs, which evens out a slow
+# or fast run of the machine
+BENCH_RUNS = int(os.getenv('BENCH_RUNS', '3'))
+# Relative change that counts as a regression in --compare; 3-run medians of the parse and
+# convert groups spread up to 35% between invocations on one machine
+BENCH_TOLERANCE = float(os.getenv('BENCH_TOLERANCE', '0.5'))
+
+GROUPS = ['parse', 'convert', 'store', 'api', 'startup', 'scrape']
+# The groups bench_baseline.json covers; store, api and startup need a generated Prisma client
+DEFAULT_GROUPS = ['parse', 'convert']
+
+# Fixtures: DexScreener markup filled with seeded random values
+
+TOKEN_HEADERS = ['Token', 'Price', 'Age', 'Txns', 'Volume', 'Makers', '5M', '1H', '6H', '24H', 'Liquidity', 'MCAP']
+CHAINS = [('Solana', 'Raydium'), ('Solana', 'Orca'), ('Ethereum', 'Uniswap'), ('Base', 'Aerodrome'), ('BSC', 'PancakeSwap')]
+BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+TOKEN_PAGE = """<!DOCTYPE html>
+<html><body><main>
+<div class="ds-dex-table ds-dex-table-top">
+<div class="ds-table-head">{headers}</div>
+{rows}
+</div>
+</main></body></html>
+"""
+
+TOKEN_ROW = """<a class="ds-dex-table-row ds-dex-table-row-top" href="/{chain_slug}/{address}">\
+<div class="ds-table-data-cell ds-dex-table-row-col-token">\
+<span class="ds-dex-table-row-badge-pair-no">#{rank}</span>\
+<img class="ds-dex-table-row-chain-icon" title="{chain}" src="/img/{chain_slug}.png">\
+<img class="ds-dex-table-row-dex-icon" title="{dex}" src="/img/{dex_slug}.png">\
+<span class="ds-dex-table-row-base-token-symbol">{symbol}</span>\
+<span class="ds-dex-table-row-quote-token-symbol">/SOL</span></div>\
+{cells}</a>"""
+
+TRADER_ROW = """<div class="custom-1nvxwu0">\
+<div class="custom-q9k0mw">#{rank}</div>\
+<div class="custom-1dwgrrr"><a href="https://solscan.io/account/{wallet}" target="_blank">{short_wallet}</a></div>\
+<div class="custom-1o79wax">{bought}</div>\
+<div class="custom-1o79wax">{sold}</div>\
+<div class="{pnl_class}">{pnl}</div>\
+<div class="custom-1hd7h4r">{unrealized}</div>\
+<div class="custom-1cicvqe">{balance}</div>\
+<div class="custom-13ppmr2">{buys} / {sells} txns</div>\
+</div>"""
+
+def display_number(rng, low, high, prefix='$'):
+    # Formats like the site: "$1.2M", "$845.12", "<$0.01"
+    value = 10 ** rng.uniform(low, high)
+    for suffix, size in (('B', 1e9), ('M', 1e6), ('K', 1e3)):
+        if value >= size:
+            return f"{prefix}{value / size:.1f}{suffix}"
+    if value < 0.01:
+        return f"<{prefix}0.01"
+    return f"{prefix}{value:,.2f}"
+
+def display_percent(rng):
+    value = rng.uniform(-60, 250)
+    return '-' if rng.random() < 0.05 else f"{value:+,.2f}%"
+
+def random_address(rng, length=44):
+    return ''.join(rng.choice(BASE58) for _ in range(length))
+
+def token_page(rng, count):
+    headers = ''.join(f'<button class="ds-table-th-button">{header}</button>' for header in TOKEN_HEADERS)
+    rows = []
+    for rank in range(1, count + 1):
+        chain, dex = rng.choice(CHAINS)
+        cells = [
+            display_number(rng, -6, 2),
+            f"{rng.randint(1, 23)}{rng.choice(['m', 'h', 'd'])}",
+            f"{rng.randint(10, 250000):,}",
+            display_number(rng, 3, 8),
+            f"{rng.randint(5, 40000):,}",
+            display_percent(rng), display_percent(rng), display_percent(rng), display_percent(rng),
+            display_number(rng, 3, 7),
+            display_number(rng, 4, 9),
+        ]
+        rows.append(TOKEN_ROW.format(
+            chain_slug=chain.lower(), dex_slug=dex.lower(), address=random_address(rng), rank=rank,
+            chain=chain, dex=dex, symbol=''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rng.randint(3, 6))),
+            cells=''.join(f'<div class="ds-table-data-cell">{cell}</div>' for cell in cells),
+        ))
+    return TOKEN_PAGE.format(headers=headers, rows='\n'.join(rows))
+
+def trader_table(rng, count):
+    rows = []
+    for rank in range(1, count + 1):
+        wallet = random_address(rng)
+        bought = (f'<span class="custom-rcecxm">{display_number(rng, 1, 6)}</span>'
+                  f'<span class="custom-2ygcmq">{display_number(rng, 3, 9, prefix="")}</span>')
+        if rng.random() < 0.2:
+            sold = '<span class="custom-dv3t8y">-</span>'
+        else:
+            sold = (f'<span class="custom-dv3t8y">{display_number(rng, 1, 6)}</span>'
+                    f'<span class="custom-2ygcmq">{display_number(rng, 3, 9, prefix="")}</span>')
+        if rng.random() < 0.1:
+            balance = '<span class="custom-sqw9c5">Unknown</span>'
+        else:
+            balance = (f'<span class="custom-2ygcmq">{display_number(rng, 0, 8, prefix="")}</span>'
+                       f'<span class="custom-2ygcmq">{display_number(rng, 8, 10, prefix="")}</span>')
+        rows.append(TRADER_ROW.format(
+            rank=rank, wallet=wallet, short_wallet=f"{wallet[:4]}...{wallet[-4:]}", bought=bought, sold=sold,
+            pnl_class=rng.choice(['custom-1e9y0rl', 'custom-1yklr7h']), pnl=display_number(rng, 0, 6),
+            unrealized=f'<span class="custom-6qd5i2">{display_number(rng, 0, 5)}</span>' if rng.random() < 0.7 else '-',
+            balance=balance, buys=rng.randint(1, 200), sells=rng.randint(0, 200),
+        ))
+    return '\n'.join(rows)
+
+def write_fixtures(directory=FIXTURES_DIR, tokens=100, traders=100, seed=1):
+    # Laid out as a stub_server.py recordings directory; a saved rows.html or real top traders
+    # table can be dropped in place of the generated files
+    rng = random.Random(seed)
+    files = {TOKEN_FIXTURE: token_page(rng, tokens)}
+    for period in PERIODS:
+        files[TRADER_FIXTURE.format(period=period)] = trader_table(rng, traders)
+    for name, content in files.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content + '\n')
+        print(f"Wrote {path}")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+# Measurement
+
+def result(value, unit, better='higher', **details):
+    return {'value': value, 'unit': unit, 'better': better, **details}
+
+def measure(func, min_time=BENCH_MIN_TIME, min_rounds=3):
+    # Median seconds per call, after one warm-up call
+    func()
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_rounds or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def quiet():
+    # The store functions log every write, which would drown the report
+    return redirect_stdout(io.StringIO())
+
+# Benchmarks
+
+def bench_parse():
+    results = {}
+    token_html = read_fixture(TOKEN_FIXTURE)
+    trader_html = read_fixture(TRADER_FIXTURE.format(period='30d'))
+    for backend in available_backends():
+        rows = len(extract_table_data(trader_html, backend))
+        seconds = measure(lambda: extract_table_data(trader_html, backend))
+        results[f'parse_top_traders[{backend}]'] = result(rows / seconds, 'rows/s')
+        rows = len(extract_token_rows(token_html, backend))
+        seconds = measure(lambda: extract_token_rows(token_html, backend))
+        results[f'parse_tokens[{backend}]'] = result(rows / seconds, 'rows/s')
+    return results
+
+def display_values():
+    # Every display string convert_to_number sees in the recorded top traders tables
+    p = get_backend('html.parser')
+    values = []
+    for period in PERIODS:
+        root = p.parse(read_fixture(TRADER_FIXTURE.format(period=period)))
+        for row in p.select(root, 'trader_row'):
+            raw = raw_trader_row(p, row)
+            values.extend(value for value in (raw['bought'], raw['boughtVolume'], raw['sold'], raw['soldVolume'],
+                                              raw['pnl'], raw['unrealized'], *raw['balance']) if value is not None)
+    return values
+
+def bench_convert():
+    import pandas as pd
+    from convert import TOKEN_NUMERIC_COLUMNS, normalize_tokens, to_numeric
+
+    values = display_values()
+
+    def convert_all():
+        for value in values:
+            convert_to_number(value)
+
+    results = {'convert_to_number': result(len(values) / measure(convert_all), 'values/s')}
+    # The same values once, mostly distinct, and repeated like the columns of a large store
+    distinct = pd.Series(values)
+    results['to_numeric[distinct]'] = result(len(distinct) / measure(lambda: to_numeric(distinct)), 'values/s')
+    series = pd.Series(values * 100)
+    results['to_numeric'] = result(len(series) / measure(lambda: to_numeric(series)), 'values/s')
+    rows = token_rows(BENCH_TOKENS)
+    # The columns tokens.store_to_database asks for
+    columns = list(rows[0]._fields) + list(TOKEN_NUMERIC_COLUMNS.values())
+    results['normalize_tokens'] = result(len(rows) / measure(lambda: normalize_tokens(rows, columns)), 'rows/s')
+    return results
+
+def token_rows(count):
+    # Fixture rows repeated under distinct addresses
+    rows = extract_token_rows(read_fixture(TOKEN_FIXTURE), 'html.parser')
+    return [row._replace(address=f"{row.address[:36]}{i:08d}") for i, row in enumerate(islice(cycle(rows), count))]
+
+def trader_rows(token_count):
+    # [tokenAddress, period, *TraderRow] for every period of every token
+    tables = {period: extract_table_data(read_fixture(TRADER_FIXTURE.format(period=period)), 'html.parser')
+              for period in PERIODS}
+    addresses = [row.address for row in token_rows(token_count)]
+    return [[address, period, *row] for address in addresses for period in PERIODS for row in tables[period]]
+
+def prepare_database(path=BENCH_DATABASE):
+    # A fresh SQLite file with the current schema; needs a Prisma client generated for sqlite
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ['DATABASE_PROVIDER'] = 'sqlite'
+    os.environ['DATABASE_URL'] = f"file:{os.path.abspath(path)}"
+    subprocess.run([sys.executable, '-m', 'prisma', 'db', 'push', '--skip-generate', '--accept-data-loss'],
+                   check=True, capture_output=True)
+
+async def timed_store(store, rows, *args):
+    start = time.perf_counter()
+    with quiet():
+        await store(rows, *args)
+    return time.perf_counter() - start
+
+async def bench_store():
+    from prisma import Prisma
+    import tokens
+    import toptraders
+
+    results = {}
+    db = Prisma()
+    await db.connect()
+    try:
+        # insert: empty tables, update: every row changed, unchanged: skipped by the fingerprints
+        rows = token_rows(BENCH_TOKENS)
+        changed = [row._replace(price=f"${i}.{i % 97}") for i, row in enumerate(rows)]
+        for label, data in (('insert', rows), ('update', changed), ('unchanged', changed)):
+            seconds = await timed_store(tokens.store_to_database, data, db)
+            results[f'store_tokens[{label}]'] = result(len(data) / seconds, 'rows/s', rows=len(data))
+
+        rows = trader_rows(BENCH_TRADER_TOKENS)
+        pnl = toptraders.TOP_TRADER_COLUMNS.index('pnl')
+        changed = [row[:pnl] + [f"{i}.5"] + row[pnl + 1:] for i, row in enumerate(rows)]
+        for label, data in (('insert', rows), ('update', changed), ('unchanged', changed)):
+            seconds = await timed_store(toptraders.store_to_database, data, db, True)
+            results[f'store_top_traders[{label}]'] = result(len(data) / seconds, 'rows/s', rows=len(data))
+    finally:
+        await db.disconnect()
+    return results
+
+async def run_load(client, paths, requests, concurrency):
+    latencies = []
+    pending = iter(islice(cycle(paths), requests))
+
+    async def worker():
+        # The iterator is shared, each worker takes the next path until none are left
+        for path in pending:
+            start = time.perf_counter()
+            response = await client.get(path)
+            await response.get_data()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} answered {response.status_code}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return len(latencies) / (time.perf_counter() - start), latencies
+
+async def bench_api():
+    import main
+
+    addresses = [row.address for row in token_rows(BENCH_TRADER_TOKENS)]
+    endpoints = {
+        'api_top_traders': [f"/api/top-traders?period={period}&limit=50" for period in PERIODS],
+        'api_token_top_traders': [f"/api/top-traders/{address}?period={period}&limit=30"
+                                  for address in addresses for period in PERIODS],
+    }
+    results = {}
+    async with main.app.test_app() as test_app:
+        client = test_app.test_client()
+        max_entries = main.response_cache.max_entries
+        try:
+            for cached in (False, True):
+                # A cache that keeps nothing makes every request a database read
+                main.response_cache.max_entries = max_entries if cached else 0
+                main.response_cache.bump()
+                for name, paths in endpoints.items():
+                    label = f"{name}[{'cached' if cached else 'uncached'}]"
+                    rate, latencies = await run_load(client, paths, BENCH_API_REQUESTS, BENCH_API_CONCURRENCY)
+                    results[label] = result(rate, 'req/s', concurrency=BENCH_API_CONCURRENCY)
+                    results[f'{label} p95'] = result(percentile(latencies, 0.95) * 1000, 'ms', better='lower')
+        finally:
+            main.response_cache.max_entries = max_entries
+    return results
+
+async def bench_store_and_api(groups):
+    # The API reads what the store benchmarks wrote, so it seeds the database itself when run alone
+    results = {}
+    if 'store' in groups:
+        results.update(await bench_store())
+    if 'api' in groups:
+        if 'store' not in groups:
+            with quiet():
+                await bench_store()
+        results.update(await bench_api())
+    return results
+
+def start_stub(latency=BENCH_STUB_LATENCY):
+    # Has to run before browser.py is imported, which reads DEXSCREENER_URL once
+    from stub_server import run
+
+    with quiet():
+        server = run(FIXTURES_DIR, port=0, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['DEXSCREENER_URL'] = f"http://127.0.0.1:{server.server_port}"
+    return server
+
+def bench_scrape():
+    from browser import sessions
+    from toptraders import scrape_token
+
+    tokens = [SimpleNamespace(chain='solana', address=row.address) for row in token_rows(BENCH_SCRAPE_TOKENS)]
+    session = sessions.acquire()
+    try:
+        timings = []
+        for token in tokens:
+            start = time.perf_counter()
+            with quiet():
+                rows = scrape_token(session.driver, token, PERIODS, 'html')
+            timings.append(time.perf_counter() - start)
+            if not rows:
+                raise RuntimeError(f"No rows scraped for {token.address}")
+    finally:
+        sessions.release(session)
+        sessions.close()
+    return {'scrape_token[html]': result(statistics.median(timings), 's', better='lower',
+                                         stub_latency=BENCH_STUB_LATENCY)}
+
+IMPORT_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def bench_startup(repeat=5):
+    # Cold import time and peak RSS of the API and the worker process, each in a fresh interpreter
+    results = {}
+    for module in ('main', 'worker'):
+        samples = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT, module], check=True,
+                                    capture_output=True, text=True).stdout.split()
+            samples.append((float(output[-2]), int(output[-1])))
+        results[f'import_{module}'] = result(statistics.median(s for s, _ in samples) * 1000, 'ms', better='lower')
+        # ru_maxrss is in kilobytes on Linux
+        results[f'import_{module} rss'] = result(statistics.median(r for _, r in samples) / 1024, 'MB', better='lower')
+    return results
+
+# Reporting
+
+def compare(results, baseline, tolerance=BENCH_TOLERANCE):
+    # Returns the names of the results that got worse by more than tolerance
+    regressions = []
+    previous = baseline.get('results', {})
+    for name, current in sorted(results.items()):
+        before = previous.get(name)
+        if before is None or not before['value']:
+            print(f"  {name:<48} {current['value']:>12.1f} {current['unit']:<9} (new)")
+            continue
+        change = current['value'] / before['value'] - 1
+        worse = change < -tolerance if current['better'] == 'higher' else change > tolerance
+        if worse:
+            regressions.append(name)
+        print(f"  {name:<48} {current['value']:>12.1f} {current['unit']:<9} {change:+7.1%}"
+              f"{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'parserBackends': available_backends(),
+    }
+
+def run_groups(groups):
+    # Returns the results and the groups that could not run here
+    results = {}
+    skipped = []
+    for group in [group for group in GROUPS if group in groups and group not in ('store', 'api')]:
+        print(f"Running {group} benchmarks")
+        try:
+            results.update({'parse': bench_parse, 'convert': bench_convert, 'startup': bench_startup,
+                            'scrape': bench_scrape}[group]())
+        except (ImportError, RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"Skipped {group} benchmarks: {str(e)}")
+            skipped.append(group)
+    if 'store' in groups or 'api' in groups:
+        print("Running database and API benchmarks")
+        try:
+            prepare_database()
+            results.update(asyncio.run(bench_store_and_api(groups)))
+        except (ImportError, RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"Skipped database and API benchmarks: {str(e)}")
+            skipped += [group for group in ('store', 'api') if group in groups]
+        finally:
+            if os.path.exists(BENCH_DATABASE):
+                os.remove(BENCH_DATABASE)
+    return results, skipped
+
+def run_repeated(groups, runs):
+    # Median of every result over runs runs of the groups
+    values = {}
+    skipped = []
+    for run in range(runs):
+        if runs > 1:
+            print(f"Run {run + 1} of {runs}")
+        results, skipped = run_groups(groups)
+        for name, current in results.items():
+            values.setdefault(name, []).append(current)
+    return {
+        name: {**samples[0], 'value': statistics.median(sample['value'] for sample in samples)}
+        for name, samples in values.items()
+    }, skipped
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper and API against recorded fixtures')
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=DEFAULT_GROUPS)
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a baseline, exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=BENCH_TOLERANCE)
+    parser.add_argument('--runs', type=int, default=BENCH_RUNS, help='runs per group, results are their medians')
+    parser.add_argument('--write-fixtures', action='store_true', help=f'regenerate {FIXTURES_DIR}/ and exit')
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures()
+        return 0
+    if 'scrape' in args.only:
+        start_stub()
+
+    results, skipped = run_repeated(args.only, args.runs)
+    groups = [group for group in args.only if group not in skipped]
+    baseline = {'results': {}, 'groups': []}
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'environment': environment(), 'groups': groups, 'results': results}, f,
+                      indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved {len(results)} results to {args.save}")
+    failed = bool(regressions)
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+    if args.compare:
+        # A gate that skipped a group or has nothing to compare it with would pass without checking it
+        unchecked = skipped + [group for group in groups if group not in baseline.get('groups', [])]
+        if unchecked:
+            print(f"Not checked against {args.compare}: {', '.join(unchecked)}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
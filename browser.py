@@ -0,0 +1,330 @@
+from devtools import enable_network_log
+from readiness import wait_timings
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+import atexit
+import json
+import os
+import threading
+import time
+
+# Point at a local stub server to scrape recorded pages
+DEXSCREENER_URL = os.getenv('DEXSCREENER_URL', 'https://dexscreener.com').rstrip('/')
+
+# Skips ChromeDriverManager entirely when set
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH')
+DRIVER_PATH_CACHE = os.getenv('DRIVER_PATH_CACHE', '.chromedriver_path')
+# Idle browsers kept warm between scrapes
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '4'))
+# A browser is replaced after this many page loads or once the page's JS heap grows past the limit
+BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', '200'))
+BROWSER_MAX_HEAP_MB = float(os.getenv('BROWSER_MAX_HEAP_MB', '1024'))
+
+# Maximum page loads per second towards DexScreener across all scrapers (0 = unlimited)
+SCRAPE_RATE_LIMIT = float(os.getenv('SCRAPE_RATE_LIMIT', '0'))
+# Page loads allowed back to back before SCRAPE_RATE_LIMIT kicks in
+SCRAPE_BURST = int(os.getenv('SCRAPE_BURST', '1'))
+
+# 'lean' blocks images, fonts, charts and trackers and loads pages eagerly, 'full' loads everything
+BROWSER_PROFILE = os.getenv('BROWSER_PROFILE', 'full').lower()
+BROWSER_HEADLESS = os.getenv('BROWSER_HEADLESS', '0').lower() in ('1', 'true', 'yes')
+# 'normal' waits for the load event, 'eager' returns once the DOM is parsed
+PAGE_LOAD_STRATEGY = os.getenv('PAGE_LOAD_STRATEGY') or ('eager' if BROWSER_PROFILE == 'lean' else 'normal')
+# Disk and media cache per browser in the lean profile
+BROWSER_CACHE_MB = int(os.getenv('BROWSER_CACHE_MB', '64'))
+# URL patterns blocked in the lean profile, '*' matches anything
+DEFAULT_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.ico', '*.mp4',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*tradingview.com*', '*/charting_library/*',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*hotjar.com*', '*segment.io*', '*mixpanel.com*', '*sentry.io*',
+]
+BLOCKED_URLS = [p.strip() for p in os.getenv('BLOCKED_URLS', '').split(',') if p.strip()] or DEFAULT_BLOCKED_URLS
+# document.readyState values that count as loaded for the page-load strategy in use
+READY_STATES = ('interactive', 'complete') if PAGE_LOAD_STRATEGY == 'eager' else ('complete',)
+
+# Bytes transferred by the current page and its resources, and the time to its load event
+# (DOMContentLoaded when the load event has not fired yet). Cross-origin resources without
+# Timing-Allow-Origin report 0 bytes, so the total is a lower bound.
+PAGE_STATS_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = nav ? nav.transferSize : 0;
+for (const r of resources) bytes += r.transferSize || 0;
+const loaded = nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd) : 0;
+return {bytes: bytes, resources: resources.length, loadMs: loaded};
+"""
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def load_cookies():
+    try:
+        with open('cookies.json', 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+def save_cookies(driver):
+    cookies = driver.get_cookies()
+    with open('cookies.json', 'w') as file:
+        json.dump(cookies, file)
+
+def resolve_driver_path():
+    # ChromeDriverManager checks the network on every install(), so the path it resolved
+    # is remembered in memory and on disk and only looked up again if the binary disappears
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path and os.path.isfile(_driver_path):
+            return _driver_path
+        if CHROMEDRIVER_PATH:
+            _driver_path = CHROMEDRIVER_PATH
+            return _driver_path
+        try:
+            with open(DRIVER_PATH_CACHE, 'r') as file:
+                cached = file.read().strip()
+            if os.path.isfile(cached):
+                _driver_path = cached
+                return _driver_path
+        except FileNotFoundError:
+            pass
+        _driver_path = ChromeDriverManager().install()
+        with open(DRIVER_PATH_CACHE, 'w') as file:
+            file.write(_driver_path)
+        return _driver_path
+
+def setup_driver(capture_network=False):
+    options = webdriver.ChromeOptions()
+    options.page_load_strategy = PAGE_LOAD_STRATEGY
+    if capture_network:
+        enable_network_log(options)
+    if BROWSER_HEADLESS:
+        options.add_argument('--headless=new')
+    if BROWSER_PROFILE == 'lean':
+        cache_bytes = BROWSER_CACHE_MB * 1024 * 1024
+        options.add_argument(f'--disk-cache-size={cache_bytes}')
+        options.add_argument(f'--media-cache-size={cache_bytes}')
+        options.add_argument('--blink-settings=imagesEnabled=false')
+
+    # Add essential options
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--no-first-run')
+    options.add_argument('--start-maximized')
+
+    # Add stealth options
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+
+    service = Service(resolve_driver_path())
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    # The default buffer of 250 entries fills up on a token page, which would undercount bytes
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+        'source': 'performance.setResourceTimingBufferSize(5000);'
+    })
+    if BROWSER_PROFILE == 'lean':
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+
+    return driver
+
+class PageStats:
+    def __init__(self):
+        self.pages = 0
+        self.bytes = 0
+        self.resources = 0
+        self.lock = threading.Lock()
+
+    def record(self, stats):
+        with self.lock:
+            self.pages += 1
+            self.bytes += stats['bytes'] or 0
+            self.resources += stats['resources'] or 0
+        wait_timings.record('page_load', (stats['loadMs'] or 0) / 1000)
+
+    def reset(self):
+        with self.lock:
+            self.pages = self.bytes = self.resources = 0
+
+    def summary(self):
+        with self.lock:
+            return {
+                'profile': BROWSER_PROFILE,
+                'pages': self.pages,
+                'bytes': self.bytes,
+                'resources': self.resources,
+                'avgBytes': self.bytes / self.pages if self.pages else 0,
+            }
+
+    def report(self):
+        stats = self.summary()
+        if stats['pages']:
+            print(f"Pages ({stats['profile']} profile): {stats['pages']} | {stats['bytes'] / 1024 / 1024:.2f} MB total | {stats['avgBytes'] / 1024:.0f} KB/page | {stats['resources'] / stats['pages']:.0f} resources/page")
+
+page_stats = PageStats()
+
+def measure_page(driver):
+    return driver.execute_script(PAGE_STATS_SCRIPT)
+
+class RateLimiter:
+    # Token bucket: up to burst page loads at once, refilled at rate per second
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+# Shared by every scraper in the process, so concurrent and back-to-back runs stay under the rate together
+page_limiter = RateLimiter(SCRAPE_RATE_LIMIT, SCRAPE_BURST)
+
+class BrowserSession:
+    def __init__(self, capture_network=False):
+        self.capture_network = capture_network
+        self.driver = setup_driver(capture_network)
+        self.pages = 0
+        self.created_at = time.time()
+        self.cookies_applied = False
+
+    def apply_cookies(self, url, cookies):
+        # Cookies can only be set once the browser is on the site's domain
+        if self.cookies_applied:
+            return
+        self.driver.get(url)
+        if cookies:
+            for cookie in cookies:
+                self.driver.add_cookie(cookie)
+        self.cookies_applied = True
+
+    def page_loaded(self):
+        # Counts the page towards recycling and records what it downloaded, call it once
+        # the scraper is done with the page
+        self.pages += 1
+        try:
+            stats = measure_page(self.driver)
+        except Exception:
+            return None
+        page_stats.record(stats)
+        return stats
+
+    def heap_mb(self):
+        heap = self.driver.execute_script('return performance.memory ? performance.memory.usedJSHeapSize : 0')
+        return (heap or 0) / (1024 * 1024)
+
+    def needs_recycle(self):
+        if self.pages >= BROWSER_MAX_PAGES:
+            return True
+        try:
+            return self.heap_mb() > BROWSER_MAX_HEAP_MB
+        except Exception:
+            return True
+
+    def healthy(self):
+        try:
+            return self.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+class SessionPool:
+    def __init__(self, max_idle=BROWSER_POOL_SIZE):
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        # Chrome launches are serialized, starting many at once mostly thrashes the machine
+        self.launch_lock = threading.Lock()
+        self.launched = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def acquire(self, capture_network=False):
+        while True:
+            with self.lock:
+                session = next((s for s in self.idle if s.capture_network == capture_network), None)
+                if session is None:
+                    break
+                self.idle.remove(session)
+            healthy = session.healthy()
+            with self.lock:
+                if healthy:
+                    self.reused += 1
+                else:
+                    self.recycled += 1
+            if healthy:
+                return session
+            session.quit()
+
+        with self.launch_lock:
+            session = BrowserSession(capture_network)
+        with self.lock:
+            self.launched += 1
+        return session
+
+    def release(self, session):
+        if session.needs_recycle() or not session.healthy():
+            with self.lock:
+                self.recycled += 1
+            session.quit()
+            return
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(session)
+                return
+        session.quit()
+
+    def renew(self, session):
+        # Swaps a session that has served enough pages for a fresh one mid-run
+        if not session.needs_recycle():
+            return session
+        with self.lock:
+            self.recycled += 1
+        session.quit()
+        return self.acquire(session.capture_network)
+
+    def warm(self, count, capture_network=False):
+        sessions = [self.acquire(capture_network) for _ in range(count)]
+        for session in sessions:
+            self.release(session)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for session in idle:
+            session.quit()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'idle': len(self.idle),
+                'launched': self.launched,
+                'reused': self.reused,
+                'recycled': self.recycled,
+            }
+
+sessions = SessionPool()
+atexit.register(sessions.close)
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from quart import Response, request
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Entries kept per process, least recently used ones are evicted first
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+# Upper bound on entry age, covers scrapes run outside this process (0 = until the next scrape)
+CACHE_TTL = float(os.getenv('CACHE_TTL', '300'))
+
+class CacheEntry:
+    def __init__(self, body, generation):
+        self.body = body
+        self.generation = generation
+        self.etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        self.created_at = time.monotonic()
+
+class ResponseCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def bump(self):
+        # Called when a scrape commits, every cached response is stale from here on
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and self.ttl and time.monotonic() - entry.created_at > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, generation):
+        # generation is the one read before building the body, a scrape that committed
+        # in the meantime makes the body stale, so it is returned but not stored
+        entry = CacheEntry(body, generation)
+        with self.lock:
+            if generation != self.generation:
+                return entry
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'entries': len(self.entries),
+                'maxEntries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'notModified': self.not_modified,
+                'evictions': self.evictions,
+                'hitRate': self.hits / requests if requests else 0.0,
+            }
+
+async def respond_cached(cache, key, build):
+    # Serves the cached body for key, building it on a miss; answers 304 when the
+    # client already holds the current ETag
+    entry = cache.get(key)
+    if entry is None:
+        generation = cache.generation
+        payload = await build()
+        entry = cache.set(key, json.dumps(payload), generation)
+
+    if request.if_none_match.contains(entry.etag):
+        cache.record_not_modified()
+        response = Response('', status=304)
+    else:
+        response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    return response
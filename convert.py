@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+SUFFIXES = {'K': 1e3, 'M': 1e6, 'B': 1e9, 'T': 1e12}
+NAN = float('nan')
+
+# Display column -> numeric column for the token list
+TOKEN_NUMERIC_COLUMNS = {
+    'price': 'price_usd',
+    'txns': 'txns_count',
+    'volume': 'volume_usd',
+    'makers': 'makers_count',
+    'trend5m': 'trend_5m_pct',
+    'trend1h': 'trend_1h_pct',
+    'trend6h': 'trend_6h_pct',
+    'trend24h': 'trend_24h_pct',
+    'liquidity': 'liquidity_usd',
+    'mcap': 'mcap_usd',
+}
+TOKEN_COUNT_COLUMNS = ['txns_count', 'makers_count']
+
+def parse_number(value):
+    # A display value like "$1.2M", "<$0.01", "-3.5%" or "+12" as a float, NaN when it is not a number.
+    # Chained str.replace is several times faster than str.translate or a regex on values this short.
+    if not isinstance(value, str):
+        return NAN
+    text = value.replace('$', '').replace(',', '').replace('<', '').strip()
+    if text.endswith('%'):
+        text = text[:-1]
+    multiplier = SUFFIXES.get(text[-1:])
+    if multiplier is None:
+        multiplier = 1.0
+    else:
+        text = text[:-1]
+    try:
+        return float(text) * multiplier
+    except ValueError:
+        return NAN
+
+def to_numeric(series):
+    # Every distinct value in the column is parsed once; columns repeat "-", "0" and the like a lot.
+    # Missing values get code -1 from factorize, which picks the trailing NaN.
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object))
+    parsed = np.array([parse_number(value) for value in uniques.tolist()] + [NAN], dtype='float64')
+    return pd.Series(parsed[codes], index=series.index, dtype='float64')
+
+def to_count(series):
+    return to_numeric(series).round().astype('Int64')
+
+def to_records(frame, columns):
+    # NaN/NA become None so they are written as NULL
+    frame = frame[columns].astype(object)
+    return frame.where(frame.notna(), None).values.tolist()
+
+def normalize_tokens(rows, columns):
+    # rows are TokenRow records; returns one list per row in the order of columns,
+    # which name TokenRow fields followed by TOKEN_NUMERIC_COLUMNS values
+    frame = pd.DataFrame.from_records(rows, columns=rows[0]._fields) if rows else pd.DataFrame()
+    for display, numeric in TOKEN_NUMERIC_COLUMNS.items():
+        convert = to_count if numeric in TOKEN_COUNT_COLUMNS else to_numeric
+        frame[numeric] = convert(frame[display]) if display in frame else pd.Series(dtype='float64')
+    return to_records(frame, columns) if rows else []
+
+def normalize_traders(rows, columns):
+    # rows are [tokenAddress, period, *TraderRow]; the balance "held/supply" pair is split
+    # into its held amount
+    frame = pd.DataFrame(rows, columns=[
+        'tokenAddress', 'period', 'rank', 'wallet', 'boughtAmount', 'boughtVolume',
+        'soldAmount', 'soldVolume', 'pnl', 'unrealized', 'balance', 'transactions'
+    ])
+    frame['rank'] = pd.to_numeric(frame['rank'], errors='coerce').astype('Int64')
+    for column in ['boughtAmount', 'boughtVolume', 'soldAmount', 'soldVolume', 'pnl']:
+        frame[column] = to_numeric(frame[column]).fillna(0.0)
+    frame['unrealizedValue'] = to_numeric(frame['unrealized'])
+    frame['balanceAmount'] = to_numeric(frame['balance'].astype('string').str.split('/').str[0])
+    frame['transactionCount'] = to_count(frame['transactions'])
+
+    # Rows without a rank cannot be keyed and are dropped, like the old per-row float() errors
+    invalid = frame['rank'].isna()
+    if invalid.any():
+        print(f"Dropping {int(invalid.sum())} trader rows without a rank")
+        frame = frame[~invalid]
+    return to_records(frame, columns)
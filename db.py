@@ -0,0 +1,134 @@
+from metrics import timed_write
+import os
+import time
+
+DATABASE_PROVIDER = os.getenv('DATABASE_PROVIDER', 'sqlite').lower()
+# Rows written per transaction by the scrapers
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', '500'))
+# Bind parameters per statement; SQLite, Postgres and MySQL all allow at least this many
+MAX_PARAMS = 30000
+
+def placeholder(index):
+    if DATABASE_PROVIDER in ('postgresql', 'postgres', 'cockroachdb'):
+        return f'${index}'
+    return '?'
+
+def quote(name):
+    if DATABASE_PROVIDER == 'mysql':
+        return f'`{name}`'
+    return f'"{name}"'
+
+DEFAULT_TIMESTAMP_COLUMNS = ('createdAt', 'updatedAt')
+# The current UTC time as the database's own datetime type. SQLite has none: the Prisma client
+# stores epoch milliseconds there, which CURRENT_TIMESTAMP's text would not compare or sort with,
+# so on SQLite the raw writes bind timestamp_value() instead.
+UTC_NOW = {
+    'postgresql': "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')",
+    'postgres': "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')",
+    'cockroachdb': "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')",
+    'mysql': 'UTC_TIMESTAMP(3)',
+}
+
+def binds_timestamps():
+    return DATABASE_PROVIDER not in UTC_NOW
+
+def timestamp_value():
+    # Now, the way the Prisma client writes a DateTime on SQLite
+    return int(time.time() * 1000)
+
+def timestamp_sql(index):
+    # SQL for the current time in a raw write; index is the placeholder used when it is bound
+    return placeholder(index) if binds_timestamps() else UTC_NOW[DATABASE_PROVIDER]
+
+def build_upsert(table, columns, key_columns, row_count, timestamp_columns=DEFAULT_TIMESTAMP_COLUMNS,
+                 increment_columns=()):
+    # Timestamps are set by the write, @updatedAt is only maintained by the Prisma client; when
+    # they are bound, each row's values are followed by one timestamp_value() per timestamp column.
+    # increment_columns are added to the stored value on conflict instead of replacing it.
+    all_columns = list(columns) + list(timestamp_columns)
+    values = []
+    index = 0
+    for _ in range(row_count):
+        row = []
+        for _ in columns:
+            index += 1
+            row.append(placeholder(index))
+        for _ in timestamp_columns:
+            if binds_timestamps():
+                index += 1
+            row.append(timestamp_sql(index))
+        values.append(f"({', '.join(row)})")
+
+    update_columns = [c for c in all_columns if c not in key_columns and c != 'createdAt']
+    query = f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in all_columns)}) VALUES {', '.join(values)}"
+    if DATABASE_PROVIDER == 'mysql':
+        updates = ', '.join(
+            f'{quote(c)} = {quote(c)} + VALUES({quote(c)})' if c in increment_columns
+            else f'{quote(c)} = VALUES({quote(c)})'
+            for c in update_columns
+        )
+        return f"{query} ON DUPLICATE KEY UPDATE {updates}"
+    updates = ', '.join(
+        f'{quote(c)} = {quote(table)}.{quote(c)} + excluded.{quote(c)}' if c in increment_columns
+        else f'{quote(c)} = excluded.{quote(c)}'
+        for c in update_columns
+    )
+    return f"{query} ON CONFLICT ({', '.join(quote(c) for c in key_columns)}) DO UPDATE SET {updates}"
+
+def build_insert_ignore(table, columns, key_columns, row_count):
+    # Inserts the rows whose key is not stored yet and leaves the others alone
+    values = ', '.join(
+        f"({', '.join(placeholder(row * len(columns) + i + 1) for i in range(len(columns)))})"
+        for row in range(row_count)
+    )
+    query = f"INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) VALUES {values}"
+    if DATABASE_PROVIDER == 'mysql':
+        return f"INSERT IGNORE {query}"
+    return f"INSERT {query} ON CONFLICT ({', '.join(quote(c) for c in key_columns)}) DO NOTHING"
+
+def dedupe_rows(columns, key_columns, rows):
+    # A multi-row upsert may not touch the same key twice, the last row for a key wins
+    key_indexes = [columns.index(c) for c in key_columns]
+    unique = {}
+    for row in rows:
+        unique[tuple(row[i] for i in key_indexes)] = row
+    return list(unique.values())
+
+async def execute_upsert(tx, table, columns, key_columns, rows, **options):
+    timestamps = []
+    if binds_timestamps():
+        timestamps = [timestamp_value()] * len(options.get('timestamp_columns', DEFAULT_TIMESTAMP_COLUMNS))
+    chunk_size = max(1, MAX_PARAMS // (len(columns) + len(timestamps)))
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        params = [value for row in chunk for value in [*row, *timestamps]]
+        await tx.execute_raw(build_upsert(table, columns, key_columns, len(chunk), **options), *params)
+
+async def bulk_upsert(db, table, columns, key_columns, rows, before_write=None):
+    # before_write(tx, columns, rows) runs in the same transaction, ahead of the upsert
+    rows = dedupe_rows(columns, key_columns, rows)
+    with timed_write(table, len(rows)):
+        async with db.tx() as tx:
+            if before_write:
+                await before_write(tx, columns, rows)
+            await execute_upsert(tx, table, columns, key_columns, rows)
+    return len(rows)
+
+async def bulk_write(db, table, columns, key_columns, rows, batch_size=DB_BATCH_SIZE, before_write=None,
+                     strict=False):
+    # Failed batches are logged and skipped, unless strict is set
+    start_time = time.time()
+    written = 0
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        try:
+            written += await bulk_upsert(db, table, columns, key_columns, batch, before_write)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"Error storing batch of {len(batch)} rows into {table}: {str(e)}")
+
+    elapsed = time.time() - start_time
+    rate = written / elapsed if elapsed > 0 else 0
+    print(f"Stored {written} rows into {table} in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return written
@@ -0,0 +1,184 @@
+from parsers import TokenRow, TraderRow
+import base64
+import json
+import os
+import re
+import time
+
+# Response URLs carrying the top traders list and the pair list, matched as regular expressions
+TOP_TRADERS_PAYLOAD_PATTERN = os.getenv('TOP_TRADERS_PAYLOAD_PATTERN', r'/dex/log/amm/.*/top/|/top-traders/')
+PAIRS_PAYLOAD_PATTERN = os.getenv('PAIRS_PAYLOAD_PATTERN', r'/dex/screener/.*pairs|/pairs\.json')
+
+# Payload keys seen for each TraderRow field, the first one present wins
+TOP_TRADER_FIELDS = {
+    'wallet': ('maker', 'wallet', 'address', 'owner'),
+    'bought': ('amountBuyUsd', 'volumeBuyUsd', 'boughtUsd', 'buyUsd'),
+    'bought_volume': ('amountBuy', 'volumeBuy', 'boughtAmount', 'buyAmount'),
+    'sold': ('amountSellUsd', 'volumeSellUsd', 'soldUsd', 'sellUsd'),
+    'sold_volume': ('amountSell', 'volumeSell', 'soldAmount', 'sellAmount'),
+    'pnl': ('pnlUsd', 'pnl', 'realizedPnlUsd', 'profitUsd'),
+    'unrealized': ('unrealizedUsd', 'unrealizedPnlUsd', 'unrealized'),
+    'balance': ('balanceAmount', 'balance'),
+    'supply': ('totalSupply', 'supply', 'balanceTotal'),
+    'txns': ('txns', 'sells', 'txnsSell', 'sellCount'),
+}
+
+def enable_network_log(options):
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+def read_response_body(driver, request_id):
+    body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+    if body.get('base64Encoded'):
+        return base64.b64decode(body['body']).decode('utf-8', errors='replace')
+    return body['body']
+
+def drain_payloads(driver, pattern=None):
+    # Reads and clears the performance log, returning the bodies of the matching
+    # HTTP responses and WebSocket frames in the order they arrived
+    matcher = re.compile(pattern) if pattern else None
+    pending = {}
+    sockets = {}
+    payloads = []
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        method = message.get('method')
+        params = message.get('params', {})
+
+        if method == 'Network.responseReceived':
+            url = params['response']['url']
+            if matcher and matcher.search(url):
+                pending[params['requestId']] = url
+        elif method == 'Network.loadingFinished' and params.get('requestId') in pending:
+            url = pending.pop(params['requestId'])
+            try:
+                payloads.append((url, read_response_body(driver, params['requestId'])))
+            except Exception as e:
+                print(f"Could not read response body for {url}: {str(e)}")
+        elif method == 'Network.webSocketCreated':
+            sockets[params['requestId']] = params['url']
+        elif method == 'Network.webSocketFrameReceived':
+            url = sockets.get(params['requestId'], '')
+            if matcher and matcher.search(url) and params['response'].get('opcode') == 1:
+                # Only text frames can be decoded, binary frames are skipped
+                payloads.append((url, params['response']['payloadData']))
+    return payloads
+
+def wait_for_payloads(driver, pattern, timeout=15, settle=0.5, poll=0.1):
+    # Waits for the first matching payload, then keeps collecting until none arrive for settle seconds
+    payloads = []
+    start = time.monotonic()
+    last_seen = None
+    while time.monotonic() - start < timeout:
+        new_payloads = drain_payloads(driver, pattern)
+        if new_payloads:
+            payloads.extend(new_payloads)
+            last_seen = time.monotonic()
+        elif last_seen and time.monotonic() - last_seen >= settle:
+            break
+        time.sleep(poll)
+    return payloads
+
+def parse_payload(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+def find_records(payload, keys):
+    # Returns the first list of objects in the payload that carries one of the keys
+    if isinstance(payload, list):
+        if payload and isinstance(payload[0], dict) and any(key in payload[0] for key in keys):
+            return payload
+        items = payload
+    elif isinstance(payload, dict):
+        items = payload.values()
+    else:
+        return []
+    for item in items:
+        records = find_records(item, keys)
+        if records:
+            return records
+    return []
+
+def field(record, name, default=None):
+    for key in TOP_TRADER_FIELDS[name]:
+        if record.get(key) is not None:
+            return record[key]
+    return default
+
+def number(value):
+    return str(float(value or 0))
+
+def decode_top_traders(payload):
+    data = []
+    for index, record in enumerate(find_records(payload, TOP_TRADER_FIELDS['wallet']), 1):
+        bought = number(field(record, 'bought'))
+        # Same rule as the table parser: wallets that never bought are skipped
+        if float(bought) == 0:
+            continue
+        sold = number(field(record, 'sold'))
+        balance = field(record, 'balance')
+        supply = field(record, 'supply')
+
+        data.append(TraderRow(
+            rank=str(record.get('rank', index)),
+            wallet=field(record, 'wallet', '-'),
+            bought=bought,
+            bought_volume=number(field(record, 'bought_volume')),
+            sold=sold,
+            sold_volume=number(field(record, 'sold_volume')) if float(sold) else '0',
+            pnl=number(field(record, 'pnl')),
+            unrealized=number(field(record, 'unrealized')),
+            balance=f"{number(balance)}/{number(supply)}" if balance is not None and supply is not None else '0',
+            txns=str(field(record, 'txns', 0)),
+        ))
+    return data
+
+def format_age(created_at):
+    # pairCreatedAt is in milliseconds, rendered like the table's Age column
+    if not created_at:
+        return ''
+    seconds = max(0, time.time() - created_at / 1000)
+    for unit, size in (('y', 31536000), ('mo', 2592000), ('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+def decode_pairs(payload):
+    rows = []
+    for pair in find_records(payload, ('pairAddress',)):
+        txns = (pair.get('txns') or {}).get('h24') or {}
+        change = pair.get('priceChange') or {}
+        rows.append(TokenRow(
+            address=pair['pairAddress'],
+            chain=pair.get('chainId', ''),
+            dex=pair.get('dexId', ''),
+            token=(pair.get('baseToken') or {}).get('symbol', ''),
+            price=str(pair.get('priceUsd') or ''),
+            age=format_age(pair.get('pairCreatedAt')),
+            txns=str(txns.get('buys', 0) + txns.get('sells', 0)) if txns else '',
+            volume=str((pair.get('volume') or {}).get('h24', '')),
+            makers=str((pair.get('makers') or {}).get('h24', '')),
+            trend5m=f"{change['m5']}%" if 'm5' in change else '',
+            trend1h=f"{change['h1']}%" if 'h1' in change else '',
+            trend6h=f"{change['h6']}%" if 'h6' in change else '',
+            trend24h=f"{change['h24']}%" if 'h24' in change else '',
+            liquidity=str((pair.get('liquidity') or {}).get('usd', '')),
+            mcap=str(pair.get('marketCap') or pair.get('fdv') or ''),
+        ))
+    return rows
+
+def capture_top_traders(driver, timeout=15):
+    for url, body in wait_for_payloads(driver, TOP_TRADERS_PAYLOAD_PATTERN, timeout):
+        rows = decode_top_traders(parse_payload(body))
+        if rows:
+            return rows
+    return []
+
+def capture_pairs(driver, timeout=15):
+    # Pages of the pair list can arrive in several payloads, later ones win for a pair
+    pairs = {}
+    for url, body in wait_for_payloads(driver, PAIRS_PAYLOAD_PATTERN, timeout):
+        for row in decode_pairs(parse_payload(body)):
+            pairs[row.address] = row
+    return list(pairs.values())
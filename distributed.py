@@ -0,0 +1,266 @@
+from datetime import datetime, timedelta, timezone
+from db import execute_upsert
+from fingerprints import fresh_tokens
+from jobs import JOB_QUEUE_PATH, JobQueue
+from prisma import Prisma
+from toptraders import get_tokens, scrape_tokens
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+
+# Top traders runs split across machines. The coordinator cuts the token list into work items
+# in the database; nodes lease items, heartbeat while scraping them and mark them done. A lease
+# that is not renewed expires and the item goes to the next node that asks. Tokens stored
+# under a lease are checkpointed, so the next holder skips them, and the writes are upserts
+# keyed like the local scraper's, so an item scraped twice stores the same rows once.
+
+WORK_ITEM_TABLE = 'scrape_work_items'
+WORK_ITEM_KEY = ['runId', 'partition']
+WORK_ITEM_COLUMNS = WORK_ITEM_KEY + ['tokens', 'status']
+
+# Tokens per work item
+DIST_PARTITION_SIZE = int(os.getenv('DIST_PARTITION_SIZE', '10'))
+# Seconds a lease lasts unless renewed, and seconds between renewals
+DIST_LEASE_SECONDS = float(os.getenv('DIST_LEASE_SECONDS', '120'))
+DIST_HEARTBEAT_INTERVAL = float(os.getenv('DIST_HEARTBEAT_INTERVAL', '30'))
+# Leases an item gets before it is given up as failed
+DIST_MAX_ATTEMPTS = int(os.getenv('DIST_MAX_ATTEMPTS', '3'))
+# Claimable items a node picks from at random, so nodes asking at the same time rarely collide
+DIST_CLAIM_WINDOW = int(os.getenv('DIST_CLAIM_WINDOW', '16'))
+# Seconds between looks at the run while other nodes hold its last leases
+DIST_POLL_INTERVAL = float(os.getenv('DIST_POLL_INTERVAL', '10'))
+
+def node_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+async def create_run(db, partition_size=DIST_PARTITION_SIZE):
+    # Every token but the fresh ones, in DIST_PARTITION_SIZE work items
+    fresh = await fresh_tokens(db)
+    addresses = [token.address for token in await get_tokens(db) if token.address not in fresh]
+    run = await db.scraperun.create(data={'status': 'running', 'totalTokens': len(addresses), 'distributed': True})
+    items = [
+        [run.id, partition, json.dumps(addresses[i:i + partition_size]), 'pending']
+        for partition, i in enumerate(range(0, len(addresses), partition_size))
+    ]
+    if items:
+        async with db.tx() as tx:
+            await execute_upsert(tx, WORK_ITEM_TABLE, WORK_ITEM_COLUMNS, WORK_ITEM_KEY, items)
+    print(f"Run {run.id}: {len(addresses)} tokens in {len(items)} work items"
+          + (f", {len(fresh)} fresh tokens skipped" if fresh else ""))
+    return run
+
+async def current_run(db, run_id=None):
+    if run_id:
+        return await db.scraperun.find_unique(where={'id': run_id})
+    return await db.scraperun.find_first(
+        where={'distributed': True, 'status': 'running'},
+        order={'startedAt': 'desc'}
+    )
+
+def claimable(run_id, now):
+    return {'runId': run_id, 'OR': [{'status': 'pending'}, {'status': 'leased', 'leaseExpiresAt': {'lt': now}}]}
+
+async def claim(db, run_id, owner, lease_seconds=DIST_LEASE_SECONDS):
+    # Leases a pending or expired item to owner. The update only matches while the item is still
+    # claimable with the attempts count it was read with, so of two nodes racing for it one wins.
+    now = datetime.now(timezone.utc)
+    candidates = await db.scrapeworkitem.find_many(
+        where=claimable(run_id, now), order={'partition': 'asc'}, take=DIST_CLAIM_WINDOW
+    )
+    random.shuffle(candidates)
+    for item in candidates:
+        where = {**claimable(run_id, now), 'partition': item.partition, 'attempts': item.attempts}
+        if item.attempts >= DIST_MAX_ATTEMPTS:
+            # Its last lease ended without a result as well
+            await db.scrapeworkitem.update_many(
+                where=where, data={'status': 'failed', 'leaseOwner': None, 'error': 'No attempts left'}
+            )
+            continue
+        expires = now + timedelta(seconds=lease_seconds)
+        won = await db.scrapeworkitem.update_many(where=where, data={
+            'status': 'leased', 'leaseOwner': owner, 'leaseExpiresAt': expires, 'attempts': item.attempts + 1,
+        })
+        if won:
+            return await db.scrapeworkitem.find_unique(
+                where={'runId_partition': {'runId': run_id, 'partition': item.partition}}
+            )
+    return None
+
+def held(item, owner):
+    return {'runId': item.runId, 'partition': item.partition, 'leaseOwner': owner, 'status': 'leased'}
+
+async def renew(db, item, owner, lease_seconds=DIST_LEASE_SECONDS):
+    # False once the lease expired and another node took the item
+    expires = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+    return bool(await db.scrapeworkitem.update_many(where=held(item, owner), data={'leaseExpiresAt': expires}))
+
+async def complete(db, item, owner, rows, errors):
+    return bool(await db.scrapeworkitem.update_many(where=held(item, owner), data={
+        'status': 'done', 'leaseOwner': None, 'leaseExpiresAt': None, 'rows': rows,
+        'error': '\n'.join(errors) if errors else None,
+    }))
+
+async def release(db, item, owner, error=None):
+    # Back to the queue right away instead of after the lease runs out; an item that failed
+    # on its last lease is given up
+    status = 'failed' if error and item.attempts >= DIST_MAX_ATTEMPTS else 'pending'
+    await db.scrapeworkitem.update_many(where=held(item, owner), data={
+        'status': status, 'leaseOwner': None, 'leaseExpiresAt': None, 'error': error,
+    })
+
+async def run_status(db, run_id):
+    counts = {}
+    for status in ('pending', 'leased', 'done', 'failed'):
+        counts[status] = await db.scrapeworkitem.count(where={'runId': run_id, 'status': status})
+    return counts
+
+async def finish_if_done(db, run):
+    # Any node can close the run once no item is pending or leased; True when the run is over
+    counts = await run_status(db, run.id)
+    if counts['pending'] or counts['leased']:
+        return False
+    finished = await db.scraperun.update_many(where={'id': run.id, 'status': 'running'},
+                                              data={'status': 'completed', 'finishedAt': datetime.now(timezone.utc)})
+    if finished:
+        await db.scrapecheckpoint.delete_many(where={'runId': run.id})
+        print(f"Run {run.id} completed: {counts['done']} work items done, {counts['failed']} failed")
+    return True
+
+class Lease:
+    # Progress object for the scrape of one work item: forwards to the job's progress if there is
+    # one, and cancels the scrape once the lease is lost. Without a job, commits bump the job
+    # queue on this host, if there is one, so the API here drops its cached responses.
+    def __init__(self, progress=None, queue=None):
+        self.progress = progress
+        self.queue = queue
+        self.lost = False
+        self.errors = []
+
+    def start(self, total):
+        if self.progress:
+            self.progress.start(self.progress.total + total)
+
+    def token_started(self, token):
+        if self.progress:
+            self.progress.token_started(token)
+
+    def token_finished(self, token, error=None):
+        if error:
+            self.errors.append(f"{token}: {error}")
+        if self.progress:
+            self.progress.token_finished(token, error)
+
+    def committed(self):
+        if self.progress:
+            self.progress.committed()
+        elif self.queue:
+            self.queue.bump_generation()
+
+    def error(self, message):
+        self.errors.append(message)
+        if self.progress:
+            self.progress.error(message)
+
+    @property
+    def cancelled(self):
+        return self.lost or bool(self.progress and self.progress.cancelled)
+
+async def heartbeat(db, item, owner, lease):
+    while True:
+        await asyncio.sleep(DIST_HEARTBEAT_INTERVAL)
+        if not await renew(db, item, owner):
+            print(f"Lost the lease on work item {item.partition}, stopping")
+            lease.lost = True
+            return
+
+async def process(db, run_id, item, owner, workers=None, extract_mode=None, progress=None, queue=None):
+    addresses = json.loads(item.tokens)
+    checkpoints = await db.scrapecheckpoint.find_many(where={'runId': run_id, 'tokenAddress': {'in': addresses}})
+    stored = {checkpoint.tokenAddress for checkpoint in checkpoints}
+    tokens = await db.token.find_many(where={'address': {'in': [a for a in addresses if a not in stored]}})
+    # Keep the coordinator's order
+    order = {address: i for i, address in enumerate(addresses)}
+    tokens.sort(key=lambda token: order[token.address])
+
+    lease = Lease(progress, queue)
+    lease.start(len(tokens))
+    beat = asyncio.create_task(heartbeat(db, item, owner, lease))
+    try:
+        if tokens:
+            await scrape_tokens(db, run_id, tokens, workers, extract_mode, lease)
+    finally:
+        beat.cancel()
+    if lease.lost:
+        return False
+    if progress and progress.cancelled:
+        await release(db, item, owner)
+        return False
+
+    checkpoints = await db.scrapecheckpoint.find_many(where={'runId': run_id, 'tokenAddress': {'in': addresses}})
+    stored = {checkpoint.tokenAddress for checkpoint in checkpoints}
+    missing = [token.address for token in tokens if token.address not in stored]
+    if missing:
+        # Tokens that failed every retry: the item goes back for another lease, which skips the
+        # stored ones, and is given up with the list once it runs out of attempts
+        await release(db, item, owner, f"{len(missing)} tokens not stored: {', '.join(missing)}\n" + '\n'.join(lease.errors))
+        return False
+    if not await complete(db, item, owner, sum(checkpoint.rows for checkpoint in checkpoints), lease.errors):
+        print(f"Work item {item.partition} was taken over before it was reported, its rows are stored")
+    return True
+
+async def work(run_id=None, workers=None, extract_mode=None, progress=None):
+    # One node: leases items of the run until none are left, then closes the run if nobody did yet
+    owner = node_id()
+    queue = JobQueue() if progress is None and os.path.exists(JOB_QUEUE_PATH) else None
+    db = Prisma()
+    await db.connect()
+    try:
+        run = await current_run(db, run_id)
+        if run is None:
+            print("No distributed run to work on, start one with: python distributed.py start")
+            return
+        print(f"Node {owner} working on run {run.id}")
+        processed = 0
+        while not (progress and progress.cancelled):
+            item = await claim(db, run.id, owner)
+            if item is None:
+                if await finish_if_done(db, run):
+                    break
+                await asyncio.sleep(DIST_POLL_INTERVAL)
+                continue
+            try:
+                if await process(db, run.id, item, owner, workers, extract_mode, progress, queue):
+                    processed += 1
+            except Exception as e:
+                print(f"Error processing work item {item.partition}: {str(e)}")
+                await release(db, item, owner, str(e))
+        print(f"Node {owner} processed {processed} work items")
+    finally:
+        await db.disconnect()
+
+async def main(command, run_id=None):
+    if command == 'work':
+        await work(run_id)
+        return
+    db = Prisma()
+    await db.connect()
+    try:
+        if command == 'start':
+            await create_run(db)
+        else:
+            run = await current_run(db, run_id)
+            if run is None:
+                print("No distributed run")
+                return
+            print(f"Run {run.id} ({run.status}, {run.totalTokens} tokens): {await run_status(db, run.id)}")
+    finally:
+        await db.disconnect()
+
+if __name__ == "__main__":
+    if sys.argv[1:2] not in (['start'], ['work'], ['status']):
+        print("Usage: python distributed.py start | work [run id] | status [run id]")
+        sys.exit(2)
+    asyncio.run(main(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None))
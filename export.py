@@ -0,0 +1,114 @@
+from pagination import json_default
+import csv
+import io
+
+# Format -> (media type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# Exported column -> Arrow type name
+TOKEN_EXPORT_COLUMNS = {
+    'address': 'string', 'chain': 'string', 'dex': 'string', 'token': 'string',
+    'price': 'string', 'age': 'string', 'txns': 'string', 'volume': 'string', 'makers': 'string',
+    'trend5m': 'string', 'trend1h': 'string', 'trend6h': 'string', 'trend24h': 'string',
+    'liquidity': 'string', 'mcap': 'string',
+    'priceUsd': 'float64', 'txnsCount': 'int64', 'volumeUsd': 'float64', 'makersCount': 'int64',
+    'trend5mPct': 'float64', 'trend1hPct': 'float64', 'trend6hPct': 'float64', 'trend24hPct': 'float64',
+    'liquidityUsd': 'float64', 'mcapUsd': 'float64',
+    'createdAt': 'timestamp', 'updatedAt': 'timestamp',
+}
+TOP_TRADER_EXPORT_COLUMNS = {
+    'tokenAddress': 'string', 'period': 'string', 'rank': 'int64', 'wallet': 'string',
+    'boughtAmount': 'float64', 'boughtVolume': 'float64', 'soldAmount': 'float64', 'soldVolume': 'float64',
+    'pnl': 'float64', 'unrealized': 'string', 'balance': 'string', 'transactions': 'string',
+    'unrealizedValue': 'float64', 'balanceAmount': 'float64', 'transactionCount': 'int64',
+    'createdAt': 'timestamp', 'updatedAt': 'timestamp',
+}
+
+class ChunkSink:
+    # Write-only file object for the Arrow writers, the bytes written so far are taken out
+    # after every batch and sent to the client
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+def arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        'string': pa.string(),
+        'float64': pa.float64(),
+        'int64': pa.int64(),
+        'timestamp': pa.timestamp('ms', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns.items()])
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float)):
+        return value
+    return json_default(value)
+
+async def csv_chunks(pages, columns):
+    yield (','.join(columns) + '\r\n').encode('utf-8')
+    async for rows in pages:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([csv_value(getattr(row, column)) for column in columns])
+        yield buffer.getvalue().encode('utf-8')
+
+async def arrow_chunks(pages, columns, fmt):
+    # Parquet gets a row group per database batch and its footer at the end, the Arrow IPC
+    # stream a record batch per database batch
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    sink = ChunkSink()
+    output = pa.PythonFile(sink, mode='w')
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(output, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+    try:
+        async for rows in pages:
+            table = pa.Table.from_pylist([{column: getattr(row, column) for column in columns} for row in rows],
+                                         schema=schema)
+            writer.write_table(table)
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
+
+def export_chunks(pages, columns, fmt):
+    # pages is an async iterator of row lists, see pagination.iter_pages
+    if fmt == 'csv':
+        return csv_chunks(pages, columns)
+    return arrow_chunks(pages, columns, fmt)
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from db import MAX_PARAMS, execute_upsert, placeholder, quote
+import hashlib
+import json
+import os
+
+TRADER_FINGERPRINT_TABLE = 'top_trader_fingerprints'
+TRADER_FINGERPRINT_KEY = ['tokenAddress', 'period']
+TRADER_FINGERPRINT_COLUMNS = TRADER_FINGERPRINT_KEY + ['fingerprint', 'rowCount']
+# Tokens whose 1d table was scraped less than this many seconds ago are not visited again (0 = always visit)
+TOP_TRADERS_FRESH_TTL = float(os.getenv('TOP_TRADERS_FRESH_TTL', '0'))
+# Period whose last scrape decides whether a token is fresh
+FRESH_PERIOD = '1d'
+
+def fingerprint(values):
+    # Floats go through repr, so the same scraped numbers always hash the same
+    return hashlib.sha1(json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+async def fetch_fingerprints(db, table, key_columns, keys):
+    # Stored fingerprint per key tuple, for the keys that exist. Filters on the first key column,
+    # which the indexes lead with, and matches the rest in Python: an OR term per composite key
+    # hits SQLite's expression depth limit at about a thousand keys.
+    if not keys:
+        return {}
+    keys = set(keys)
+    first_values = sorted({key[0] for key in keys})
+    columns = ', '.join(quote(c) for c in key_columns + ['fingerprint'])
+    stored = {}
+    for i in range(0, len(first_values), MAX_PARAMS):
+        chunk = first_values[i:i + MAX_PARAMS]
+        condition = f"{quote(key_columns[0])} IN ({', '.join(placeholder(j) for j in range(1, len(chunk) + 1))})"
+        rows = await db.query_raw(f"SELECT {columns} FROM {quote(table)} WHERE {condition}", *chunk)
+        for row in rows:
+            key = tuple(row[c] for c in key_columns)
+            if key in keys:
+                stored[key] = row['fingerprint']
+    return stored
+
+async def changed_tokens(db, columns, records):
+    # Adds the fingerprint column and drops the token rows that match the stored one,
+    # also returns the addresses that were already stored
+    address = columns.index('address')
+    fingerprinted = [record + [fingerprint(record)] for record in records]
+    stored = await fetch_fingerprints(db, 'tokens', ['address'], [(record[address],) for record in records])
+    changed = [record for record in fingerprinted if stored.get((record[address],)) != record[-1]]
+    return changed, {key[0] for key in stored}
+
+def group_trader_fingerprints(columns, records):
+    # One fingerprint per (token, period) table, over its rows in rank order
+    token, period, rank = columns.index('tokenAddress'), columns.index('period'), columns.index('rank')
+    groups = {}
+    for record in records:
+        groups.setdefault((record[token], record[period]), []).append(record)
+    return {
+        key: (fingerprint(sorted(rows, key=lambda row: row[rank])), len(rows))
+        for key, rows in groups.items()
+    }
+
+async def changed_traders(db, columns, records):
+    # Returns the rows of the (token, period) tables that differ from the stored fingerprint,
+    # and the fingerprint rows to store once they are written
+    groups = group_trader_fingerprints(columns, records)
+    stored = await fetch_fingerprints(db, TRADER_FINGERPRINT_TABLE, TRADER_FINGERPRINT_KEY, groups)
+    changed = {key for key, (value, _) in groups.items() if stored.get(key) != value}
+    token, period = columns.index('tokenAddress'), columns.index('period')
+    rows = [record for record in records if (record[token], record[period]) in changed]
+    fingerprint_rows = [[*key, value, count] for key, (value, count) in groups.items()]
+    return rows, fingerprint_rows
+
+async def store_trader_fingerprints(db, fingerprint_rows):
+    # checkedAt moves on every scrape, unchanged tables included, it drives the freshness policy
+    if not fingerprint_rows:
+        return
+    async with db.tx() as tx:
+        await execute_upsert(tx, TRADER_FINGERPRINT_TABLE, TRADER_FINGERPRINT_COLUMNS, TRADER_FINGERPRINT_KEY,
+                             fingerprint_rows, timestamp_columns=('checkedAt',))
+
+async def fresh_tokens(db, ttl=TOP_TRADERS_FRESH_TTL):
+    if not ttl:
+        return set()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl)
+    fingerprints = await db.toptraderfingerprint.find_many(
+        where={'period': FRESH_PERIOD, 'checkedAt': {'gte': cutoff}}
+    )
+    return {row.tokenAddress for row in fingerprints}
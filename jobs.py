@@ -0,0 +1,256 @@
+from contextlib import contextmanager
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# SQLite file shared by the API processes and the scraper workers on this host
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', 'jobs.db')
+# Seconds between worker heartbeats; a running job whose worker missed JOB_STALE_AFTER seconds
+# of them is marked failed
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('JOB_HEARTBEAT_INTERVAL', '5'))
+JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '60'))
+MAX_FINISHED_JOBS = 100
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    current TEXT NOT NULL DEFAULT '[]',
+    errors TEXT NOT NULL DEFAULT '[]',
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+ACTIVE_JOB = "SELECT * FROM jobs WHERE name = ? AND status IN ('pending', 'running') ORDER BY created_at LIMIT 1"
+
+def job_dict(row):
+    elapsed = (row['finished_at'] or time.time()) - row['started_at'] if row['started_at'] else 0.0
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'status': row['status'],
+        'tokensDone': row['done'],
+        'tokensTotal': row['total'],
+        'currentTokens': json.loads(row['current']),
+        'elapsed': round(elapsed, 2),
+        'errors': json.loads(row['errors']),
+        'worker': row['worker'],
+        'createdAt': row['created_at'],
+        'startedAt': row['started_at'],
+        'finishedAt': row['finished_at'],
+    }
+
+class JobQueue:
+    # Scrape jobs and small shared state in one SQLite file. The API only submits, reads and
+    # cancels; workers claim jobs and report progress. Every call opens its own connection,
+    # so the queue can be used from any thread.
+    def __init__(self, path=JOB_QUEUE_PATH):
+        self.path = path
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job
+        with self.connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    # API side
+
+    def submit(self, name, unless_active=False):
+        # With unless_active, a pending or running job with this name is returned instead of a new
+        # one; the check and the insert share the write lock, so concurrent callers queue one job
+        job_id = uuid.uuid4().hex
+        with self.transaction() as conn:
+            if unless_active:
+                row = conn.execute(ACTIVE_JOB, (name,)).fetchone()
+                if row:
+                    return job_dict(row)
+            conn.execute('INSERT INTO jobs (id, name, status, created_at) VALUES (?, ?, ?, ?)',
+                         (job_id, name, 'pending', time.time()))
+            conn.execute(
+                f"DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) "
+                "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (*FINISHED_STATUSES, MAX_FINISHED_JOBS)
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self.connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return job_dict(row) if row else None
+
+    def list(self):
+        with self.connect() as conn:
+            rows = conn.execute('SELECT * FROM jobs ORDER BY created_at').fetchall()
+        return [job_dict(row) for row in rows]
+
+    def counts(self):
+        with self.connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) AS jobs FROM jobs GROUP BY status').fetchall()
+        return {row['status']: row['jobs'] for row in rows}
+
+    def active(self, name):
+        # The pending or running job with this name, if any
+        with self.connect() as conn:
+            row = conn.execute(ACTIVE_JOB, (name,)).fetchone()
+        return job_dict(row) if row else None
+
+    def cancel(self, job_id):
+        # Pending jobs are cancelled right away, running ones when their worker next checks
+        with self.transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'pending'",
+                         (time.time(), job_id))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def generation(self):
+        # Goes up every time a worker commits scraped rows
+        return int(self.get_state('generation') or 0)
+
+    # Worker side
+
+    def claim(self, worker):
+        # Oldest pending job, now running on worker; None when the queue is empty
+        now = time.time()
+        with self.transaction() as conn:
+            stale = conn.execute("SELECT id, errors FROM jobs WHERE status = 'running' AND heartbeat_at < ?",
+                                 (now - JOB_STALE_AFTER,)).fetchall()
+            for row in stale:
+                errors = json.loads(row['errors']) + ['Worker stopped responding']
+                conn.execute("UPDATE jobs SET status = 'failed', errors = ?, finished_at = ? WHERE id = ?",
+                             (json.dumps(errors), now, row['id']))
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'pending' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                         (worker, now, now, row['id']))
+        return self.get(row['id'])
+
+    def update(self, job_id, **fields):
+        # fields are jobs columns; lists are stored as JSON
+        values = {column: json.dumps(value) if isinstance(value, list) else value for column, value in fields.items()}
+        assignments = [f"{column} = ?" for column in values] + ['heartbeat_at = ?']
+        with self.connect() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?",
+                         (*values.values(), time.time(), job_id))
+
+    def heartbeat(self, job_id):
+        self.update(job_id)
+
+    def cancel_requested(self, job_id):
+        with self.connect() as conn:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def bump_generation(self):
+        with self.connect() as conn:
+            conn.execute("INSERT INTO state (key, value) VALUES ('generation', '1') "
+                         "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    # Shared state, JSON values
+
+    def get_state(self, key):
+        with self.connect() as conn:
+            row = conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return json.loads(row['value']) if row else None
+
+    def set_state(self, key, value):
+        with self.connect() as conn:
+            conn.execute('INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+                         (key, json.dumps(value)))
+
+    def states(self, prefix):
+        with self.connect() as conn:
+            rows = conn.execute('SELECT key, value FROM state WHERE key LIKE ?', (prefix + '%',)).fetchall()
+        return {row['key'][len(prefix):]: json.loads(row['value']) for row in rows}
+
+class QueuedJob:
+    # The progress object the scrapers report to, writing through to the queue so the API
+    # processes see it
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job['id']
+        self.name = job['name']
+        self.total = 0
+        self.done = 0
+        self.current = []
+        self.errors = []
+        self.cancel_checked_at = 0.0
+        self.cancel_seen = False
+        self.lock = threading.Lock()
+
+    # Progress hooks, called from the scraper threads
+
+    def start(self, total):
+        with self.lock:
+            self.total = total
+            self.queue.update(self.id, total=total)
+
+    def token_started(self, token):
+        with self.lock:
+            self.current.append(token)
+            self.queue.update(self.id, current=self.current)
+
+    def token_finished(self, token, error=None):
+        with self.lock:
+            if token in self.current:
+                self.current.remove(token)
+            self.done += 1
+            if error:
+                self.errors.append(f"{token}: {error}")
+            self.queue.update(self.id, current=self.current, done=self.done, errors=self.errors)
+
+    def committed(self):
+        # Scraped rows were written to the database, the API caches drop what they hold
+        self.queue.bump_generation()
+
+    def error(self, message):
+        with self.lock:
+            self.errors.append(message)
+            self.queue.update(self.id, errors=self.errors)
+
+    @property
+    def cancelled(self):
+        # Polled by every scraper thread, so the queue is asked at most once a second
+        with self.lock:
+            if not self.cancel_seen and time.monotonic() - self.cancel_checked_at >= 1:
+                self.cancel_checked_at = time.monotonic()
+                self.cancel_seen = self.queue.cancel_requested(self.id)
+            return self.cancel_seen
+
+    def finish(self, status):
+        with self.lock:
+            self.queue.update(self.id, status=status, current=[], finished_at=time.time())
@@ -0,0 +1,112 @@
+from db import DATABASE_PROVIDER, binds_timestamps, execute_upsert, placeholder, quote, timestamp_sql, timestamp_value
+import sys
+
+LEADERBOARD_TABLE = 'wallet_leaderboard'
+LEADERBOARD_KEY = ['period', 'wallet']
+# Leaderboard total -> top_traders column it sums, totalTrades counts the rows
+LEADERBOARD_SOURCES = {
+    'totalBoughtAmount': 'boughtAmount',
+    'totalBoughtVolume': 'boughtVolume',
+    'totalSoldAmount': 'soldAmount',
+    'totalSoldVolume': 'soldVolume',
+    'totalPnl': 'pnl',
+}
+LEADERBOARD_TOTALS = list(LEADERBOARD_SOURCES) + ['totalTrades']
+LEADERBOARD_COLUMNS = LEADERBOARD_KEY + LEADERBOARD_TOTALS
+
+async def lock_tokens(tx, token_addresses):
+    # Two transactions storing the same token (an expired lease scraped twice, overlapping jobs)
+    # would both read the same old rows under READ COMMITTED and subtract them twice, or both
+    # add a first insert. Locking the tokens' rows, in address order so stores cannot deadlock,
+    # makes them take turns, and the later one reads what the first committed. SQLite allows one
+    # writer at a time: the second transaction fails to write and its token is retried.
+    if DATABASE_PROVIDER == 'sqlite' or not token_addresses:
+        return
+    placeholders = ', '.join(placeholder(i) for i in range(1, len(token_addresses) + 1))
+    await tx.query_raw(f"""
+        SELECT {quote('address')} FROM {quote('tokens')}
+        WHERE {quote('address')} IN ({placeholders})
+        ORDER BY {quote('address')}
+        FOR UPDATE
+    """, *token_addresses)
+
+async def fetch_replaced_rows(tx, keys):
+    # Filters on token and period, which the indexes cover, and matches ranks in Python
+    token_addresses = sorted({key[0] for key in keys})
+    periods = sorted({key[1] for key in keys})
+    params = token_addresses + periods
+    token_placeholders = ', '.join(placeholder(i) for i in range(1, len(token_addresses) + 1))
+    period_placeholders = ', '.join(placeholder(i) for i in range(len(token_addresses) + 1, len(params) + 1))
+    columns = ['tokenAddress', 'period', 'rank', 'wallet'] + list(LEADERBOARD_SOURCES.values())
+    query = f"""
+        SELECT {', '.join(quote(c) for c in columns)}
+        FROM {quote('top_traders')}
+        WHERE {quote('tokenAddress')} IN ({token_placeholders})
+        AND {quote('period')} IN ({period_placeholders})
+    """
+    rows = await tx.query_raw(query, *params)
+    return [row for row in rows if (row['tokenAddress'], row['period'], int(row['rank'])) in keys]
+
+def add_contribution(deltas, period, wallet, values, sign):
+    totals = deltas.setdefault((period, wallet), [0.0] * len(LEADERBOARD_SOURCES) + [0])
+    for i, value in enumerate(values):
+        totals[i] += sign * float(value)
+    totals[-1] += sign
+
+async def update_leaderboard(tx, columns, rows):
+    # Runs inside the top_traders upsert transaction: every (token, period, rank) row about to
+    # be replaced has its old contribution subtracted and the new row's contribution added
+    index = {column: i for i, column in enumerate(columns)}
+    keys = {(row[index['tokenAddress']], row[index['period']], int(row[index['rank']])) for row in rows}
+    sources = list(LEADERBOARD_SOURCES.values())
+
+    await lock_tokens(tx, sorted({key[0] for key in keys}))
+    deltas = {}
+    for old in await fetch_replaced_rows(tx, keys):
+        add_contribution(deltas, old['period'], old['wallet'], [old[source] for source in sources], -1)
+    for row in rows:
+        add_contribution(deltas, row[index['period']], row[index['wallet']],
+                         [row[index[source]] for source in sources], 1)
+
+    # Unchanged rows cancel out and are not written
+    records = [[period, wallet, *totals] for (period, wallet), totals in deltas.items() if any(totals)]
+    if not records:
+        return
+    await execute_upsert(tx, LEADERBOARD_TABLE, LEADERBOARD_COLUMNS, LEADERBOARD_KEY, records,
+                         timestamp_columns=('updatedAt',), increment_columns=LEADERBOARD_TOTALS)
+
+    # Wallets that dropped out of every top traders list
+    if any(record[-1] < 0 for record in records):
+        await tx.execute_raw(f"DELETE FROM {quote(LEADERBOARD_TABLE)} WHERE {quote('totalTrades')} <= 0")
+
+async def rebuild_leaderboard(db):
+    # Recomputes every total from top_traders, for the first deployment or to reset float drift
+    totals = ', '.join(f"SUM({quote(source)})" for source in LEADERBOARD_SOURCES.values())
+    columns = ', '.join(quote(c) for c in LEADERBOARD_COLUMNS + ['updatedAt'])
+    async with db.tx() as tx:
+        await tx.execute_raw(f"DELETE FROM {quote(LEADERBOARD_TABLE)}")
+        await tx.execute_raw(f"""
+            INSERT INTO {quote(LEADERBOARD_TABLE)} ({columns})
+            SELECT {quote('period')}, {quote('wallet')}, {totals}, COUNT(*), {timestamp_sql(1)}
+            FROM {quote('top_traders')}
+            GROUP BY {quote('period')}, {quote('wallet')}
+        """, *([timestamp_value()] if binds_timestamps() else []))
+
+async def main():
+    from prisma import Prisma
+
+    db = Prisma()
+    await db.connect()
+    try:
+        await rebuild_leaderboard(db)
+        print("Leaderboard rebuilt from top_traders")
+    finally:
+        await db.disconnect()
+
+if __name__ == "__main__":
+    import asyncio
+
+    if sys.argv[1:] != ['rebuild']:
+        print("Usage: python leaderboard.py rebuild")
+        sys.exit(2)
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+from collections import deque
+from datetime import datetime, timezone
+from metrics import LIVE_MESSAGES_DROPPED
+import asyncio
+import os
+import time
+
+# Seconds between looks for freshly scraped top traders tables while anyone is subscribed
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', '0.5'))
+# Messages held for a subscriber; one that falls further behind gets snapshots instead of the backlog
+LIVE_QUEUE_SIZE = int(os.getenv('LIVE_QUEUE_SIZE', '32'))
+# Seconds of silence before a keepalive is sent
+LIVE_KEEPALIVE = float(os.getenv('LIVE_KEEPALIVE', '15'))
+
+# Topic kind -> the row field diffs report deltas for
+PNL_FIELDS = {'token': 'pnl', 'leaderboard': 'totalPnl'}
+
+def describe(topic):
+    if topic[0] == 'token':
+        return {'token': topic[1], 'period': topic[2], 'limit': topic[3]}
+    return {'period': topic[1], 'limit': topic[2]}
+
+def diff_traders(old, new, pnl_field):
+    # Row-level changes between two ranked lists of traders, keyed by wallet; rows without a
+    # rank field are ranked by position
+    before = {row['wallet']: (row.get('rank', rank), row) for rank, row in enumerate(old, 1)}
+    after = {row['wallet']: (row.get('rank', rank), row) for rank, row in enumerate(new, 1)}
+    added = [{**row, 'rank': rank} for wallet, (rank, row) in after.items() if wallet not in before]
+    removed = [{'wallet': wallet, 'rank': rank} for wallet, (rank, _) in before.items() if wallet not in after]
+    changed = []
+    for wallet, (rank, row) in after.items():
+        if wallet not in before:
+            continue
+        previous_rank, previous = before[wallet]
+        if previous_rank != rank or previous != row:
+            changed.append({
+                **row,
+                'rank': rank,
+                'previousRank': previous_rank,
+                'pnlDelta': row[pnl_field] - previous[pnl_field],
+            })
+    return added, changed, removed
+
+class Subscriber:
+    # One client connection. The poller never waits on it: messages queue up to LIVE_QUEUE_SIZE,
+    # and past that the backlog is dropped and every topic of the connection gets a fresh
+    # snapshot instead, so a slow client costs neither memory nor other clients' latency.
+    def __init__(self, hub, max_pending=LIVE_QUEUE_SIZE):
+        self.hub = hub
+        self.max_pending = max_pending
+        self.topics = set()
+        self.pending = deque()
+        # Topics owed a snapshot, in order; built from the hub's state when sent, so they are current
+        self.snapshots = {}
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def push(self, topic, message):
+        if topic in self.snapshots:
+            return
+        if len(self.pending) >= self.max_pending:
+            self.dropped += len(self.pending)
+            LIVE_MESSAGES_DROPPED.inc(len(self.pending))
+            self.pending.clear()
+            self.snapshots = dict.fromkeys(self.topics)
+        else:
+            self.pending.append(message)
+        self.ready.set()
+
+    def request_snapshot(self, topic):
+        self.snapshots[topic] = None
+        self.ready.set()
+
+    async def next(self, timeout=LIVE_KEEPALIVE):
+        # The next message, or None after timeout seconds without one
+        while True:
+            if self.snapshots:
+                topic = next(iter(self.snapshots))
+                del self.snapshots[topic]
+                snapshot = self.hub.snapshot(topic)
+                if snapshot:
+                    return snapshot
+                continue
+            if self.pending:
+                return self.pending.popleft()
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+class LiveHub:
+    # Watches top_trader_fingerprints for tables whose fingerprint moved, which happens once per
+    # stored scrape whichever process or host ran it, and pushes diffs to the subscribers of the
+    # affected topics. Topics are ('token', address, period, limit) and ('leaderboard', period, limit);
+    # fetchers maps the kind to a coroutine returning the topic's rows.
+    def __init__(self, db, fetchers, poll_interval=LIVE_POLL_INTERVAL):
+        self.db = db
+        self.fetchers = fetchers
+        self.poll_interval = poll_interval
+        self.topics = {}
+        self.fingerprints = {}
+        self.since = None
+        self.task = None
+
+    async def fetch(self, topic):
+        return await self.fetchers[topic[0]](*topic[1:])
+
+    async def subscribe(self, subscriber, topic):
+        if topic not in self.topics:
+            rows = await self.fetch(topic)
+            self.topics.setdefault(topic, {'rows': rows, 'subscribers': set()})
+        self.topics[topic]['subscribers'].add(subscriber)
+        subscriber.topics.add(topic)
+        subscriber.request_snapshot(topic)
+
+    def unsubscribe(self, subscriber, topic=None):
+        for topic in [topic] if topic else list(subscriber.topics):
+            subscriber.topics.discard(topic)
+            subscriber.snapshots.pop(topic, None)
+            state = self.topics.get(topic)
+            if state:
+                state['subscribers'].discard(subscriber)
+                if not state['subscribers']:
+                    del self.topics[topic]
+
+    def snapshot(self, topic):
+        state = self.topics.get(topic)
+        if state is None:
+            return None
+        return {'type': 'snapshot', 'topic': describe(topic), 'traders': state['rows'], 'at': time.time()}
+
+    def subscriber_count(self):
+        # Read by the metrics renderer from another thread, hence the copies
+        return len({subscriber for state in list(self.topics.values()) for subscriber in list(state['subscribers'])})
+
+    async def changed_tables(self):
+        # (token, period) pairs whose fingerprint moved since the last look
+        if self.since is None:
+            latest = await self.db.toptraderfingerprint.find_first(order={'checkedAt': 'desc'})
+            self.since = latest.checkedAt if latest else datetime.fromtimestamp(0, timezone.utc)
+            return set()
+        # gte, as checkedAt may only have second precision; rows seen again match their fingerprint
+        rows = await self.db.toptraderfingerprint.find_many(where={'checkedAt': {'gte': self.since}})
+        changed = set()
+        for row in rows:
+            key = (row.tokenAddress, row.period)
+            if self.fingerprints.get(key) != row.fingerprint:
+                self.fingerprints[key] = row.fingerprint
+                changed.add(key)
+            self.since = max(self.since, row.checkedAt)
+        return changed
+
+    async def refresh(self, topic):
+        rows = await self.fetch(topic)
+        state = self.topics.get(topic)
+        if state is None:
+            return
+        added, changed, removed = diff_traders(state['rows'], rows, PNL_FIELDS[topic[0]])
+        state['rows'] = rows
+        if not (added or changed or removed):
+            return
+        message = {'type': 'diff', 'topic': describe(topic), 'added': added, 'changed': changed,
+                   'removed': removed, 'at': time.time()}
+        for subscriber in list(state['subscribers']):
+            subscriber.push(topic, message)
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self.topics:
+                # Nobody listens, the next subscriber starts from a fresh read anyway
+                self.since = None
+                continue
+            try:
+                changed = await self.changed_tables()
+                periods = {period for _, period in changed}
+                stale = [
+                    topic for topic in list(self.topics)
+                    if (topic[0] == 'token' and (topic[1], topic[2]) in changed)
+                    or (topic[0] == 'leaderboard' and topic[1] in periods)
+                ]
+                await asyncio.gather(*(self.refresh(topic) for topic in stale))
+            except Exception as e:
+                print(f"Live updates: {str(e)}")
+
+    def start(self):
+        self.task = asyncio.create_task(self.poll())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
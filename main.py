@@ -1,37 +1,264 @@
-from quart import Quart, request, jsonify
+from quart import Quart, Response, g, request, jsonify, websocket
 from prisma import Prisma
 import asyncio
-from toptraders import scrape_top_traders
 from quart_cors import cors
+from jobs import JOB_STALE_AFTER, JobQueue
+from cache import ResponseCache, respond_cached
+from db import placeholder, quote
+from snapshots import wallet_history
+from datetime import datetime, timezone
+from metrics import HTTP_REQUEST_SECONDS, registry
+from export import EXPORT_FORMATS, TOKEN_EXPORT_COLUMNS, TOP_TRADER_EXPORT_COLUMNS, export_chunks
+from pagination import decode_cursor, encode_cursor, iter_pages, json_default, keyset_where
+from live import LIVE_KEEPALIVE, LiveHub, Subscriber
+import json
+import os
+import time
 
 app = Quart(__name__)
 app = cors(app)
 prisma = Prisma()
+response_cache = ResponseCache()
+
+LEADERBOARD_MAX_LIMIT = 1000
+# Wallets per batch lookup
+WALLETS_MAX_BATCH = 500
+# Seconds between checks for rows committed by the workers, which invalidate the response cache
+JOB_QUEUE_POLL_INTERVAL = float(os.getenv('JOB_QUEUE_POLL_INTERVAL', '1'))
+JOB_STATUSES = ('pending', 'running', 'completed', 'failed', 'cancelled')
+# Scraping runs in worker.py processes, the API only talks to them through the queue. Queue calls
+# block for as long as a worker holds the write lock, so handlers make them through asyncio.to_thread.
+jobs = JobQueue()
+
+def live_workers():
+    # Workers that published their state recently, by worker id
+    cutoff = time.time() - JOB_STALE_AFTER
+    return {worker: state for worker, state in jobs.states('worker:').items() if state['seenAt'] >= cutoff}
+
+registry.gauge('response_cache_requests_total', 'Response cache lookups by result', ['result'], lambda: {
+    (result,): response_cache.stats()[key] for result, key in (('hit', 'hits'), ('miss', 'misses'))
+}, kind='counter')
+registry.gauge('browser_sessions', 'Browser pool sessions by worker and state', ['worker', 'state'], lambda: {
+    (worker, state): value
+    for worker, published in live_workers().items() for state, value in published['browsers'].items()
+})
+registry.gauge('scrape_jobs', 'Scrape jobs by status', ['status'], lambda: {
+    (status,): jobs.counts().get(status, 0) for status in JOB_STATUSES
+})
+
+async def watch_commits():
+    # Drops the cached responses whenever a worker committed scraped rows
+    generation = await asyncio.to_thread(jobs.generation)
+    while True:
+        await asyncio.sleep(JOB_QUEUE_POLL_INTERVAL)
+        current = await asyncio.to_thread(jobs.generation)
+        if current != generation:
+            generation = current
+            response_cache.bump()
 
 @app.before_serving
 async def startup():
     await prisma.connect()
+    app.commit_watcher = asyncio.create_task(watch_commits())
+    live.start()
 
 @app.after_serving
 async def shutdown():
+    app.commit_watcher.cancel()
+    live.stop()
     await prisma.disconnect()
 
+@app.before_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_latency(response):
+    # Time to the response headers; streamed bodies keep flowing after this
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, method=request.method,
+                                 route=route, status=str(response.status_code))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    # Some gauges read the job queue, which can wait on a worker's write lock, so the
+    # registry is rendered off the event loop
+    return Response(await asyncio.to_thread(render_metrics), mimetype='text/plain; version=0.0.4')
+
+def render_metrics():
+    # The scraper metrics live in the workers, which publish them with their state
+    return registry.render({worker: state.get('metrics', {}) for worker, state in live_workers().items()})
+
+async def cached_json(key, build):
+    return await respond_cached(response_cache, key, build)
+
+@app.route('/api/cache', methods=['GET'])
+async def get_cache_stats():
+    return response_cache.stats()
+
+@app.route('/api/browsers', methods=['GET'])
+async def get_browser_stats():
+    return {'workers': await asyncio.to_thread(live_workers)}
+
 @app.route('/api/scrape', methods=['POST'])
 async def trigger_scrape():
+    job = await asyncio.to_thread(jobs.submit, 'top-traders')
+    return {'status': 'accepted', 'jobId': job['id'], 'job': job}, 202
+
+@app.route('/api/scrape', methods=['GET'])
+async def list_scrape_jobs():
+    return {'jobs': await asyncio.to_thread(jobs.list)}
+
+async def scheduler_status():
+    # Published by the worker running the scheduler; enabled is what the API last asked for
+    status = await asyncio.to_thread(jobs.get_state, 'schedulerStatus') or {'running': False}
+    requested = await asyncio.to_thread(jobs.get_state, 'scheduler')
+    if requested is not None:
+        status['enabled'] = requested['enabled']
+    return status
+
+@app.route('/api/scheduler', methods=['GET'])
+async def get_scheduler():
+    return await scheduler_status()
+
+@app.route('/api/scheduler', methods=['POST'])
+async def start_scheduler():
+    await asyncio.to_thread(jobs.set_state, 'scheduler', {'enabled': True})
+    return await scheduler_status(), 202
+
+@app.route('/api/scheduler', methods=['DELETE'])
+async def stop_scheduler():
+    await asyncio.to_thread(jobs.set_state, 'scheduler', {'enabled': False})
+    job = await asyncio.to_thread(jobs.active, 'scheduled')
+    if job:
+        await asyncio.to_thread(jobs.cancel, job['id'])
+    return await scheduler_status(), 202
+
+@app.route('/api/scrape/<job_id>', methods=['GET'])
+async def get_scrape_job(job_id):
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return job
+
+@app.route('/api/scrape/<job_id>', methods=['DELETE'])
+async def cancel_scrape_job(job_id):
+    job = await asyncio.to_thread(jobs.cancel, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return job, 202
+
+# Query parameter name -> numeric Token field usable for sort and min_/max_ filters
+TOKEN_METRICS = {
+    'price': 'priceUsd',
+    'txns': 'txnsCount',
+    'volume': 'volumeUsd',
+    'makers': 'makersCount',
+    'trend5m': 'trend5mPct',
+    'trend1h': 'trend1hPct',
+    'trend6h': 'trend6hPct',
+    'trend24h': 'trend24hPct',
+    'liquidity': 'liquidityUsd',
+    'mcap': 'mcapUsd',
+}
+
+# Token fields returned by default and selectable with ?fields=
+TOKEN_FIELDS = [
+    'address', 'chain', 'dex', 'token', 'price', 'age', 'txns', 'volume', 'makers',
+    'trend5m', 'trend1h', 'trend6h', 'trend24h', 'liquidity', 'mcap',
+    *TOKEN_METRICS.values(), 'createdAt', 'updatedAt',
+]
+TOKENS_DEFAULT_LIMIT = 100
+TOKENS_MAX_LIMIT = 1000
+
+def parse_token_query(args):
+    # Returns (where, sort field, order, fields) or raises ValueError with the message for the client
+    sort = args.get('sort', 'createdAt')
+    order = args.get('order', 'desc')
+    if sort != 'createdAt' and sort not in TOKEN_METRICS:
+        raise ValueError(f"Invalid sort. Must be one of: createdAt, {', '.join(TOKEN_METRICS)}")
+    if order not in ('asc', 'desc'):
+        raise ValueError('Invalid order. Must be one of: asc, desc')
+    sort_field = TOKEN_METRICS.get(sort, sort)
+
+    where = {}
+    for name in ('chain', 'dex'):
+        if args.get(name):
+            where[name] = args[name]
+    for name, field in TOKEN_METRICS.items():
+        bounds = {}
+        for prefix, operator in (('min', 'gte'), ('max', 'lte')):
+            value = args.get(f'{prefix}_{name}')
+            if value is None:
+                continue
+            try:
+                bounds[operator] = float(value)
+            except ValueError:
+                raise ValueError(f'Invalid {prefix}_{name}. Must be a number')
+        if bounds:
+            where[field] = bounds
+    # Keyset pagination needs a value to compare, tokens without the sorted metric are left out
+    if sort_field != 'createdAt':
+        where.setdefault(sort_field, {})['not'] = None
+
+    fields = TOKEN_FIELDS
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in TOKEN_FIELDS]
+        if unknown:
+            raise ValueError(f"Invalid fields: {', '.join(unknown)}. Must be among: {', '.join(TOKEN_FIELDS)}")
+    return where, sort_field, order, fields
+
+def parse_limit(value):
+    # None when not given, raises ValueError with the message for the client
+    if value is None:
+        return None
     try:
-        await scrape_top_traders()
-        return {'status': 'success', 'message': 'Scraping completed'}, 200
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}, 500
+        limit = int(value)
+    except ValueError:
+        raise ValueError('Invalid limit. Must be an integer')
+    if limit < 1:
+        raise ValueError('Invalid limit. Must be at least 1')
+    return limit
+
+def project(row, fields):
+    return {field: getattr(row, field) for field in fields}
 
 @app.route('/api/tokens', methods=['GET'])
 async def get_tokens():
+    try:
+        where, sort_field, order, fields = parse_token_query(request.args)
+        keyset = [sort_field, 'address']
+        cursor = decode_cursor(request.args['cursor'], keyset) if request.args.get('cursor') else None
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    stream = request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+    if stream:
+        # One JSON object per line, written as each batch comes off the database; without a
+        # limit every matching token is sent
+        async def lines():
+            async for rows in iter_pages(prisma.token, where, keyset, order, cursor, limit):
+                yield ''.join(json.dumps(project(row, fields), default=json_default) + '\n' for row in rows)
+
+        response = Response(lines(), mimetype='application/x-ndjson')
+        # Quart cuts responses off after RESPONSE_TIMEOUT (60s), a full unlimited stream can take longer
+        response.timeout = None
+        return response
+
+    limit = min(limit or TOKENS_DEFAULT_LIMIT, TOKENS_MAX_LIMIT)
+    # One extra row tells whether there is a next page
     tokens = await prisma.token.find_many(
-        order={
-            'createdAt': 'desc'
-        }
+        where=keyset_where(where, keyset, order, cursor),
+        order=[{field: order} for field in keyset],
+        take=limit + 1
     )
-    return {'tokens': tokens}
+    next_cursor = encode_cursor(tokens[limit - 1], keyset) if len(tokens) > limit else None
+    body = {'tokens': [project(token, fields) for token in tokens[:limit]], 'nextCursor': next_cursor}
+    return Response(json.dumps(body, default=json_default), mimetype='application/json')
 
 @app.route('/api/tokens', methods=['POST'])
 async def add_token():
@@ -64,7 +291,7 @@ async def delete_token(token_id):
 async def get_token_top_traders(token_address):
     period = request.args.get('period', '30d')
     try:
-        limit = min(int(request.args.get('limit', 10)), 30)
+        limit = max(1, min(int(request.args.get('limit', 10)), 30))
     except ValueError:
         limit = 10
 
@@ -72,24 +299,24 @@ async def get_token_top_traders(token_address):
     if period not in valid_periods:
         return jsonify({'error': 'Invalid period. Must be one of: 30d, 7d, 3d, 1d'}), 400
 
+    return await cached_json(
+        ('top-traders', period, token_address, limit),
+        lambda: build_token_top_traders(token_address, period, limit)
+    )
+
+async def build_token_top_traders(token_address, period, limit):
+    columns = ['wallet', 'rank', 'boughtAmount', 'boughtVolume', 'soldAmount', 'soldVolume',
+               'pnl', 'unrealizedValue']
     query = f"""
-        SELECT 
-            wallet,
-            rank,
-            boughtAmount,
-            boughtVolume,
-            soldAmount,
-            soldVolume,
-            pnl,
-            unrealizedValue
-        FROM top_traders
-        WHERE period = '{period}' 
-        AND tokenAddress = '{token_address}'
-        ORDER BY rank ASC
-        LIMIT {limit}
+        SELECT {', '.join(quote(c) for c in columns)}
+        FROM {quote('top_traders')}
+        WHERE {quote('period')} = {placeholder(1)}
+        AND {quote('tokenAddress')} = {placeholder(2)}
+        ORDER BY {quote('rank')} ASC
+        LIMIT {placeholder(3)}
     """
-    
-    results = await prisma.query_raw(query)
+
+    results = await prisma.query_raw(query, period, token_address, limit)
 
     traders = [{
         'wallet': trader['wallet'],
@@ -99,20 +326,47 @@ async def get_token_top_traders(token_address):
         'soldAmount': float(trader['soldAmount']),
         'soldVolume': float(trader['soldVolume']),
         'pnl': float(trader['pnl']),
-        'unrealizedValue': float(trader['unrealizedValue'])
+        'unrealizedValue': float(trader['unrealizedValue']) if trader['unrealizedValue'] is not None else None
     } for trader in results]
 
-    return jsonify({
+    return {
         'period': period,
         'limit': limit,
         'traders': traders
-    })
+    }
+
+def parse_time(value):
+    # ISO 8601 query parameter, naive times are taken as UTC
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+@app.route('/api/top-traders/<token_address>/history/<wallet>', methods=['GET'])
+async def get_wallet_history(token_address, wallet):
+    period = request.args.get('period')
+    if period and period not in ['30d', '7d', '3d', '1d']:
+        return jsonify({'error': 'Invalid period. Must be one of: 30d, 7d, 3d, 1d'}), 400
+    try:
+        start = parse_time(request.args.get('from'))
+        end = parse_time(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 timestamps'}), 400
+
+    async def build():
+        history = await wallet_history(prisma, token_address, wallet, period, start, end)
+        return {'tokenAddress': token_address, 'wallet': wallet, 'period': period, 'history': history}
+
+    return await cached_json(
+        ('history', token_address, wallet, period, request.args.get('from'), request.args.get('to')),
+        build
+    )
 
 @app.route('/api/top-traders', methods=['GET'])
 async def get_top_traders():
     period = request.args.get('period', '30d')
     try:
-        limit = min(int(request.args.get('limit', 10)), 30)
+        limit = max(1, min(int(request.args.get('limit', 10)), LEADERBOARD_MAX_LIMIT))
     except ValueError:
         limit = 10
 
@@ -120,39 +374,227 @@ async def get_top_traders():
     if period not in valid_periods:
         return jsonify({'error': 'Invalid period. Must be one of: 30d, 7d, 3d, 1d'}), 400
 
+    return await cached_json(
+        ('top-traders', period, None, limit),
+        lambda: build_top_traders(period, limit)
+    )
+
+async def build_top_traders(period, limit):
+    # Reads the leaderboard maintained by the scraper writes instead of aggregating top_traders
+    columns = ['wallet', 'totalBoughtAmount', 'totalBoughtVolume', 'totalSoldAmount',
+               'totalSoldVolume', 'totalPnl', 'totalTrades']
     query = f"""
-        SELECT 
-            wallet,
-            SUM(boughtAmount) as total_bought_amount,
-            SUM(boughtVolume) as total_bought_volume,
-            SUM(soldAmount) as total_sold_amount,
-            SUM(soldVolume) as total_sold_volume,
-            SUM(pnl) as total_pnl,
-            COUNT(*) as total_trades
-        FROM top_traders
-        WHERE period = '{period}'
-        GROUP BY wallet
-        ORDER BY total_pnl DESC
-        LIMIT {limit}
+        SELECT {', '.join(quote(c) for c in columns)}
+        FROM {quote('wallet_leaderboard')}
+        WHERE {quote('period')} = {placeholder(1)}
+        ORDER BY {quote('totalPnl')} DESC
+        LIMIT {placeholder(2)}
     """
-    
-    results = await prisma.query_raw(query)
+
+    results = await prisma.query_raw(query, period, limit)
 
     traders = [{
         'wallet': trader['wallet'],
-        'totalPnl': float(trader['total_pnl']),
-        'totalBoughtAmount': float(trader['total_bought_amount']),
-        'totalBoughtVolume': float(trader['total_bought_volume']),
-        'totalSoldAmount': float(trader['total_sold_amount']),
-        'totalSoldVolume': float(trader['total_sold_volume']),
-        'totalTrades': int(trader['total_trades'])
+        'totalPnl': float(trader['totalPnl']),
+        'totalBoughtAmount': float(trader['totalBoughtAmount']),
+        'totalBoughtVolume': float(trader['totalBoughtVolume']),
+        'totalSoldAmount': float(trader['totalSoldAmount']),
+        'totalSoldVolume': float(trader['totalSoldVolume']),
+        'totalTrades': int(trader['totalTrades'])
     } for trader in results]
 
-    return jsonify({
+    return {
         'period': period,
         'limit': limit,
         'traders': traders
-    })
+    }
+
+def export_response(kind, pages, columns):
+    fmt = request.args.get('format', 'csv')
+    media_type, extension = EXPORT_FORMATS[fmt]
+    response = Response(export_chunks(pages, columns, fmt), mimetype=media_type)
+    response.headers['Content-Disposition'] = f'attachment; filename="{kind}.{extension}"'
+    # Whole-table exports outlast Quart's RESPONSE_TIMEOUT (60s), which would cut the file short
+    response.timeout = None
+    return response
+
+def invalid_export_format():
+    if request.args.get('format', 'csv') not in EXPORT_FORMATS:
+        return jsonify({'error': f"Invalid format. Must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    return None
+
+@app.route('/api/export/tokens', methods=['GET'])
+async def export_tokens():
+    error = invalid_export_format()
+    if error:
+        return error
+    where = {}
+    for name in ('chain', 'dex'):
+        if request.args.get(name):
+            where[name] = request.args[name]
+    if request.args.get('token'):
+        where['address'] = request.args['token']
+    pages = iter_pages(prisma.token, where, ['address'], 'asc')
+    return export_response('tokens', pages, list(TOKEN_EXPORT_COLUMNS))
+
+@app.route('/api/export/top-traders', methods=['GET'])
+async def export_top_traders():
+    error = invalid_export_format()
+    if error:
+        return error
+    period = request.args.get('period')
+    if period and period not in ['30d', '7d', '3d', '1d']:
+        return jsonify({'error': 'Invalid period. Must be one of: 30d, 7d, 3d, 1d'}), 400
+
+    where = {}
+    if period:
+        where['period'] = period
+    if request.args.get('token'):
+        where['tokenAddress'] = request.args['token']
+    elif request.args.get('chain'):
+        # top_traders has no chain column, the chain's token addresses stand in for it
+        tokens = await prisma.token.find_many(where={'chain': request.args['chain']})
+        where['tokenAddress'] = {'in': [token.address for token in tokens]}
+    pages = iter_pages(prisma.toptrader, where, ['tokenAddress', 'period', 'rank'], 'asc')
+    return export_response('top-traders', pages, list(TOP_TRADER_EXPORT_COLUMNS))
+
+@app.route('/api/wallets/<wallet>', methods=['GET'])
+async def get_wallet(wallet):
+    return await cached_json(('wallets', wallet), lambda: build_wallets([wallet]))
+
+@app.route('/api/wallets', methods=['POST'])
+async def lookup_wallets():
+    data = await request.get_json(silent=True) or {}
+    wallets = data.get('wallets')
+    if not isinstance(wallets, list) or not all(isinstance(wallet, str) for wallet in wallets):
+        return jsonify({'error': 'Body must be {"wallets": [...]}'}), 400
+    if len(wallets) > WALLETS_MAX_BATCH:
+        return jsonify({'error': f'At most {WALLETS_MAX_BATCH} wallets per request'}), 400
+    wallets = list(dict.fromkeys(wallets))
+    return await cached_json(('wallets', *wallets), lambda: build_wallets(wallets))
+
+async def build_wallets(wallets):
+    # The wallet index on top_traders makes this proportional to the rows found, not the table
+    rows = await prisma.toptrader.find_many(
+        where={'wallet': {'in': wallets}},
+        order=[{'tokenAddress': 'asc'}, {'period': 'asc'}]
+    )
+    tokens = await prisma.token.find_many(where={'address': {'in': list({row.tokenAddress for row in rows})}})
+    token_info = {token.address: {'token': token.token, 'chain': token.chain} for token in tokens}
+
+    positions = {wallet: {} for wallet in wallets}
+    for row in rows:
+        entry = positions[row.wallet].setdefault(row.tokenAddress, {
+            'tokenAddress': row.tokenAddress,
+            **token_info.get(row.tokenAddress, {'token': None, 'chain': None}),
+            'periods': {}
+        })
+        entry['periods'][row.period] = {
+            'rank': row.rank,
+            'pnl': row.pnl,
+            'boughtVolume': row.boughtVolume,
+            'soldVolume': row.soldVolume,
+            'unrealizedValue': row.unrealizedValue
+        }
+
+    return {
+        'wallets': [{
+            'wallet': wallet,
+            'tokenCount': len(tokens_by_address),
+            'tokens': list(tokens_by_address.values())
+        } for wallet, tokens_by_address in positions.items()]
+    }
+
+async def live_token_rows(token_address, period, limit):
+    return (await build_token_top_traders(token_address, period, limit))['traders']
+
+async def live_leaderboard_rows(period, limit):
+    return (await build_top_traders(period, limit))['traders']
+
+# Subscribers to top traders tables, sent diffs as scraped rows land
+live = LiveHub(prisma, {'token': live_token_rows, 'leaderboard': live_leaderboard_rows})
+
+registry.gauge('live_subscribers', 'Open live update connections', [], lambda: {(): live.subscriber_count()})
+
+def live_topic(token_address, period, limit):
+    # (topic, None) for a valid subscription, (None, error) otherwise
+    if period not in ['30d', '7d', '3d', '1d']:
+        return None, 'Invalid period. Must be one of: 30d, 7d, 3d, 1d'
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return None, 'limit must be an integer'
+    if limit < 1:
+        return None, 'limit must be at least 1'
+    if token_address:
+        return ('token', token_address, period, min(limit, 30)), None
+    return ('leaderboard', period, min(limit, LEADERBOARD_MAX_LIMIT)), None
+
+def live_stream(topic):
+    async def events():
+        subscriber = Subscriber(live)
+        try:
+            await live.subscribe(subscriber, topic)
+            while True:
+                message = await subscriber.next(LIVE_KEEPALIVE)
+                if message is None:
+                    yield b': keepalive\n\n'
+                else:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message, default=json_default)}\n\n".encode()
+        finally:
+            live.unsubscribe(subscriber)
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Proxies would otherwise hold the events back until their buffer fills
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+@app.route('/api/live/top-traders/<token_address>', methods=['GET'])
+async def live_token_top_traders(token_address):
+    topic, error = live_topic(token_address, request.args.get('period', '30d'), request.args.get('limit', 10))
+    if error:
+        return jsonify({'error': error}), 400
+    return live_stream(topic)
+
+@app.route('/api/live/top-traders', methods=['GET'])
+async def live_top_traders():
+    topic, error = live_topic(None, request.args.get('period', '30d'), request.args.get('limit', 10))
+    if error:
+        return jsonify({'error': error}), 400
+    return live_stream(topic)
+
+@app.websocket('/api/live')
+async def live_socket():
+    # Clients send {"subscribe": {"token": ..., "period": ..., "limit": ...}} and the same with
+    # "unsubscribe"; leaving out token means the leaderboard. Messages are those of the SSE streams.
+    subscriber = Subscriber(live)
+
+    async def send():
+        while True:
+            message = await subscriber.next(LIVE_KEEPALIVE)
+            await websocket.send(json.dumps(message or {'type': 'keepalive'}, default=json_default))
+
+    sender = asyncio.create_task(send())
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive())
+                action = next(key for key in ('subscribe', 'unsubscribe') if key in data)
+                params = data[action]
+                topic, error = live_topic(params.get('token'), params.get('period', '30d'), params.get('limit', 10))
+            except (ValueError, TypeError, AttributeError, StopIteration):
+                topic, error = None, 'Messages must be {"subscribe": {...}} or {"unsubscribe": {...}}'
+            if error:
+                subscriber.push(None, {'type': 'error', 'error': error})
+            elif action == 'subscribe':
+                await live.subscribe(subscriber, topic)
+            else:
+                live.unsubscribe(subscriber, topic)
+    finally:
+        sender.cancel()
+        live.unsubscribe(subscriber)
 
 if __name__ == '__main__':
     from hypercorn.config import Config
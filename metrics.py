@@ -0,0 +1,222 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+# Directory for per-run JSON traces (Chrome trace event format, opens in Perfetto); unset = no traces
+TRACE_DIR = os.getenv('TRACE_DIR')
+# Spans kept per trace, later ones are counted but dropped
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '200000'))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self, values=None, extra=()):
+        with self.lock:
+            values = dict(self.values if values is None else values)
+        return [(self.name, format_labels(self.labels, key, extra), value) for key, value in values.items()]
+
+    def export(self):
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    def load(self, exported):
+        return {tuple(key): value for key, value in exported}
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket, sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self, values=None, extra=()):
+        samples = []
+        extra = list(extra)
+        with self.lock:
+            values = dict(self.values if values is None else values)
+            for key, (counts, total, count) in values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f'{self.name}_bucket', format_labels(self.labels, key, extra + [('le', f'{bound:g}')]), bucket_count))
+                samples.append((f'{self.name}_bucket', format_labels(self.labels, key, extra + [('le', '+Inf')]), count))
+                samples.append((f'{self.name}_sum', format_labels(self.labels, key, extra), total))
+                samples.append((f'{self.name}_count', format_labels(self.labels, key, extra), count))
+        return samples
+
+    def export(self):
+        with self.lock:
+            return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self.values.items()]
+
+    def load(self, exported):
+        return {tuple(key): state for key, state in exported}
+
+class Gauge:
+    # Read when scraped, from a callback returning {label value tuple: value}; kind='counter'
+    # exposes a count kept elsewhere
+    def __init__(self, name, help, labels, collect, kind='gauge'):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def samples(self):
+        return [(self.name, format_labels(self.labels, key), value) for key, value in self.collect().items()]
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels, collect, kind='gauge'):
+        return self.register(Gauge(name, help, labels, collect, kind))
+
+    def export(self):
+        # Counter and histogram values as JSON, for another process to render
+        return {metric.name: metric.export() for metric in self.metrics if hasattr(metric, 'export')}
+
+    def render(self, remote=None):
+        # Prometheus text exposition format 0.0.4. remote maps a worker id to that worker's
+        # export(); its samples are added with a worker label.
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            samples = metric.samples()
+            for worker, exported in (remote or {}).items():
+                if hasattr(metric, 'load') and metric.name in exported:
+                    samples += metric.samples(metric.load(exported[metric.name]), [('worker', worker)])
+            for name, labels, value in samples:
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+SCRAPE_PHASE_SECONDS = registry.histogram(
+    'scrape_phase_seconds', 'Time spent in each scraper phase', ['phase'])
+DB_WRITE_SECONDS = registry.histogram(
+    'db_write_seconds', 'Time per database write transaction', ['table'])
+DB_ROWS_WRITTEN = registry.counter(
+    'db_rows_written_total', 'Rows upserted by the scrapers', ['table'])
+SCRAPE_TOKENS = registry.counter(
+    'scrape_tokens_total', 'Tokens processed by the top traders scraper', ['status'])
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'API request latency', ['method', 'route', 'status'])
+LIVE_MESSAGES_DROPPED = registry.counter(
+    'live_messages_dropped_total', 'Live updates dropped for lagging subscribers, who got a snapshot instead')
+
+class Tracer:
+    def __init__(self):
+        self.run_id = None
+        self.started = None
+        self.spans = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def start(self, run_id):
+        with self.lock:
+            self.run_id = run_id
+            self.started = time.time()
+            self.spans = []
+            self.dropped = 0
+
+    def add(self, name, seconds, **attrs):
+        # The span ends now and lasted seconds
+        if self.run_id is None:
+            return
+        end = time.time()
+        with self.lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append({
+                'name': name,
+                'ph': 'X',
+                'ts': int((end - seconds) * 1e6),
+                'dur': int(seconds * 1e6),
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': attrs,
+            })
+
+    def dump(self, directory=TRACE_DIR):
+        # Writes the trace of the current run and stops tracing; returns the file path
+        with self.lock:
+            run_id, spans, dropped = self.run_id, self.spans, self.dropped
+            self.run_id = None
+            self.spans = []
+        if not directory or run_id is None:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'trace-{run_id}.json')
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': spans, 'otherData': {'runId': run_id, 'droppedSpans': dropped}}, file)
+        print(f"Trace with {len(spans)} spans written to {path}")
+        return path
+
+tracer = Tracer()
+
+def start_trace(run_id):
+    if TRACE_DIR:
+        tracer.start(run_id)
+
+def observe_phase(phase, seconds):
+    SCRAPE_PHASE_SECONDS.observe(seconds, phase=phase)
+    tracer.add(phase, seconds)
+
+@contextmanager
+def timed_write(table, rows):
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    DB_WRITE_SECONDS.observe(seconds, table=table)
+    DB_ROWS_WRITTEN.inc(rows, table=table)
+    tracer.add(f'db_write_{table}', seconds, rows=rows)
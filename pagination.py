@@ -0,0 +1,68 @@
+from datetime import datetime
+import base64
+import json
+
+# Rows fetched per database round trip when streaming
+STREAM_BATCH_SIZE = 500
+DATETIME_FIELDS = ('createdAt', 'updatedAt')
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def row_key(row, fields):
+    return tuple(getattr(row, field) for field in fields)
+
+def encode_cursor(row, fields):
+    # Opaque to clients: the values of the ordering fields on the last row of the page
+    payload = json.dumps(list(row_key(row, fields)), default=json_default)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, fields):
+    # Raises ValueError for anything encode_cursor did not produce for these fields
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError('Invalid cursor')
+    return tuple(
+        datetime.fromisoformat(value) if field in DATETIME_FIELDS else value
+        for field, value in zip(fields, values)
+    )
+
+def keyset_where(where, fields, order, cursor):
+    # Rows strictly after the cursor in the order of fields, the last field must be unique
+    # together with the others: (a > x) OR (a = x AND b > y) OR ...
+    if cursor is None:
+        return where
+    operator = 'lt' if order == 'desc' else 'gt'
+    branches = []
+    for i, field in enumerate(fields):
+        branch = {previous: value for previous, value in zip(fields[:i], cursor[:i])}
+        branch[field] = {operator: cursor[i]}
+        branches.append(branch)
+    after = {'OR': branches}
+    return {'AND': [where, after]} if where else after
+
+async def iter_pages(model, where, fields, order, cursor=None, limit=None, batch_size=STREAM_BATCH_SIZE):
+    # Yields lists of rows, one database query per list, until limit rows or the end of the table;
+    # only one batch is held at a time
+    remaining = limit
+    while remaining is None or remaining > 0:
+        take = batch_size if remaining is None else min(batch_size, remaining)
+        rows = await model.find_many(
+            where=keyset_where(where, fields, order, cursor),
+            order=[{field: order} for field in fields],
+            take=take
+        )
+        if not rows:
+            return
+        yield rows
+        if len(rows) < take:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        cursor = row_key(rows[-1], fields)
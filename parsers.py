@@ -0,0 +1,373 @@
+from typing import NamedTuple
+import os
+import sys
+import time
+
+# Backend used when the scrapers parse page HTML: html.parser, bs4-lxml, lxml or selectolax
+PARSER_BACKEND = os.getenv('PARSER_BACKEND', 'html.parser')
+
+class TraderRow(NamedTuple):
+    rank: str
+    wallet: str
+    bought: str
+    bought_volume: str
+    sold: str
+    sold_volume: str
+    pnl: str
+    unrealized: str
+    balance: str
+    txns: str
+
+class TokenRow(NamedTuple):
+    address: str
+    chain: str
+    dex: str
+    token: str
+    price: str = ''
+    age: str = ''
+    txns: str = ''
+    volume: str = ''
+    makers: str = ''
+    trend5m: str = ''
+    trend1h: str = ''
+    trend6h: str = ''
+    trend24h: str = ''
+    liquidity: str = ''
+    mcap: str = ''
+
+# Token list column headers as shown by DexScreener, mapped to TokenRow fields
+TOKEN_HEADER_FIELDS = {
+    'Token': 'token',
+    'Price': 'price',
+    'Age': 'age',
+    'Txns': 'txns',
+    'Volume': 'volume',
+    'Makers': 'makers',
+    '5M': 'trend5m',
+    '1H': 'trend1h',
+    '6H': 'trend6h',
+    '24H': 'trend24h',
+    'Liquidity': 'liquidity',
+    'MCAP': 'mcap',
+}
+# Used for saved row dumps, which carry no header row
+DEFAULT_TOKEN_HEADERS = list(TOKEN_HEADER_FIELDS)
+
+SELECTORS = {
+    'trader_row': '.custom-1nvxwu0',
+    'rank': '.custom-q9k0mw',
+    'wallet_link': '.custom-1dwgrrr a',
+    'amount': '.custom-1o79wax',
+    'bought': '.custom-6qd5i2, .custom-rcecxm',
+    'sold': '.custom-6qd5i2, .custom-dv3t8y',
+    'volume': '.custom-2ygcmq',
+    'pnl': '.custom-1e9y0rl, .custom-1yklr7h',
+    'unrealized': '.custom-1hd7h4r',
+    'unrealized_value': '.custom-6qd5i2',
+    'balance': '.custom-1cicvqe',
+    'balance_unknown': '.custom-sqw9c5',
+    'txns': '.custom-13ppmr2',
+    'token_table': '.ds-dex-table-top',
+    'token_header': '.ds-table-th-button',
+    'token_row': '.ds-dex-table-row',
+    'token_cell': '.ds-table-data-cell',
+    'chain_icon': '.ds-dex-table-row-chain-icon',
+    'dex_icon': '.ds-dex-table-row-dex-icon',
+    'symbol': '.ds-dex-table-row-base-token-symbol',
+}
+
+def convert_to_number(value):
+    if value == '-' or value == 'Unknown':
+        return '0'
+    # Remove $, commas, and < symbols
+    value = value.replace('$', '').replace(',', '').replace('<', '')
+
+    # Handle K, M, B multipliers
+    multipliers = {'K': 1000, 'M': 1000000, 'B': 1000000000}
+    for suffix, multiplier in multipliers.items():
+        if suffix in value:
+            number = float(value.replace(suffix, '')) * multiplier
+            return str(number)
+    return value
+
+class Bs4Backend:
+    def __init__(self, parser='html.parser'):
+        from bs4 import BeautifulSoup
+        import soupsieve
+
+        self.name = 'bs4-lxml' if parser == 'lxml' else parser
+        self.parser = parser
+        self.soup = BeautifulSoup
+        self.compiled = {name: soupsieve.compile(selector) for name, selector in SELECTORS.items()}
+
+    def parse(self, html):
+        return self.soup(html, self.parser)
+
+    def select(self, node, name):
+        return self.compiled[name].select(node)
+
+    def select_one(self, node, name):
+        return self.compiled[name].select_one(node)
+
+    def text(self, node):
+        return node.text
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def has_class(self, node, name):
+        return name in node.get('class', [])
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import html
+        from lxml.cssselect import CSSSelector
+
+        self.html = html
+        self.compiled = {name: CSSSelector(selector) for name, selector in SELECTORS.items()}
+
+    def parse(self, html):
+        return self.html.fragment_fromstring(html, create_parent='div')
+
+    def select(self, node, name):
+        return self.compiled[name](node)
+
+    def select_one(self, node, name):
+        matches = self.compiled[name](node)
+        return matches[0] if matches else None
+
+    def text(self, node):
+        return node.text_content()
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def has_class(self, node, name):
+        return name in node.get('class', '').split()
+
+class SelectolaxBackend:
+    name = 'selectolax'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        # Lexbor compiles selectors internally, there is nothing to prepare up front
+        self.parser = LexborHTMLParser
+
+    def parse(self, html):
+        return self.parser(html).root
+
+    def select(self, node, name):
+        return node.css(SELECTORS[name])
+
+    def select_one(self, node, name):
+        return node.css_first(SELECTORS[name])
+
+    def text(self, node):
+        return node.text(deep=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+    def has_class(self, node, name):
+        return name in (node.attributes.get('class') or '').split()
+
+BACKENDS = {
+    'html.parser': lambda: Bs4Backend('html.parser'),
+    'bs4-lxml': lambda: Bs4Backend('lxml'),
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend,
+}
+
+_backends = {}
+
+def get_backend(name=None):
+    name = name or PARSER_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {name}. Must be one of: {', '.join(BACKENDS)}")
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+def available_backends():
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+def raw_trader_row(p, row):
+    amounts = p.select(row, 'amount')
+    bought_div = amounts[0]
+    sold_div = amounts[1]
+    wallet_link = p.select_one(row, 'wallet_link')
+    bought_span = p.select_one(bought_div, 'bought')
+    bought_volume_span = p.select_one(bought_div, 'volume')
+    sold_span = p.select_one(sold_div, 'sold')
+    sold_volume_span = p.select_one(sold_div, 'volume')
+    pnl_element = p.select_one(row, 'pnl')
+    unrealized_div = p.select_one(row, 'unrealized')
+    unrealized_span = p.select_one(unrealized_div, 'unrealized_value')
+    balance_div = p.select_one(row, 'balance')
+    txns_element = p.select_one(row, 'txns')
+
+    return {
+        'rank': p.text(p.select_one(row, 'rank')),
+        'walletHref': p.attr(wallet_link, 'href') if wallet_link is not None else None,
+        'bought': p.text(bought_span) if bought_span is not None else None,
+        'boughtVolume': p.text(bought_volume_span) if bought_volume_span is not None else None,
+        'sold': p.text(sold_span) if sold_span is not None else None,
+        'soldVolume': p.text(sold_volume_span) if sold_volume_span is not None else None,
+        'pnl': p.text(pnl_element) if pnl_element is not None else None,
+        'pnlPositive': pnl_element is not None and p.has_class(pnl_element, 'custom-1e9y0rl'),
+        'unrealized': p.text(unrealized_span if unrealized_span is not None else unrealized_div),
+        'balanceUnknown': p.select_one(balance_div, 'balance_unknown') is not None,
+        'balance': [p.text(span) for span in p.select(balance_div, 'volume')],
+        'txns': p.text(txns_element) if txns_element is not None else None,
+    }
+
+def build_trader_row(raw):
+    # Extract rank
+    rank = raw['rank'].strip('#')
+
+    # Extract wallet address from explorer link
+    wallet = raw['walletHref'].split('/')[-1] if raw['walletHref'] else '-'
+
+    # Extract bought amount and volume, rows without buys are skipped
+    bought = convert_to_number(raw['bought']) if raw['bought'] is not None else '0'
+    if bought == '0':
+        return None
+    bought_volume = convert_to_number(raw['boughtVolume']) if raw['boughtVolume'] is not None else '0'
+
+    # Extract sold amount and volume
+    sold = convert_to_number(raw['sold']) if raw['sold'] is not None else '0'
+    if sold != '0':
+        sold_volume = convert_to_number(raw['soldVolume']) if raw['soldVolume'] is not None else '0'
+    else:
+        sold_volume = '0'
+
+    # Extract PNL with sign, custom-1e9y0rl is positive, custom-1yklr7h is negative
+    if raw['pnl'] is not None:
+        raw_value = float(convert_to_number(raw['pnl']))
+        pnl = str(raw_value) if raw['pnlPositive'] else str(-raw_value)
+    else:
+        pnl = '0'
+
+    # Extract unrealized value
+    unrealized = convert_to_number(raw['unrealized'])
+
+    # Extract balance
+    if raw['balanceUnknown'] or len(raw['balance']) < 2:
+        balance = '0'
+    else:
+        current_balance = convert_to_number(raw['balance'][0])
+        total_supply = convert_to_number(raw['balance'][1])
+        balance = f"{current_balance}/{total_supply}"
+
+    # Extract transactions count
+    txns = raw['txns'].split('/')[1].strip().split()[0] if raw['txns'] else '0'
+
+    return TraderRow(rank, wallet, bought, bought_volume, sold, sold_volume, pnl, unrealized, balance, txns)
+
+def build_trader_rows(raw_rows):
+    data = []
+    for raw in raw_rows:
+        row_data = build_trader_row(raw)
+        if row_data:
+            data.append(row_data)
+    return data
+
+def extract_table_data(html, backend=None):
+    p = get_backend(backend)
+    root = p.parse(html)
+    return build_trader_rows(raw_trader_row(p, row) for row in p.select(root, 'trader_row'))
+
+def raw_token_row(p, row, cells):
+    chain_img = p.select_one(cells[0], 'chain_icon')
+    dex_img = p.select_one(cells[0], 'dex_icon')
+    symbol_element = p.select_one(cells[0], 'symbol')
+
+    return {
+        'href': p.attr(row, 'href') or '',
+        'chain': (p.attr(chain_img, 'title') or '') if chain_img is not None else '',
+        'dex': (p.attr(dex_img, 'title') or '') if dex_img is not None else '',
+        'symbol': p.text(symbol_element).strip() if symbol_element is not None else '',
+        'cells': [p.text(cell).strip() for cell in cells[1:]],
+    }
+
+def build_token_row(header_fields, raw):
+    # Get token address from link
+    link = raw['href']
+    address = link.split('/')[-1] if link else ''
+
+    values = [raw['symbol']] + raw['cells']
+    if not (address or raw['chain'] or raw['dex'] or any(values)):
+        return None
+    fields = {field: value for field, value in zip(header_fields, values) if field}
+    return TokenRow(address=address, chain=raw['chain'], dex=raw['dex'], **{'token': '', **fields})
+
+def build_token_rows(raw_headers, raw_rows):
+    header_fields = [TOKEN_HEADER_FIELDS.get(header) for header in raw_headers]
+    rows_data = []
+    for raw in raw_rows:
+        row_data = build_token_row(header_fields, raw)
+        if row_data:
+            rows_data.append(row_data)
+    return rows_data
+
+def extract_token_rows(html, backend=None):
+    # Returns None when the page has no token table, saved row dumps are parsed as-is
+    p = get_backend(backend)
+    root = p.parse(html)
+    container = p.select_one(root, 'token_table')
+    if container is not None:
+        headers = [p.text(header).strip() for header in p.select(container, 'token_header')]
+        headers = [header for header in headers if header]
+    else:
+        container = root
+        headers = DEFAULT_TOKEN_HEADERS
+
+    rows = p.select(container, 'token_row')
+    if not rows and container is root:
+        return None
+
+    raw_rows = []
+    for row in rows:
+        cells = p.select(row, 'token_cell')
+        if cells:
+            raw_rows.append(raw_token_row(p, row, cells))
+    return build_token_rows(headers, raw_rows)
+
+def check_fixtures(paths, repeat=5):
+    # Parses every fixture with every installed backend, compares the rows
+    # with html.parser and reports rows/sec. Returns False on any mismatch.
+    backends = available_backends()
+    ok = True
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        extract = extract_table_data if 'custom-1nvxwu0' in html else extract_token_rows
+        expected = extract(html, 'html.parser')
+        print(f"{path}: {len(expected or [])} rows ({extract.__name__})")
+        for name in backends:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                rows = extract(html, name)
+            elapsed = time.perf_counter() - start
+            rate = len(rows or []) * repeat / elapsed if elapsed > 0 else 0
+            status = 'ok' if rows == expected else 'MISMATCH'
+            if rows != expected:
+                ok = False
+            print(f"  {name:<12} {status:<9} {rate:>10.0f} rows/sec")
+    return ok
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python parsers.py <saved page or rows dump>...")
+        sys.exit(2)
+    sys.exit(0 if check_fixtures(sys.argv[1:]) else 1)
@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from metrics import observe_phase
+from selenium.webdriver.support.ui import WebDriverWait
+import threading
+import time
+
+# Resolves once no DOM mutation has been seen under the target for quiet_ms,
+# or with false when the timeout is reached first
+DOM_QUIET_SCRIPT = """
+const [selector, quietMs, timeoutMs, done] = arguments;
+const target = (selector && document.querySelector(selector)) || document.body;
+if (!target) { done(false); return; }
+let quietTimer = null;
+const finish = (result) => {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(timeoutTimer);
+    done(result);
+};
+const observer = new MutationObserver(() => {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => finish(true), quietMs);
+});
+observer.observe(target, {childList: true, subtree: true, characterData: true, attributes: true});
+quietTimer = setTimeout(() => finish(true), quietMs);
+const timeoutTimer = setTimeout(() => finish(false), timeoutMs);
+"""
+
+# Cheap fingerprint of an element: its class, state attributes and text length
+ELEMENT_STATE_SCRIPT = """
+const el = arguments[0];
+if (!el || !el.isConnected) return null;
+return [el.className, el.getAttribute('aria-pressed'), el.getAttribute('aria-selected'),
+        el.getAttribute('data-state'), el.textContent.length].join('|');
+"""
+
+TABLE_SIGNATURE_SCRIPT = """
+const table = document.querySelector(arguments[0]);
+if (!table) return null;
+const rows = table.querySelectorAll(arguments[1]);
+return rows.length + '|' + (rows.length ? rows[0].textContent + rows[rows.length - 1].textContent : '');
+"""
+
+class WaitTimings:
+    def __init__(self):
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    def record(self, label, seconds, timed_out=False):
+        # Every timing also feeds the scrape_phase_seconds histogram and the run's trace
+        observe_phase(label, seconds)
+        with self.lock:
+            stats = self.timings.setdefault(label, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            if timed_out:
+                stats['timeouts'] += 1
+
+    def summary(self):
+        with self.lock:
+            return {
+                label: {**stats, 'avg': stats['total'] / stats['count']}
+                for label, stats in self.timings.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+
+    def report(self):
+        for label, stats in sorted(self.summary().items()):
+            print(f"Timing {label}: {stats['count']} waits | avg {stats['avg']:.2f}s | max {stats['max']:.2f}s | total {stats['total']:.2f}s | timeouts {stats['timeouts']}")
+
+wait_timings = WaitTimings()
+
+@contextmanager
+def timed(label):
+    # Times a scraper phase that is not a wait, e.g. a page navigation or a parse
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        wait_timings.record(label, time.monotonic() - start)
+
+def wait_until(label, condition, timeout, poll=0.1):
+    start = time.monotonic()
+    result = None
+    while True:
+        try:
+            result = condition()
+        except Exception:
+            result = None
+        if result:
+            wait_timings.record(label, time.monotonic() - start)
+            return result
+        if time.monotonic() - start >= timeout:
+            wait_timings.record(label, time.monotonic() - start, timed_out=True)
+            return result
+        time.sleep(poll)
+
+def wait_for_document_ready(driver, timeout=60, label='document_ready', states=('complete',)):
+    # With the eager page-load strategy 'interactive' is enough, the row waits cover the rest
+    start = time.monotonic()
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script('return document.readyState') in states)
+    wait_timings.record(label, time.monotonic() - start)
+
+def wait_for_dom_quiet(driver, selector=None, quiet_ms=300, timeout=10, label='dom_quiet'):
+    start = time.monotonic()
+    driver.set_script_timeout(timeout + 5)
+    try:
+        quiet = driver.execute_async_script(DOM_QUIET_SCRIPT, selector, quiet_ms, int(timeout * 1000))
+    except Exception:
+        quiet = False
+    wait_timings.record(label, time.monotonic() - start, timed_out=not quiet)
+    return quiet
+
+def count_rows(driver, selector):
+    return driver.execute_script('return document.querySelectorAll(arguments[0]).length', selector)
+
+def wait_for_rows_settled(driver, selector, min_rows=1, stable_for=0.5, timeout=10, poll=0.1, label='rows_settled'):
+    state = {'count': -1, 'since': time.monotonic()}
+
+    def settled():
+        count = count_rows(driver, selector)
+        now = time.monotonic()
+        if count != state['count']:
+            state['count'] = count
+            state['since'] = now
+            return False
+        return count >= min_rows and now - state['since'] >= stable_for
+
+    wait_until(label, settled, timeout, poll)
+    return max(state['count'], 0)
+
+def scroll_until_settled(driver, max_scrolls=10, quiet_ms=500, timeout=5, label='scroll'):
+    start = time.monotonic()
+    scroll_height = 0
+    for _ in range(max_scrolls):
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        wait_for_dom_quiet(driver, quiet_ms=quiet_ms, timeout=timeout, label=f'{label}_step')
+
+        new_height = driver.execute_script("return document.body.scrollHeight")
+        if new_height == scroll_height:
+            break
+        scroll_height = new_height
+    wait_timings.record(label, time.monotonic() - start)
+
+def element_state(driver, element):
+    return driver.execute_script(ELEMENT_STATE_SCRIPT, element)
+
+def table_signature(driver, table_selector, row_selector):
+    return driver.execute_script(TABLE_SIGNATURE_SCRIPT, table_selector, row_selector)
+
+def click_and_wait_for_table(driver, button, table_selector, row_selector, timeout=10, label='table_switch'):
+    # The button's active state flips as soon as the click registers, the table only once
+    # the new data has rendered, so the table contents are what we actually wait on
+    start = time.monotonic()
+    button_before = element_state(driver, button)
+    table_before = table_signature(driver, table_selector, row_selector)
+    driver.execute_script("arguments[0].click();", button)
+
+    state = {'button_changed': False}
+
+    def table_changed():
+        if not state['button_changed'] and element_state(driver, button) != button_before:
+            state['button_changed'] = True
+            wait_timings.record(f'{label}_button', time.monotonic() - start)
+        return table_signature(driver, table_selector, row_selector) != table_before
+
+    changed = wait_until(label, table_changed, timeout)
+    wait_for_dom_quiet(driver, table_selector, quiet_ms=200, timeout=timeout, label=f'{label}_render')
+    return changed
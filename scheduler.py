@@ -0,0 +1,161 @@
+from datetime import datetime, timezone
+from db import binds_timestamps, placeholder, quote, timestamp_sql, timestamp_value
+from fingerprints import FRESH_PERIOD
+from toptraders import get_tokens, scrape_top_traders
+import asyncio
+import math
+import os
+import pandas as pd
+import threading
+import time
+
+# Refresh interval of the hottest and the coldest tokens, in seconds
+SCHEDULER_MIN_INTERVAL = float(os.getenv('SCHEDULER_MIN_INTERVAL', '300'))
+SCHEDULER_MAX_INTERVAL = float(os.getenv('SCHEDULER_MAX_INTERVAL', '21600'))
+# Tokens scraped per scheduled run, the most overdue first
+SCHEDULER_BATCH_SIZE = int(os.getenv('SCHEDULER_BATCH_SIZE', '50'))
+# Seconds to wait before looking again when nothing is due
+SCHEDULER_IDLE_WAIT = float(os.getenv('SCHEDULER_IDLE_WAIT', '30'))
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '0').lower() in ('1', 'true', 'yes')
+
+# Token metric -> weight in the heat score; each metric is ranked across all tokens first,
+# so the score does not depend on the units
+PRIORITY_WEIGHTS = {
+    'volumeUsd': 0.4,
+    'trend5mPct': 0.35,
+    'liquidityUsd': 0.25,
+}
+
+def heat_scores(tokens):
+    # 0 for the coldest token, 1 for the hottest; trend counts in both directions
+    frame = pd.DataFrame(
+        [[getattr(token, metric) for metric in PRIORITY_WEIGHTS] for token in tokens],
+        columns=list(PRIORITY_WEIGHTS), dtype='float64'
+    )
+    frame['trend5mPct'] = frame['trend5mPct'].abs()
+    ranks = frame.rank(pct=True).fillna(0)
+    return sum(ranks[metric] * weight for metric, weight in PRIORITY_WEIGHTS.items()) / sum(PRIORITY_WEIGHTS.values())
+
+def refresh_interval(score):
+    # Geometric between the two bounds, hot tokens get minutes and cold ones hours
+    return SCHEDULER_MAX_INTERVAL * (SCHEDULER_MIN_INTERVAL / SCHEDULER_MAX_INTERVAL) ** score
+
+async def last_scraped(db):
+    fingerprints = await db.toptraderfingerprint.find_many(where={'period': FRESH_PERIOD})
+    return {row.tokenAddress: row.checkedAt for row in fingerprints}
+
+def as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+async def due_tokens(db, limit=SCHEDULER_BATCH_SIZE):
+    # Tokens whose time since the last scrape passed their refresh interval, most overdue first.
+    # A token scheduled since its last stored scrape (it failed, or had no rows to store) counts
+    # from that attempt instead, so it waits its interval like the rest; only tokens never tried
+    # come before everything else.
+    tokens = await get_tokens(db)
+    if not tokens:
+        return []
+    scraped = await last_scraped(db)
+    now = datetime.now(timezone.utc)
+    due = []
+    for token, score in zip(tokens, heat_scores(tokens)):
+        attempts = [as_utc(at) for at in (scraped.get(token.address), token.scheduledAt) if at is not None]
+        if not attempts:
+            overdue = math.inf
+        else:
+            overdue = (now - max(attempts)).total_seconds() / refresh_interval(score)
+        if overdue >= 1:
+            due.append((overdue, score, token))
+    due.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [token for _, _, token in due[:limit]]
+
+async def mark_scheduled(db, tokens):
+    # Raw write, the client's update would move updatedAt, which only follows real changes of the token
+    if not tokens:
+        return
+    binds = [timestamp_value()] if binds_timestamps() else []
+    addresses = ', '.join(placeholder(len(binds) + i) for i in range(1, len(tokens) + 1))
+    await db.execute_raw(
+        f"UPDATE {quote('tokens')} SET {quote('scheduled_at')} = {timestamp_sql(1)} "
+        f"WHERE {quote('address')} IN ({addresses})",
+        *binds, *(token.address for token in tokens)
+    )
+
+async def scrape_due_tokens(progress=None, limit=SCHEDULER_BATCH_SIZE):
+    async def select(db):
+        tokens = await due_tokens(db, limit)
+        await mark_scheduled(db, tokens)
+        return tokens
+
+    await scrape_top_traders(progress=progress, resume=False, select=select)
+
+class Scheduler:
+    # Keeps a 'scheduled' job in the job queue, one run at a time, so scheduled and manual scrapes
+    # go through the same workers. Runs in the worker processes; the API turns it on and off
+    # through the queue state, and only one scheduled job is queued however many workers run it.
+    def __init__(self, queue, idle_wait=SCHEDULER_IDLE_WAIT):
+        self.queue = queue
+        self.idle_wait = idle_wait
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.job = None
+        self.runs = 0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def enabled(self):
+        state = self.queue.get_state('scheduler')
+        return SCHEDULER_ENABLED if state is None else state['enabled']
+
+    def start(self):
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self.loop, name='scrape-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def loop(self):
+        while not self.stop_event.is_set():
+            if not self.enabled():
+                self.publish()
+                self.stop_event.wait(self.idle_wait)
+                continue
+            self.job = self.queue.submit('scheduled', unless_active=True)
+            self.publish()
+            while self.job and self.job['status'] in ('pending', 'running') and not self.stop_event.is_set():
+                self.stop_event.wait(1)
+                self.job = self.queue.get(self.job['id'])
+            self.runs += 1
+            self.publish()
+            if not self.job or not self.job['tokensTotal']:
+                self.stop_event.wait(self.idle_wait)
+
+    def publish(self):
+        self.queue.set_state('schedulerStatus', self.status())
+
+    def status(self):
+        return {
+            'running': self.running and self.enabled(),
+            'runs': self.runs,
+            'startedAt': self.started_at,
+            'currentJob': self.job if self.job and self.job['status'] in ('pending', 'running') else None,
+            'minInterval': SCHEDULER_MIN_INTERVAL,
+            'maxInterval': SCHEDULER_MAX_INTERVAL,
+            'batchSize': SCHEDULER_BATCH_SIZE,
+            'updatedAt': time.time(),
+        }
+
+async def main():
+    while True:
+        await scrape_due_tokens()
+        await asyncio.sleep(SCHEDULER_IDLE_WAIT)
+
+if __name__ == "__main__":
+    asyncio.run(main())
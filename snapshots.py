@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta, timezone
+from db import MAX_PARAMS, build_insert_ignore, execute_upsert, placeholder, quote
+import asyncio
+import os
+import sys
+import uuid
+
+SNAPSHOT_TABLE = 'top_trader_snapshots'
+SNAPSHOT_KEY = ['runId', 'tokenAddress', 'period', 'rank']
+# top_traders column -> snapshot column, display strings are left out, the numbers carry the same data
+SNAPSHOT_VALUES = [
+    'boughtAmount', 'boughtVolume', 'soldAmount', 'soldVolume', 'pnl',
+    'unrealizedValue', 'balanceAmount', 'transactionCount',
+]
+SNAPSHOT_COLUMNS = SNAPSHOT_KEY + ['walletId'] + SNAPSHOT_VALUES
+WALLET_TABLE = 'wallets'
+
+# Compacted snapshots, partitioned as period=<period>/date=<YYYY-MM-DD>/part-<id>.parquet
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+# Snapshots older than this move from the database to Parquet files
+SNAPSHOT_COMPACT_AFTER_DAYS = float(os.getenv('SNAPSHOT_COMPACT_AFTER_DAYS', '7'))
+# Rows read from the database per compaction step
+SNAPSHOT_COMPACT_BATCH = int(os.getenv('SNAPSHOT_COMPACT_BATCH', '50000'))
+
+async def intern_wallets(tx, wallets):
+    # Wallet address -> integer id, new addresses get an id on the way
+    wallets = sorted(set(wallets))
+    ids = {}
+    for i in range(0, len(wallets), MAX_PARAMS):
+        chunk = wallets[i:i + MAX_PARAMS]
+        await tx.execute_raw(build_insert_ignore(WALLET_TABLE, ['address'], ['address'], len(chunk)), *chunk)
+        rows = await tx.query_raw(
+            f"SELECT {quote('id')}, {quote('address')} FROM {quote(WALLET_TABLE)} "
+            f"WHERE {quote('address')} IN ({', '.join(placeholder(j) for j in range(1, len(chunk) + 1))})",
+            *chunk
+        )
+        ids.update({row['address']: int(row['id']) for row in rows})
+    return ids
+
+async def append_snapshots(tx, run_id, columns, rows):
+    # Runs in the top_traders upsert transaction, so history only holds rows that were stored.
+    # Unchanged tables are never written, the history is one row per change.
+    index = {column: i for i, column in enumerate(columns)}
+    wallet_ids = await intern_wallets(tx, [row[index['wallet']] for row in rows])
+    records = [
+        [run_id, row[index['tokenAddress']], row[index['period']], row[index['rank']],
+         wallet_ids[row[index['wallet']]], *(row[index[column]] for column in SNAPSHOT_VALUES)]
+        for row in rows
+    ]
+    await execute_upsert(tx, SNAPSHOT_TABLE, SNAPSHOT_COLUMNS, SNAPSHOT_KEY, records,
+                         timestamp_columns=('scrapedAt',))
+
+def snapshot_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('runId', pa.dictionary(pa.int32(), pa.string())),
+        ('tokenAddress', pa.dictionary(pa.int32(), pa.string())),
+        ('rank', pa.int16()),
+        ('walletId', pa.int32()),
+        *((column, pa.float64()) for column in SNAPSHOT_VALUES if column != 'transactionCount'),
+        ('transactionCount', pa.int32()),
+        ('scrapedAt', pa.timestamp('ms', tz='UTC')),
+    ])
+
+def snapshot_frame(snapshots):
+    import pandas as pd
+
+    frame = pd.DataFrame([
+        {**{column: getattr(snapshot, column) for column in SNAPSHOT_COLUMNS}, 'scrapedAt': snapshot.scrapedAt}
+        for snapshot in snapshots
+    ], columns=SNAPSHOT_COLUMNS + ['scrapedAt'])
+    frame['scrapedAt'] = pd.to_datetime(frame['scrapedAt'], utc=True)
+    frame['date'] = frame['scrapedAt'].dt.strftime('%Y-%m-%d')
+    return frame
+
+def write_partitions(frame, directory=SNAPSHOT_DIR):
+    # One new file per (period, date) in the batch, sorted so row group statistics can skip
+    # everything but the token and wallet a history query asks for
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = snapshot_schema()
+    written = 0
+    for (period, date), group in frame.groupby(['period', 'date']):
+        group = group.sort_values(['tokenAddress', 'walletId', 'scrapedAt'])
+        table = pa.Table.from_pandas(group[schema.names], schema=schema, preserve_index=False)
+        path = os.path.join(directory, f'period={period}', f'date={date}')
+        os.makedirs(path, exist_ok=True)
+        pq.write_table(table, os.path.join(path, f'part-{uuid.uuid4().hex}.parquet'),
+                       compression='zstd', row_group_size=100000)
+        written += len(group)
+    return written
+
+async def compact_snapshots(db, older_than_days=SNAPSHOT_COMPACT_AFTER_DAYS, directory=SNAPSHOT_DIR):
+    # Moves old snapshots out of the database. Rows are paged by primary key and only deleted
+    # once every file is written; a crash in between leaves copies that history reads drop.
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    where = {'scrapedAt': {'lt': cutoff}}
+    order = [{column: 'asc'} for column in SNAPSHOT_KEY]
+    compacted = 0
+    cursor = None
+    while True:
+        page = {'cursor': {'runId_tokenAddress_period_rank': cursor}, 'skip': 1} if cursor else {}
+        snapshots = await db.toptradersnapshot.find_many(where=where, order=order, take=SNAPSHOT_COMPACT_BATCH, **page)
+        if not snapshots:
+            break
+        compacted += write_partitions(snapshot_frame(snapshots), directory)
+        last = snapshots[-1]
+        cursor = {column: getattr(last, column) for column in SNAPSHOT_KEY}
+    if compacted:
+        await db.toptradersnapshot.delete_many(where=where)
+    return compacted
+
+def read_compacted_history(token_address, wallet_id, period=None, start=None, end=None, directory=SNAPSHOT_DIR):
+    # Partition pruning on period and date, then predicate pushdown on the sorted columns
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if not os.path.isdir(directory):
+        return []
+    partitioning = ds.partitioning(pa.schema([('period', pa.string()), ('date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(directory, format='parquet', partitioning=partitioning)
+    condition = (ds.field('tokenAddress') == token_address) & (ds.field('walletId') == wallet_id)
+    if period:
+        condition &= ds.field('period') == period
+    if start:
+        condition &= (ds.field('date') >= start.strftime('%Y-%m-%d')) & (ds.field('scrapedAt') >= start)
+    if end:
+        condition &= (ds.field('date') <= end.strftime('%Y-%m-%d')) & (ds.field('scrapedAt') <= end)
+    table = dataset.to_table(filter=condition, columns=['runId', 'period', 'rank', 'scrapedAt'] + SNAPSHOT_VALUES)
+    return table.to_pylist()
+
+async def wallet_history(db, token_address, wallet, period=None, start=None, end=None):
+    # Snapshots of one wallet on one token, oldest first, from the Parquet files and the database
+    wallet_row = await db.wallet.find_unique(where={'address': wallet})
+    if wallet_row is None:
+        return []
+
+    where = {'tokenAddress': token_address, 'walletId': wallet_row.id}
+    if period:
+        where['period'] = period
+    if start or end:
+        where['scrapedAt'] = {**({'gte': start} if start else {}), **({'lte': end} if end else {})}
+    recent = await db.toptradersnapshot.find_many(where=where, order={'scrapedAt': 'asc'})
+    compacted = await asyncio.to_thread(read_compacted_history, token_address, wallet_row.id, period, start, end)
+
+    # Keyed by snapshot, so rows compacted twice or still in the database after a compaction count once
+    history = {}
+    for row in compacted:
+        history[(row['runId'], row['period'], row['rank'])] = {
+            'runId': row['runId'], 'period': row['period'], 'rank': row['rank'],
+            'scrapedAt': row['scrapedAt'].isoformat(), **{column: row[column] for column in SNAPSHOT_VALUES}
+        }
+    for row in recent:
+        history[(row.runId, row.period, row.rank)] = {
+            'runId': row.runId, 'period': row.period, 'rank': row.rank, 'scrapedAt': row.scrapedAt.isoformat(),
+            **{column: getattr(row, column) for column in SNAPSHOT_VALUES}
+        }
+    return sorted(history.values(), key=lambda row: row['scrapedAt'])
+
+async def main():
+    from prisma import Prisma
+
+    db = Prisma()
+    await db.connect()
+    try:
+        days = float(sys.argv[2]) if len(sys.argv) > 2 else SNAPSHOT_COMPACT_AFTER_DAYS
+        compacted = await compact_snapshots(db, days)
+        print(f"Compacted {compacted} snapshots older than {days:g} days into {SNAPSHOT_DIR}")
+    finally:
+        await db.disconnect()
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ['compact']:
+        print("Usage: python snapshots.py compact [days]")
+        sys.exit(2)
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import argparse
+import json
+import os
+import random
+import time
+
+# Stand-in for dexscreener.com serving recorded pages and payloads, for use with
+# DEXSCREENER_URL=http://localhost:<port>. Layout of the recordings directory:
+#   pages/index.html                          token list page
+#   pages/<chain>/<address>.html              token page
+#   payloads/pairs.json                       pair list payload
+#   payloads/top-traders/<address>-<period>.json, or <period>.json for any token
+#   fragments/top-traders/<address>-<period>.html, or <period>.html for any token
+#                                             top traders table contents, for the html extract mode
+# Pages that are not recorded are replaced by minimal ones that request the payloads and fragments.
+# fixtures/ is laid out this way, see bench.py.
+
+INDEX_PAGE = """<!DOCTYPE html>
+<html><body><main><div class="ds-dex-table ds-dex-table-top"></div></main>
+<script>fetch('/pairs.json');</script>
+</body></html>
+"""
+
+TOKEN_PAGE = """<!DOCTYPE html>
+<html><body><main>
+<button class="custom-tv0t33">Top Traders</button>
+<div class="periods">
+  <button><span>30d</span></button><button><span>7d</span></button>
+  <button><span>3d</span></button><button><span>1d</span></button>
+</div>
+<div class="custom-1vjv7zm"></div>
+</main>
+<script>
+const table = document.querySelector('.custom-1vjv7zm');
+const load = (period) => {
+    fetch('/top-traders/%(chain)s/%(address)s/' + period);
+    fetch('/top-traders-table/%(chain)s/%(address)s/' + period)
+        .then((response) => response.text())
+        .then((body) => { table.innerHTML = body; });
+};
+document.querySelector('.custom-tv0t33').addEventListener('click', () => load('30d'));
+document.querySelectorAll('.periods button').forEach((button) => {
+    button.addEventListener('click', () => load(button.textContent.trim()));
+});
+</script>
+</body></html>
+"""
+
+class StubHandler(SimpleHTTPRequestHandler):
+    recordings = '.'
+    # Seconds added to every response, plus up to jitter seconds at random
+    latency = 0.0
+    jitter = 0.0
+
+    def send_body(self, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_recording(self, *candidates):
+        for candidate in candidates:
+            path = os.path.join(self.recordings, *candidate)
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read()
+        return None
+
+    def do_GET(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+
+        if not parts:
+            body = self.read_recording(('pages', 'index.html'))
+            return self.send_body(body or INDEX_PAGE, 'text/html')
+
+        if parts == ['pairs.json']:
+            body = self.read_recording(('payloads', 'pairs.json'))
+            return self.send_body(body or json.dumps({'pairs': []}), 'application/json')
+
+        if parts[0] == 'top-traders' and len(parts) == 4:
+            _, chain, address, period = parts
+            body = self.read_recording(
+                ('payloads', 'top-traders', f'{address}-{period}.json'),
+                ('payloads', 'top-traders', f'{period}.json'),
+            )
+            return self.send_body(body or json.dumps({'topTraders': []}), 'application/json')
+
+        if parts[0] == 'top-traders-table' and len(parts) == 4:
+            _, chain, address, period = parts
+            body = self.read_recording(
+                ('fragments', 'top-traders', f'{address}-{period}.html'),
+                ('fragments', 'top-traders', f'{period}.html'),
+            )
+            return self.send_body(body or '', 'text/html')
+
+        if len(parts) == 2:
+            chain, address = parts
+            body = self.read_recording(('pages', chain, f'{address}.html'))
+            return self.send_body(body or TOKEN_PAGE % {'chain': chain, 'address': address}, 'text/html')
+
+        self.send_error(404)
+
+def run(recordings, host='127.0.0.1', port=8000, latency=0.0, jitter=0.0):
+    handler = type('Handler', (StubHandler,), {'recordings': recordings, 'latency': latency, 'jitter': jitter})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {recordings} on http://{host}:{server.server_port}")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve recorded DexScreener pages and payloads')
+    parser.add_argument('--dir', default='recordings')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds at random')
+    args = parser.parse_args()
+    run(args.dir, args.host, args.port, args.latency, args.jitter).serve_forever()
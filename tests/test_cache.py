@@ -0,0 +1,64 @@
+import asyncio
+
+from quart import Quart
+
+from cache import ResponseCache, respond_cached
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2, ttl=0)
+    cache.set('a', '1', 0)
+    cache.set('b', '2', 0)
+    assert cache.get('a').body == '1'
+    cache.set('c', '3', 0)
+    # b was used least recently
+    assert cache.get('b') is None
+    assert cache.get('a').body == '1'
+    assert cache.get('c').body == '3'
+    assert cache.stats()['evictions'] == 1
+
+def test_bump_invalidates():
+    cache = ResponseCache(ttl=0)
+    cache.set('a', '1', cache.generation)
+    cache.bump()
+    assert cache.get('a') is None
+    assert cache.stats()['generation'] == 1
+
+def test_body_built_before_a_bump_is_not_stored():
+    cache = ResponseCache(ttl=0)
+    generation = cache.generation
+    cache.bump()
+    entry = cache.set('a', '1', generation)
+    assert entry.body == '1'
+    assert cache.get('a') is None
+
+def test_etag_and_not_modified():
+    app = Quart(__name__)
+    cache = ResponseCache(ttl=0)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return {'traders': [1, 2]}
+
+    @app.route('/')
+    async def index():
+        return await respond_cached(cache, 'key', build)
+
+    async def run():
+        client = app.test_client()
+        first = await client.get('/')
+        etag = first.headers['ETag']
+        second = await client.get('/', headers={'If-None-Match': etag})
+        stale = await client.get('/', headers={'If-None-Match': '"other"'})
+        cache.bump()
+        rebuilt = await client.get('/', headers={'If-None-Match': etag})
+        return first, second, stale, rebuilt, etag
+
+    first, second, stale, rebuilt, etag = asyncio.run(run())
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert stale.status_code == 200
+    # Same payload after the bump, so the rebuilt body has the same ETag
+    assert rebuilt.status_code == 304
+    assert len(builds) == 2
+    assert cache.stats()['notModified'] == 2
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+import db as db_module
+from fingerprints import store_trader_fingerprints
+
+# Runs against a scratch SQLite database and needs a Prisma client generated for SQLite:
+# DATABASE_PROVIDER=sqlite python -m prisma generate
+
+@pytest.fixture
+def prisma(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_PROVIDER', 'sqlite')
+    monkeypatch.setenv('DATABASE_URL', f"file:{tmp_path / 'test.db'}")
+    monkeypatch.setattr(db_module, 'DATABASE_PROVIDER', 'sqlite')
+    try:
+        from prisma import Prisma
+    except RuntimeError:
+        pytest.skip('Prisma client not generated')
+    subprocess.run([sys.executable, '-m', 'prisma', 'db', 'push', '--skip-generate', '--accept-data-loss'],
+                   check=True, capture_output=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    return Prisma()
+
+def test_raw_upsert_timestamps_match_the_client(prisma):
+    async def run():
+        await prisma.connect()
+        try:
+            before = datetime.now(timezone.utc) - timedelta(seconds=1)
+            await store_trader_fingerprints(prisma, [['raw', '1d', 'f', 1]])
+            await asyncio.sleep(0.05)
+            await prisma.toptraderfingerprint.create(
+                data={'tokenAddress': 'client', 'period': '1d', 'fingerprint': 'f', 'rowCount': 1}
+            )
+            raw = await prisma.toptraderfingerprint.find_unique(
+                where={'tokenAddress_period': {'tokenAddress': 'raw', 'period': '1d'}}
+            )
+            recent = await prisma.toptraderfingerprint.find_many(
+                where={'checkedAt': {'gte': before}}, order={'checkedAt': 'desc'}
+            )
+            return raw, [row.tokenAddress for row in recent]
+        finally:
+            await prisma.disconnect()
+
+    raw, recent = asyncio.run(run())
+    assert abs(raw.checkedAt - datetime.now(timezone.utc)) < timedelta(minutes=1)
+    # Both rows compare against a client-bound datetime and sort by write time
+    assert recent == ['client', 'raw']
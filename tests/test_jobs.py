@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, QueuedJob
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'jobs.db'))
+
+def test_claim_oldest_pending(queue):
+    first = queue.submit('scrape')
+    second = queue.submit('scrape')
+    claimed = queue.claim('w1')
+    assert claimed['id'] == first['id']
+    assert claimed['status'] == 'running' and claimed['worker'] == 'w1'
+    assert queue.claim('w2')['id'] == second['id']
+    assert queue.claim('w3') is None
+
+def test_cancel_pending(queue):
+    job = queue.submit('scrape')
+    assert queue.cancel(job['id'])['status'] == 'cancelled'
+    assert not queue.cancel_requested(job['id'])
+    assert queue.claim('w1') is None
+
+def test_cancel_requested_for_running_job(queue):
+    job = queue.submit('scrape')
+    queue.claim('w1')
+    # Running jobs stop when their worker notices
+    assert queue.cancel(job['id'])['status'] == 'running'
+    assert queue.cancel_requested(job['id'])
+    assert QueuedJob(queue, job).cancelled
+
+def test_unless_active_returns_the_queued_job(queue):
+    job = queue.submit('scheduled', unless_active=True)
+    assert queue.submit('scheduled', unless_active=True)['id'] == job['id']
+    queue.claim('w1')
+    assert queue.submit('scheduled', unless_active=True)['id'] == job['id']
+    # Other names and plain submits are not affected
+    assert queue.submit('scrape', unless_active=True)['id'] != job['id']
+    QueuedJob(queue, queue.get(job['id'])).finish('completed')
+    assert queue.submit('scheduled', unless_active=True)['id'] != job['id']
+
+def test_concurrent_unless_active_queues_one_job(queue):
+    with ThreadPoolExecutor(8) as pool:
+        ids = set(pool.map(lambda _: queue.submit('scheduled', unless_active=True)['id'], range(16)))
+    assert len(ids) == 1
+    assert queue.counts() == {'pending': 1}
+
+def test_stale_running_job_fails_on_claim(queue, monkeypatch):
+    job = queue.submit('scrape')
+    queue.claim('w1')
+    monkeypatch.setattr(jobs, 'JOB_STALE_AFTER', -1)
+    time.sleep(0.01)
+    assert queue.claim('w2') is None
+    failed = queue.get(job['id'])
+    assert failed['status'] == 'failed'
+    assert failed['errors'] == ['Worker stopped responding']
+
+def test_progress_and_generation(queue):
+    job = QueuedJob(queue, queue.submit('scrape'))
+    job.start(2)
+    job.token_started('AAA')
+    job.token_finished('AAA', error='timeout')
+    job.committed()
+    state = queue.get(job.id)
+    assert (state['tokensTotal'], state['tokensDone'], state['currentTokens']) == (2, 1, [])
+    assert state['errors'] == ['AAA: timeout']
+    assert queue.generation() == 1
@@ -0,0 +1,79 @@
+from contextlib import asynccontextmanager
+import asyncio
+import sqlite3
+
+import pytest
+
+import db as db_module
+from db import bulk_upsert
+from leaderboard import LEADERBOARD_SOURCES, LEADERBOARD_TOTALS, add_contribution, rebuild_leaderboard, update_leaderboard
+
+# The raw SQL runs on an in-memory SQLite database through a stand-in for the Prisma client's
+# query_raw, execute_raw and tx(); only the columns the leaderboard reads are created
+SOURCES = list(LEADERBOARD_SOURCES.values())
+COLUMNS = ['tokenAddress', 'period', 'rank', 'wallet'] + SOURCES
+KEY = ['tokenAddress', 'period', 'rank']
+
+class FakeClient:
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(f"""
+            CREATE TABLE top_traders ({', '.join(f'"{c}"' for c in COLUMNS)}, "createdAt", "updatedAt",
+                                      PRIMARY KEY ("tokenAddress", "period", "rank"));
+            CREATE TABLE wallet_leaderboard ("period", "wallet", {', '.join(f'"{c}"' for c in LEADERBOARD_TOTALS)},
+                                             "updatedAt", PRIMARY KEY ("period", "wallet"));
+        """)
+
+    async def query_raw(self, query, *params):
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+    async def execute_raw(self, query, *params):
+        return self.connection.execute(query, params).rowcount
+
+    @asynccontextmanager
+    async def tx(self):
+        with self.connection:
+            yield self
+
+    def leaderboard(self):
+        rows = self.connection.execute(f"""
+            SELECT "period", "wallet", {', '.join(f'"{c}"' for c in LEADERBOARD_TOTALS)}
+            FROM wallet_leaderboard ORDER BY "period", "wallet"
+        """)
+        return [(row[0], row[1], *(pytest.approx(value) for value in row[2:])) for row in rows]
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(db_module, 'DATABASE_PROVIDER', 'sqlite')
+    return FakeClient()
+
+def trader(token, period, rank, wallet, pnl):
+    return [token, period, rank, wallet, 10.0 * rank, 100.0 * rank, 5.0 * rank, 50.0 * rank, pnl]
+
+def store(client, rows):
+    asyncio.run(bulk_upsert(client, 'top_traders', COLUMNS, KEY, rows, before_write=update_leaderboard))
+
+def test_add_contribution():
+    deltas = {}
+    add_contribution(deltas, '1d', 'w', [1, 2, 3, 4, 5], 1)
+    add_contribution(deltas, '1d', 'w', ['1', 2, 3, 4, 5.5], -1)
+    assert deltas == {('1d', 'w'): [0.0, 0.0, 0.0, 0.0, -0.5, 0]}
+
+def test_deltas_match_a_rebuild(client):
+    store(client, [trader('a', '1d', 1, 'x', 5.0), trader('a', '1d', 2, 'y', -1.0),
+                   trader('b', '1d', 1, 'x', 2.0), trader('a', '7d', 1, 'x', 3.0)])
+    # Ranks swap wallets, y drops out of token a and a new wallet comes in
+    store(client, [trader('a', '1d', 1, 'y', 4.0), trader('a', '1d', 2, 'z', 1.5)])
+    # Unchanged rows cancel out
+    store(client, [trader('b', '1d', 1, 'x', 2.0)])
+    incremental = client.leaderboard()
+
+    asyncio.run(rebuild_leaderboard(client))
+    assert incremental == client.leaderboard()
+    assert [row[:2] for row in incremental] == [('1d', 'x'), ('1d', 'y'), ('1d', 'z'), ('7d', 'x')]
+
+def test_wallet_without_rows_is_deleted(client):
+    store(client, [trader('a', '1d', 1, 'x', 5.0)])
+    store(client, [trader('a', '1d', 1, 'y', 5.0)])
+    assert [row[:2] for row in client.leaderboard()] == [('1d', 'y')]
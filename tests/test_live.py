@@ -0,0 +1,77 @@
+import asyncio
+
+from live import LiveHub, Subscriber, diff_traders
+
+TOPIC = ('token', 'abc', '1d', 10)
+OTHER = ('leaderboard', '1d', 10)
+
+def test_diff_traders():
+    old = [{'wallet': 'a', 'pnl': 10.0}, {'wallet': 'b', 'pnl': 5.0}, {'wallet': 'c', 'pnl': 1.0}]
+    new = [{'wallet': 'b', 'pnl': 12.0}, {'wallet': 'a', 'pnl': 10.0}, {'wallet': 'd', 'pnl': 0.5}]
+    added, changed, removed = diff_traders(old, new, 'pnl')
+    assert added == [{'wallet': 'd', 'pnl': 0.5, 'rank': 3}]
+    assert removed == [{'wallet': 'c', 'rank': 3}]
+    assert changed == [
+        {'wallet': 'b', 'pnl': 12.0, 'rank': 1, 'previousRank': 2, 'pnlDelta': 7.0},
+        {'wallet': 'a', 'pnl': 10.0, 'rank': 2, 'previousRank': 1, 'pnlDelta': 0.0},
+    ]
+
+def test_diff_traders_uses_rank_fields():
+    old = [{'wallet': 'a', 'rank': 4, 'totalPnl': 1.0}]
+    new = [{'wallet': 'a', 'rank': 4, 'totalPnl': 1.0}]
+    assert diff_traders(old, new, 'totalPnl') == ([], [], [])
+
+class Hub:
+    def snapshot(self, topic):
+        return {'type': 'snapshot', 'topic': topic}
+
+def test_subscriber_skips_diffs_behind_a_snapshot():
+    async def run():
+        subscriber = Subscriber(Hub(), max_pending=4)
+        subscriber.topics.add(TOPIC)
+        subscriber.request_snapshot(TOPIC)
+        subscriber.push(TOPIC, 'diff 1')
+        return [await subscriber.next(0.01) for _ in range(2)]
+
+    snapshot, after = asyncio.run(run())
+    assert snapshot == {'type': 'snapshot', 'topic': TOPIC}
+    # A snapshot already owed makes diffs of its topic redundant
+    assert after is None
+
+def test_subscriber_overflow_resyncs():
+    async def run():
+        subscriber = Subscriber(Hub(), max_pending=2)
+        subscriber.topics.update([TOPIC, OTHER])
+        for i in range(3):
+            subscriber.push(TOPIC, f'diff {i}')
+        # Owed a snapshot, further diffs are dropped
+        subscriber.push(OTHER, 'diff 3')
+        messages = [await subscriber.next(0.01) for _ in range(3)]
+        return subscriber, messages
+
+    subscriber, messages = asyncio.run(run())
+    assert subscriber.dropped == 2
+    assert {message['topic'] for message in messages[:2]} == {TOPIC, OTHER}
+    assert messages[2] is None
+
+def test_hub_refresh_pushes_diffs():
+    rows = {'value': [{'wallet': 'a', 'pnl': 1.0}]}
+
+    async def fetch(*args):
+        return list(rows['value'])
+
+    async def run():
+        hub = LiveHub(db=None, fetchers={'token': fetch})
+        subscriber = Subscriber(hub)
+        await hub.subscribe(subscriber, TOPIC)
+        snapshot = await subscriber.next(0.01)
+        rows['value'] = [{'wallet': 'a', 'pnl': 3.0}]
+        await hub.refresh(TOPIC)
+        diff = await subscriber.next(0.01)
+        hub.unsubscribe(subscriber)
+        return hub, snapshot, diff
+
+    hub, snapshot, diff = asyncio.run(run())
+    assert snapshot['traders'] == [{'wallet': 'a', 'pnl': 1.0}]
+    assert diff['changed'] == [{'wallet': 'a', 'pnl': 3.0, 'rank': 1, 'previousRank': 1, 'pnlDelta': 2.0}]
+    assert hub.subscriber_count() == 0 and not hub.topics
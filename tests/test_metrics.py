@@ -0,0 +1,33 @@
+import json
+
+from metrics import Registry
+
+def test_render_merges_worker_exports():
+    worker = Registry()
+    tokens = worker.counter('scrape_tokens_total', 'Tokens', ['status'])
+    phase = worker.histogram('phase_seconds', 'Phases', ['phase'], buckets=(0.1, 1))
+    tokens.inc(status='scraped')
+    tokens.inc(2, status='failed')
+    phase.observe(0.5, phase='load')
+    # Published through the job queue state as JSON
+    exported = json.loads(json.dumps(worker.export()))
+
+    api = Registry()
+    api.counter('scrape_tokens_total', 'Tokens', ['status'])
+    api.histogram('phase_seconds', 'Phases', ['phase'], buckets=(0.1, 1))
+    api.gauge('live_subscribers', 'Subscribers', [], lambda: {(): 3})
+    lines = api.render({'host-1': exported}).splitlines()
+
+    assert '# TYPE scrape_tokens_total counter' in lines
+    assert 'scrape_tokens_total{status="scraped",worker="host-1"} 1' in lines
+    assert 'scrape_tokens_total{status="failed",worker="host-1"} 2' in lines
+    assert 'phase_seconds_bucket{phase="load",worker="host-1",le="0.1"} 0' in lines
+    assert 'phase_seconds_bucket{phase="load",worker="host-1",le="1"} 1' in lines
+    assert 'phase_seconds_bucket{phase="load",worker="host-1",le="+Inf"} 1' in lines
+    assert 'phase_seconds_sum{phase="load",worker="host-1"} 0.5' in lines
+    assert 'live_subscribers 3' in lines
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter('errors_total', 'Errors', ['message']).inc(message='say "hi"\n')
+    assert 'errors_total{message="say \\"hi\\"\\n"} 1' in registry.render().splitlines()
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, iter_pages, keyset_where
+
+FIELDS = ('volumeUsd', 'address')
+
+def matches(row, where):
+    # Evaluates the subset of Prisma filters keyset_where builds
+    for key, condition in where.items():
+        if key == 'AND':
+            if not all(matches(row, part) for part in condition):
+                return False
+        elif key == 'OR':
+            if not any(matches(row, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            (operator, value), = condition.items()
+            current = getattr(row, key)
+            if not (current > value if operator == 'gt' else current < value):
+                return False
+        elif getattr(row, key) != condition:
+            return False
+    return True
+
+class FakeModel:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def find_many(self, where, order, take):
+        self.queries += 1
+        fields = [field for part in order for field in part]
+        reverse = order[0][fields[0]] == 'desc'
+        rows = sorted((row for row in self.rows if matches(row, where or {})),
+                      key=lambda row: tuple(getattr(row, field) for field in fields), reverse=reverse)
+        return rows[:take]
+
+def test_cursor_round_trip():
+    row = SimpleNamespace(volumeUsd=12.5, address='abc', createdAt=datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+    fields = ('volumeUsd', 'createdAt', 'address')
+    assert decode_cursor(encode_cursor(row, fields), fields) == (12.5, row.createdAt, 'abc')
+
+@pytest.mark.parametrize('cursor', ['not base64!', encode_cursor(SimpleNamespace(address='a'), ('address',)), ''])
+def test_decode_rejects_foreign_cursors(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, FIELDS)
+
+def test_keyset_where():
+    assert keyset_where(None, FIELDS, 'desc', None) is None
+    assert keyset_where({'chain': 'solana'}, FIELDS, 'asc', (5, 'b')) == {'AND': [
+        {'chain': 'solana'},
+        {'OR': [{'volumeUsd': {'gt': 5}}, {'volumeUsd': 5, 'address': {'gt': 'b'}}]},
+    ]}
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_pages_cover_every_row_once(order):
+    # Ties on volumeUsd are broken by address
+    rows = [SimpleNamespace(volumeUsd=i % 4, address=f'{i:03}') for i in range(23)]
+    model = FakeModel(rows)
+
+    async def collect():
+        return [page async for page in iter_pages(model, None, FIELDS, order, batch_size=5)]
+
+    pages = asyncio.run(collect())
+    seen = [row.address for page in pages for row in page]
+    expected = sorted(rows, key=lambda row: (row.volumeUsd, row.address), reverse=order == 'desc')
+    assert seen == [row.address for row in expected]
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+
+def test_pages_stop_at_limit():
+    model = FakeModel([SimpleNamespace(volumeUsd=i, address=str(i)) for i in range(10)])
+
+    async def collect():
+        return [page async for page in iter_pages(model, None, FIELDS, 'asc', limit=7, batch_size=3)]
+
+    assert [len(page) for page in asyncio.run(collect())] == [3, 3, 1]
+    assert model.queries == 3
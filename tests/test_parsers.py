@@ -0,0 +1,23 @@
+import glob
+import os
+
+import pytest
+
+from parsers import available_backends, extract_table_data, extract_token_rows
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fixtures')
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURES_DIR, '**', '*.html'), recursive=True))
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('path', FIXTURES, ids=lambda path: os.path.relpath(path, FIXTURES_DIR))
+def test_backend_rows_match_html_parser(path, backend):
+    html = read(path)
+    # The same dispatch as parsers.check_fixtures
+    extract = extract_table_data if 'custom-1nvxwu0' in html else extract_token_rows
+    expected = extract(html, 'html.parser')
+    assert expected
+    assert extract(html, backend) == expected
@@ -1,196 +1,207 @@
+from browser import DEXSCREENER_URL, READY_STATES, load_cookies, page_limiter, save_cookies, sessions
+from convert import TOKEN_NUMERIC_COLUMNS, normalize_tokens
+from db import bulk_write
+from fingerprints import changed_tokens
+from metrics import start_trace, tracer
+from devtools import capture_pairs, drain_payloads
+from parsers import build_token_rows, extract_token_rows
 from prisma import Prisma
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from readiness import scroll_until_settled, timed, wait_for_document_ready, wait_for_rows_settled, wait_timings
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
-import pandas as pd
-import json
+import asyncio
+import os
+import threading
 import time
 
-def load_cookies():
+# 'js' extracts rows in the browser, 'network' decodes the page's own pair payloads,
+# 'html' or a parsers backend name parses the page HTML
+TOKENS_EXTRACT_MODE = os.getenv('TOKENS_EXTRACT_MODE', 'html')
+# Listing pages visited per run: every chain (empty = all chains) by every ranking, pages 1..TOKENS_PAGES
+TOKENS_RANKINGS = [r.strip() for r in os.getenv('TOKENS_RANKINGS', 'trendingScoreM5').split(',') if r.strip()]
+TOKENS_CHAINS = [c.strip().lower() for c in os.getenv('TOKENS_CHAINS', '').split(',') if c.strip()]
+TOKENS_PAGES = int(os.getenv('TOKENS_PAGES', '1'))
+# Listing pages loaded at the same time, each in its own browser
+TOKENS_WORKERS = int(os.getenv('TOKENS_WORKERS', '1'))
+
+# Database column -> TokenRow field or numeric column from convert.normalize_tokens
+TOKEN_COLUMNS = {
+    'address': 'address',
+    'chain': 'chain',
+    'dex': 'dex',
+    'token': 'token',
+    'price': 'price',
+    'age': 'age',
+    'txns': 'txns',
+    'volume': 'volume',
+    'makers': 'makers',
+    'trend_5m': 'trend5m',
+    'trend_1h': 'trend1h',
+    'trend_6h': 'trend6h',
+    'trend_24h': 'trend24h',
+    'liquidity': 'liquidity',
+    'mcap': 'mcap',
+    **{column: column for column in TOKEN_NUMERIC_COLUMNS.values()},
+}
+
+async def store_to_database(rows_data, db=None):
+    own_connection = db is None
+    if own_connection:
+        db = Prisma()
+        await db.connect()
+
+    # Display strings are kept as scraped, the numeric columns are filled in for the whole table at once
+    records = normalize_tokens(rows_data, list(TOKEN_COLUMNS.values()))
+
     try:
-        with open('cookies.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
+        # Rows matching their stored fingerprint are left alone, so updatedAt only moves on real changes
+        changed, existing = await changed_tokens(db, list(TOKEN_COLUMNS.values()), records)
+        if changed:
+            await bulk_write(db, 'tokens', list(TOKEN_COLUMNS) + ['fingerprint'], ['address'], changed)
+        address = list(TOKEN_COLUMNS.values()).index('address')
+        new = sum(1 for record in changed if record[address] not in existing)
+        counts = {'new': new, 'updated': len(changed) - new, 'unchanged': len(records) - len(changed)}
+        print(f"Tokens: {counts['new']} new, {counts['updated']} updated, {counts['unchanged']} unchanged")
+        return counts
+    finally:
+        if own_connection:
+            await db.disconnect()
+
+# Collects the same header and row values as parsers.extract_token_rows, in the browser
+TOKENS_SCRIPT = """
+const container = document.querySelector('.ds-dex-table-top');
+if (!container) return null;
+const headers = Array.from(container.querySelectorAll('.ds-table-th-button'), (h) => h.textContent.trim())
+    .filter((text) => text);
+const rows = [];
+for (const row of container.querySelectorAll('.ds-dex-table-row')) {
+    const cells = row.querySelectorAll('.ds-table-data-cell');
+    if (!cells.length) continue;
+    const chain = cells[0].querySelector('.ds-dex-table-row-chain-icon');
+    const dex = cells[0].querySelector('.ds-dex-table-row-dex-icon');
+    const symbol = cells[0].querySelector('.ds-dex-table-row-base-token-symbol');
+    rows.push({
+        href: row.getAttribute('href') || '',
+        chain: chain ? chain.getAttribute('title') || '' : '',
+        dex: dex ? dex.getAttribute('title') || '' : '',
+        symbol: symbol ? symbol.textContent.trim() : '',
+        cells: Array.from(cells).slice(1).map((cell) => cell.textContent.trim()),
+    });
+}
+return {headers: headers, rows: rows};
+"""
+
+def extract_tokens_in_browser(driver):
+    result = driver.execute_script(TOKENS_SCRIPT)
+    if not result:
         return None
+    return build_token_rows(result['headers'], result['rows'])
 
-def save_cookies(driver):
-    cookies = driver.get_cookies()
-    with open('cookies.json', 'w') as file:
-        json.dump(cookies, file)
-
-def setup_driver():
-    options = webdriver.ChromeOptions()
-    
-    # Add essential options
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--disable-extensions')
-    options.add_argument('--no-first-run')
-    options.add_argument('--start-maximized')
-    
-    # Add stealth options
-    options.add_argument('--disable-blink-features=AutomationControlled')
-    options.add_experimental_option('excludeSwitches', ['enable-automation'])
-    options.add_experimental_option('useAutomationExtension', False)
-    
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-    
-    return driver
-
-async def store_to_database(rows_data, header_texts):
-    db = Prisma()
-    await db.connect()
-
-    for row in rows_data:
-        token_data = dict(zip(header_texts, row))
-        
-        try:
-            await db.token.upsert(
-                where={
-                    'address': token_data['Address']
-                },
-                data={
-                    'create': {
-                        'address': token_data['Address'],
-                        'chain': token_data['Chain'],
-                        'dex': token_data['Dex'],
-                        'token': token_data['Token'],
-                        'price': token_data.get('Price', ''),
-                        'age': token_data.get('Age', ''),
-                        'txns': token_data.get('Txns', ''),
-                        'volume': token_data.get('Volume', ''),
-                        'makers': token_data.get('Makers', ''),
-                        'trend5m': token_data.get('5M', ''),
-                        'trend1h': token_data.get('1H', ''),
-                        'trend6h': token_data.get('6H', ''),
-                        'trend24h': token_data.get('24H', ''),
-                        'liquidity': token_data.get('Liquidity', ''),
-                        'mcap': token_data.get('MCAP', '')
-                    },
-                    'update': {
-                        'chain': token_data['Chain'],
-                        'dex': token_data['Dex'],
-                        'token': token_data['Token'],
-                        'price': token_data.get('Price', ''),
-                        'age': token_data.get('Age', ''),
-                        'txns': token_data.get('Txns', ''),
-                        'volume': token_data.get('Volume', ''),
-                        'makers': token_data.get('Makers', ''),
-                        'trend5m': token_data.get('5M', ''),
-                        'trend1h': token_data.get('1H', ''),
-                        'trend6h': token_data.get('6H', ''),
-                        'trend24h': token_data.get('24H', ''),
-                        'liquidity': token_data.get('Liquidity', ''),
-                        'mcap': token_data.get('MCAP', '')
-                    }
-                }
-            )
-        except Exception as e:
-            print(f"Error storing token {token_data['Address']}: {str(e)}")
-
-    await db.disconnect()
-
-async def scrape_data():
-    driver = setup_driver()
-    url = 'https://dexscreener.com/?rankBy=trendingScoreM5&order=desc'
+def discovery_urls(rankings=TOKENS_RANKINGS, chains=TOKENS_CHAINS, pages=TOKENS_PAGES):
+    # Every listing page to visit: each chain (or all chains) by each ranking, pages 1..pages
+    urls = []
+    for chain in chains or ['']:
+        for page in range(1, pages + 1):
+            path = '/'.join(part for part in (chain, f'page-{page}' if page > 1 else '') if part)
+            for ranking in rankings:
+                urls.append(f'{DEXSCREENER_URL}/{path}?rankBy={ranking}&order=desc')
+    return urls
 
+cookies_lock = threading.Lock()
+
+def scrape_page(url, extract_mode, save_html=False):
+    # Runs in a worker thread with a browser of its own from the pool; returns the page's
+    # TokenRows, or None when the table was not found
+    session = sessions.acquire(capture_network=extract_mode == 'network')
+    driver = session.driver
     try:
-        cookies = load_cookies()
-        driver.get(url)
-        
-        if cookies:
-            driver.delete_all_cookies()
-            for cookie in cookies:
-                driver.add_cookie(cookie)
-            driver.refresh()
-        
-        wait = WebDriverWait(driver, 60)
-        wait.until(lambda d: d.execute_script('return document.readyState') == 'complete')
+        # A warm browser from the pool already carries the cookies
+        session.apply_cookies(url, load_cookies())
+        if extract_mode == 'network':
+            # Payloads logged by the browser's previous page are not this page's
+            drain_payloads(driver)
+        page_limiter.wait()
+        with timed('driver_get'):
+            driver.get(url)
         
-        # Scroll multiple times with longer pauses
-        scroll_height = 0
-        for _ in range(10):
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(5)
-            
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == scroll_height:
-                break
-            scroll_height = new_height
-        
-        time.sleep(5)
-        
-        # Get only the main content
-        main_content = driver.find_element(By.TAG_NAME, 'main').get_attribute('innerHTML')
-        soup = BeautifulSoup(main_content, 'html.parser')
-        
-        table_container = soup.select_one('.ds-dex-table-top')
+        wait_for_document_ready(driver, states=READY_STATES)
 
-        # with open('table.html', 'w', encoding='utf-8') as f:
-        #     f.write(str(table_container))
+        # Scroll until the list stops growing, then until the rows settle
+        scroll_until_settled(driver)
+        if extract_mode != 'network':
+            wait_for_rows_settled(driver, '.ds-dex-table-top .ds-dex-table-row', label='token_rows')
         
-        if table_container:
-            headers = table_container.select('.ds-table-th-button')
-            # with open('headers.html', 'w', encoding='utf-8') as f:
-            #     f.write(str(headers))
-
-            header_texts = ['Address', 'Chain', 'Dex'] + [header.text.strip() for header in headers if header.text.strip()]
-            
-            rows = table_container.select('.ds-dex-table-row')
-            with open('rows.html', 'w', encoding='utf-8') as f:
-                f.write(str(rows))
-
-            rows_data = []
-            
-            for row in rows:
-              cells = row.select('.ds-table-data-cell')
-              if cells:
-                  # Get chain info
-                  chain_img = cells[0].select_one('.ds-dex-table-row-chain-icon')
-                  chain = chain_img['title'] if chain_img else ''
-                  
-                  # Get dex info
-                  dex_img = cells[0].select_one('.ds-dex-table-row-dex-icon')
-                  dex = dex_img['title'] if dex_img else ''
-                  
-                  # Get token symbol
-                  symbol_element = cells[0].select_one('.ds-dex-table-row-base-token-symbol')
-                  symbol = symbol_element.text.strip() if symbol_element else ''
-                  
-                  # Get token address from link
-                  link = row.get('href', '')
-                  address = link.split('/')[-1] if link else ''
-                  
-                  # Combine data with address, chain, and dex first
-                  row_data = [address, chain, dex, symbol] + [cell.text.strip() for cell in cells[1:]]
-                  
-                  if any(row_data):
-                      rows_data.append(row_data)
-            
-            # with open('rows_data.html', 'w', encoding='utf-8') as f:
-            #     f.write(str(rows_data))
-
-            if rows_data:
-                await store_to_database(rows_data, header_texts)
-                print(f"Successfully extracted and stored {len(rows_data)} rows")
-            else:
-                print("No data rows found in the table")
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        if extract_mode == 'network':
+            # Every pair payload seen while loading and scrolling, the rendered rows are never read
+            rows_data = capture_pairs(driver)
+        elif extract_mode == 'js':
+            rows_data = extract_tokens_in_browser(driver)
         else:
+            # Get only the main content, 'html' uses the PARSER_BACKEND default
+            with timed('inner_html'):
+                main_content = driver.find_element(By.TAG_NAME, 'main').get_attribute('innerHTML')
+            if save_html:
+                with open('rows.html', 'w', encoding='utf-8') as f:
+                    f.write(main_content)
+            with timed(f'parse_{extract_mode}'):
+                rows_data = extract_token_rows(main_content, None if extract_mode == 'html' else extract_mode)
+        wait_timings.record(f'extract_{extract_mode}', time.perf_counter() - start)
+        wait_timings.record(f'extract_{extract_mode}_cpu', time.process_time() - cpu_start)
+        return rows_data
+    finally:
+        page = session.page_loaded()
+        if page:
+            print(f"Page {url}: {page['bytes'] / 1024:.0f} KB over {page['resources']} resources, loaded in {page['loadMs'] / 1000:.2f}s")
+        try:
+            # Pages load in parallel threads; one writer at a time keeps cookies.json whole
+            with cookies_lock:
+                save_cookies(driver)
+        finally:
+            sessions.release(session)
+
+async def scrape_data(extract_mode=None, urls=None, workers=None):
+    extract_mode = extract_mode or TOKENS_EXTRACT_MODE
+    urls = urls or discovery_urls()
+    limit = asyncio.Semaphore(workers or TOKENS_WORKERS)
+    start_time = time.time()
+    start_trace(f'tokens-{int(start_time)}')
+    wait_timings.reset()
+
+    async def visit(index, url):
+        async with limit:
+            try:
+                # Selenium blocks, each page is loaded off the event loop; the first page is kept in rows.html
+                return await asyncio.to_thread(scrape_page, url, extract_mode, index == 0)
+            except Exception as e:
+                print(f"Extraction error on {url}: {str(e)}")
+                return None
+
+    try:
+        results = await asyncio.gather(*(visit(index, url) for index, url in enumerate(urls)))
+
+        # A pair listed under several rankings or chains is kept once, from the first page it was seen on
+        pairs = {}
+        for rows_data in results:
+            for row in rows_data or []:
+                # Rows without an address would all collapse into one pair
+                if row.address:
+                    pairs.setdefault(row.address, row)
+        found = sum(1 for rows_data in results if rows_data is not None)
+        print(f"Visited {len(urls)} pages ({found} with a table) in {time.time() - start_time:.2f}s, {len(pairs)} unique pairs")
+        wait_timings.report()
+
+        if not found:
             print("Table container not found")
-            
-    except Exception as e:
-        print(f"Extraction error: {str(e)}")
+            return None
+        if not pairs:
+            print("No data rows found in the table")
+            return None
+        counts = await store_to_database(list(pairs.values()))
+        print(f"Successfully extracted and stored {len(pairs)} rows")
+        return counts
     finally:
-        save_cookies(driver)
-        driver.quit()
+        tracer.dump()
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(scrape_data())
@@ -1,306 +1,488 @@
-from bs4 import BeautifulSoup
+from browser import DEXSCREENER_URL, READY_STATES, load_cookies, page_limiter, page_stats, save_cookies, sessions
+from convert import normalize_traders
+from datetime import datetime, timedelta, timezone
+from db import bulk_write, dedupe_rows
+from fingerprints import TOP_TRADERS_FRESH_TTL, changed_traders, fresh_tokens, store_trader_fingerprints
+from jobs import FINISHED_STATUSES, JOB_HEARTBEAT_INTERVAL, JOB_STALE_AFTER
+from leaderboard import update_leaderboard
+from metrics import SCRAPE_TOKENS, start_trace, tracer
+from snapshots import append_snapshots
+from devtools import capture_top_traders, drain_payloads
+from parsers import build_trader_rows, extract_table_data
 from prisma import Prisma
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from readiness import (
+    click_and_wait_for_table,
+    scroll_until_settled,
+    timed,
+    wait_for_document_ready,
+    wait_for_rows_settled,
+    wait_timings,
+)
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-import json
-import pandas as pd
+import asyncio
+import heapq
+import os
+import random
+import socket
+import sys
+import threading
 import time
 
-def load_cookies():
-    try:
-        with open('cookies.json', 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return None
+PERIODS = ['30d', '7d', '3d', '1d']
 
-def save_cookies(driver):
-    cookies = driver.get_cookies()
-    with open('cookies.json', 'w') as file:
-        json.dump(cookies, file)
+TABLE_SELECTOR = '.custom-1vjv7zm'
+ROW_SELECTOR = '.custom-1nvxwu0'
 
-async def get_tokens():
-    db = Prisma()
-    await db.connect()
+# Number of Chrome instances pulling tokens off the shared queue
+SCRAPE_WORKERS = int(os.getenv('SCRAPE_WORKERS', '1'))
+# Maximum tokens processed at the same time across all workers (0 = one per worker)
+SCRAPE_MAX_CONCURRENCY = int(os.getenv('SCRAPE_MAX_CONCURRENCY', '0'))
+# Attempts per token, failed tokens are requeued after an exponential backoff starting at SCRAPE_RETRY_DELAY
+SCRAPE_MAX_ATTEMPTS = int(os.getenv('SCRAPE_MAX_ATTEMPTS', '3'))
+SCRAPE_RETRY_DELAY = float(os.getenv('SCRAPE_RETRY_DELAY', '10'))
+SCRAPE_RETRY_MAX_DELAY = float(os.getenv('SCRAPE_RETRY_MAX_DELAY', '300'))
+# Scraped tokens waiting for the database writer before the browser workers block
+SCRAPE_QUEUE_SIZE = int(os.getenv('SCRAPE_QUEUE_SIZE', '8'))
+# 'js' extracts rows in the browser, 'network' decodes the page's own top traders payload,
+# 'html' or a parsers backend name parses the table's innerHTML
+TOP_TRADERS_EXTRACT_MODE = os.getenv('TOP_TRADERS_EXTRACT_MODE', 'html')
+
+async def get_tokens(db=None):
+    own_connection = db is None
+    if own_connection:
+        db = Prisma()
+        await db.connect()
     tokens = await db.token.find_many()
-    await db.disconnect()
+    if own_connection:
+        await db.disconnect()
     return tokens
 
-def setup_driver():
-    options = webdriver.ChromeOptions()
-    
-    # Add essential options
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--disable-extensions')
-    options.add_argument('--no-first-run')
-    options.add_argument('--start-maximized')
-    
-    # Add stealth options
-    options.add_argument('--disable-blink-features=AutomationControlled')
-    options.add_experimental_option('excludeSwitches', ['enable-automation'])
-    options.add_experimental_option('useAutomationExtension', False)
-    
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-    
-    return driver
-
-def convert_to_number(value):
-    if value == '-' or value == 'Unknown':
-        return '0'
-    # Remove $, commas, and < symbols
-    value = value.replace('$', '').replace(',', '').replace('<', '')
-    
-    # Handle K, M, B multipliers
-    multipliers = {'K': 1000, 'M': 1000000, 'B': 1000000000}
-    for suffix, multiplier in multipliers.items():
-        if suffix in value:
-            number = float(value.replace(suffix, '')) * multiplier
-            return str(number)
-    return value
-
-def extract_table_data(table):
-    data = []
-    rows = table.select('.custom-1nvxwu0')
-    
-    for row in rows:
-        # Extract rank
-        rank = row.select_one('.custom-q9k0mw').text.strip('#')
-        
-        # Extract wallet address from explorer link
-        wallet_link = row.select_one('.custom-1dwgrrr a')
-        if wallet_link:
-            href = wallet_link['href']
-            wallet = href.split('/')[-1]  # Gets the full address from the URL
-        else:
-            wallet = '-'
-        
-        # Extract bought amount
-        bought_div = row.select('.custom-1o79wax')[0]
-        bought_span = bought_div.select_one('.custom-6qd5i2, .custom-rcecxm')
-        bought = convert_to_number(bought_span.text) if bought_span else '0'
-        
-        # Extract bought volume
-        if bought != '0':
-            volume_span = bought_div.select_one('.custom-2ygcmq')
-            bought_volume = convert_to_number(volume_span.text) if volume_span else '0'
-        else:
-            continue
+# Collects the same raw cell values as parsers.raw_trader_row, in the browser, for every table row
+TOP_TRADERS_SCRIPT = """
+const table = arguments[0];
+const text = (el) => el ? el.textContent : null;
+return Array.from(table.querySelectorAll('.custom-1nvxwu0'), (row) => {
+    const walletLink = row.querySelector('.custom-1dwgrrr a');
+    const amounts = row.querySelectorAll('.custom-1o79wax');
+    const bought = amounts[0];
+    const sold = amounts[1];
+    const pnl = row.querySelector('.custom-1e9y0rl, .custom-1yklr7h');
+    const unrealized = row.querySelector('.custom-1hd7h4r');
+    const balance = row.querySelector('.custom-1cicvqe');
+    const txns = row.querySelector('.custom-13ppmr2');
+    return {
+        rank: text(row.querySelector('.custom-q9k0mw')),
+        walletHref: walletLink ? walletLink.getAttribute('href') : null,
+        bought: bought ? text(bought.querySelector('.custom-6qd5i2, .custom-rcecxm')) : null,
+        boughtVolume: bought ? text(bought.querySelector('.custom-2ygcmq')) : null,
+        sold: sold ? text(sold.querySelector('.custom-6qd5i2, .custom-dv3t8y')) : null,
+        soldVolume: sold ? text(sold.querySelector('.custom-2ygcmq')) : null,
+        pnl: text(pnl),
+        pnlPositive: pnl ? pnl.classList.contains('custom-1e9y0rl') : false,
+        unrealized: unrealized ? text(unrealized.querySelector('.custom-6qd5i2') || unrealized) : null,
+        balanceUnknown: balance ? !!balance.querySelector('.custom-sqw9c5') : false,
+        balance: balance ? Array.from(balance.querySelectorAll('.custom-2ygcmq'), text) : [],
+        txns: text(txns),
+    };
+});
+"""
 
-        # Extract sold amount
-        sold_div = row.select('.custom-1o79wax')[1]
-        sold_span = sold_div.select_one('.custom-6qd5i2, .custom-dv3t8y')
-        sold = convert_to_number(sold_span.text) if sold_span else '0'
-        
-        # Extract sold volume
-        if sold != '0':
-            volume_span = sold_div.select_one('.custom-2ygcmq')
-            sold_volume = convert_to_number(volume_span.text) if volume_span else '0'
-        else:
-            sold_volume = '0'
-        
-        # Extract PNL with sign
-        pnl_element = row.select_one('.custom-1e9y0rl, .custom-1yklr7h')
-        if pnl_element:
-            # Convert value to number first
-            raw_value = float(convert_to_number(pnl_element.text))
-            # custom-1e9y0rl is positive, custom-1yklr7h is negative
-            pnl = str(raw_value) if 'custom-1e9y0rl' in pnl_element.get('class', []) else str(-raw_value)
-        else:
-            pnl = '0'
-
-        # Extract unrealized value
-        unrealized_div = row.select_one('.custom-1hd7h4r')
-        unrealized_span = unrealized_div.select_one('.custom-6qd5i2')
-        unrealized = convert_to_number(unrealized_span.text if unrealized_span else unrealized_div.text)
-
-        # Extract balance
-        balance_div = row.select_one('.custom-1cicvqe')
-        balance_unknown = balance_div.select_one('.custom-sqw9c5')
-        if balance_unknown:
-            balance = '0'
-        else:
-            balance_spans = balance_div.select('.custom-2ygcmq')
-            if len(balance_spans) >= 2:
-                current_balance = convert_to_number(balance_spans[0].text)
-                total_supply = convert_to_number(balance_spans[1].text)
-                balance = f"{current_balance}/{total_supply}"
+def extract_table_data_in_browser(driver, table):
+    return build_trader_rows(driver.execute_script(TOP_TRADERS_SCRIPT, table))
+
+def read_table(driver, table, extract_mode):
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    if extract_mode == 'js':
+        traders_data = extract_table_data_in_browser(driver, table)
+    else:
+        # 'html' uses the PARSER_BACKEND default, anything else names a parsers backend
+        backend = None if extract_mode == 'html' else extract_mode
+        with timed('inner_html'):
+            html = table.get_attribute('innerHTML')
+        with timed(f'parse_{extract_mode}'):
+            traders_data = extract_table_data(html, backend)
+    wait_timings.record(f'extract_{extract_mode}', time.perf_counter() - start)
+    wait_timings.record(f'extract_{extract_mode}_cpu', time.process_time() - cpu_start)
+    return traders_data
+
+def read_payload(driver):
+    start = time.perf_counter()
+    traders_data = capture_top_traders(driver)
+    wait_timings.record('extract_network', time.perf_counter() - start)
+    return traders_data
+
+TOP_TRADER_COLUMNS = [
+    'tokenAddress', 'period', 'rank', 'wallet', 'boughtAmount', 'boughtVolume',
+    'soldAmount', 'soldVolume', 'pnl', 'unrealized', 'balance', 'transactions',
+    'unrealizedValue', 'balanceAmount', 'transactionCount'
+]
+TOP_TRADER_KEY = ['tokenAddress', 'period', 'rank']
+
+def before_write_hook(run_id=None):
+    # Keeps the wallet leaderboard and, for rows scraped by a run, the snapshot history
+    # in the same transaction as each top_traders batch
+    async def before_write(tx, columns, rows):
+        with timed('leaderboard_update'):
+            await update_leaderboard(tx, columns, rows)
+        if run_id:
+            with timed('snapshot_append'):
+                await append_snapshots(tx, run_id, columns, rows)
+    return before_write
+
+async def store_to_database(traders_data, db=None, strict=False, run_id=None):
+    own_connection = db is None
+    if own_connection:
+        db = Prisma()
+        await db.connect()
+
+    records = normalize_traders(traders_data, TOP_TRADER_COLUMNS) if traders_data else []
+
+    try:
+        # Tables identical to the last scrape are not rewritten
+        with timed('fingerprint_lookup'):
+            changed, fingerprint_rows = await changed_traders(db, TOP_TRADER_COLUMNS, records)
+        changed = dedupe_rows(TOP_TRADER_COLUMNS, TOP_TRADER_KEY, changed)
+        written = 0
+        if changed:
+            written = await bulk_write(db, 'top_traders', TOP_TRADER_COLUMNS, TOP_TRADER_KEY, changed,
+                                       before_write=before_write_hook(run_id), strict=strict)
+        if len(changed) < len(records):
+            print(f"Skipped {len(records) - len(changed)} unchanged top traders rows")
+        # A skipped batch leaves its tables without a matching fingerprint, so they are written again next time
+        if written == len(changed):
+            await store_trader_fingerprints(db, fingerprint_rows)
+        return written
+    finally:
+        if own_connection:
+            await db.disconnect()
+
+def token_url(token):
+    return f"{DEXSCREENER_URL}/{token.chain.lower()}/{token.address}"
+
+def retry_delay(attempt):
+    # Exponential backoff with jitter, so tokens failing together do not come back together
+    delay = min(SCRAPE_RETRY_MAX_DELAY, SCRAPE_RETRY_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.75, 1.25)
+
+def scrape_token(driver, token, periods, extract_mode=TOP_TRADERS_EXTRACT_MODE):
+    # A single attempt, failures are retried by TopTradersPool after a backoff
+    token_traders_data = []
+    with timed('driver_get'):
+        driver.get(token_url(token))
+    wait_for_document_ready(driver, states=READY_STATES)
+
+    # Scroll until the page stops growing
+    scroll_until_settled(driver)
+
+    # Wait for and click the Top Traders button
+    wait = WebDriverWait(driver, 10)
+    with timed('top_traders_button'):
+        top_traders_button = wait.until(
+            EC.element_to_be_clickable((By.CLASS_NAME, "custom-tv0t33"))
+        )
+    if extract_mode == 'network':
+        # Drop everything logged so far, so the next payload belongs to the 30d table
+        drain_payloads(driver)
+    top_traders_button.click()
+
+    if extract_mode != 'network':
+        # Wait for the table rows to stop changing
+        wait_for_rows_settled(driver, f"{TABLE_SELECTOR} {ROW_SELECTOR}", label='top_traders_table')
+
+    for period in periods:
+        if period != '30d':
+            # Find period button
+            period_button = wait.until(
+                EC.presence_of_element_located((By.XPATH, f"//button[.//span[text()='{period}']]"))
+            )
+            if extract_mode == 'network':
+                # The click only has to trigger the request, the table is never read
+                drain_payloads(driver)
+                driver.execute_script("arguments[0].click();", period_button)
             else:
-                balance = '0'
-        
-       # Extract transactions count
-        txns_elements = row.select('.custom-13ppmr2')
-        if txns_elements:
-            txns_text = txns_elements[0].text
-            txns = txns_text.split('/')[1].strip().split()[0] if txns_text else '0'
+                # Click it and wait until the table shows the new period
+                click_and_wait_for_table(driver, period_button, TABLE_SELECTOR, ROW_SELECTOR, label='period_switch')
+
+        if extract_mode == 'network':
+            traders_data = read_payload(driver)
         else:
-            txns = '0'
-        
-        row_data = [rank, wallet, bought, bought_volume, sold, sold_volume, pnl, unrealized, balance, txns]
-        data.append(row_data)
-    
-    return data
-
-async def store_to_database(traders_data):
-    db = Prisma()
-    await db.connect()
+            # Find the table
+            table = wait.until(
+                EC.presence_of_element_located((By.CLASS_NAME, "custom-1vjv7zm"))
+            )
+            traders_data = read_table(driver, table, extract_mode)
+
+        # Add token info and period to each row
+        for row in traders_data:
+            row_data = [token.address, period, *row]
+            token_traders_data.append(row_data)
 
-    for row in traders_data:
+    return token_traders_data
+
+class TopTradersPool:
+    def __init__(self, tokens, workers=SCRAPE_WORKERS, max_concurrency=SCRAPE_MAX_CONCURRENCY,
+                 limiter=page_limiter, periods=PERIODS, extract_mode=TOP_TRADERS_EXTRACT_MODE,
+                 progress=None, on_token=None, max_attempts=SCRAPE_MAX_ATTEMPTS):
+        self.tokens = tokens
+        self.extract_mode = extract_mode
+        self.progress = progress
+        # Called from the worker threads with (token, rows, error) once a token succeeded or ran out of attempts
+        self.on_token = on_token
+        self.workers = max(1, min(workers, len(tokens) or 1))
+        self.periods = periods
+        self.max_attempts = max_attempts
+        # (ready at, order, attempt, index, token), tokens are taken in order and failed ones
+        # come back after their backoff without holding up a worker
+        self.pending = [(0, index, 1, index, token) for index, token in enumerate(tokens, 1)]
+        self.in_flight = 0
+        self.order = len(tokens)
+        self.ready = threading.Condition()
+        self.cookies = load_cookies()
+        self.limiter = limiter
+        self.concurrency = threading.BoundedSemaphore(max_concurrency or self.workers)
+        self.lock = threading.Lock()
+        self.start_time = None
+
+    def next_token(self):
+        # Blocks until a token is due; None once nothing is queued or in flight, or on cancel
+        with self.ready:
+            while not (self.progress and self.progress.cancelled):
+                if self.pending:
+                    delay = self.pending[0][0] - time.monotonic()
+                    if delay <= 0:
+                        _, _, attempt, index, token = heapq.heappop(self.pending)
+                        self.in_flight += 1
+                        return attempt, index, token
+                    self.ready.wait(min(delay, 1))
+                elif self.in_flight:
+                    self.ready.wait(1)
+                else:
+                    return None
+            return None
+
+    def token_done(self, attempt, index, token, error):
+        # Returns True when the token was put back for another attempt
+        with self.ready:
+            self.in_flight -= 1
+            retry = bool(error) and attempt < self.max_attempts
+            SCRAPE_TOKENS.inc(status='retried' if retry else 'failed' if error else 'scraped')
+            if retry:
+                self.order += 1
+                heapq.heappush(self.pending, (time.monotonic() + retry_delay(attempt), self.order, attempt + 1, index, token))
+            self.ready.notify_all()
+        return retry
+
+    def worker(self, worker_id):
+        # Browsers come from the shared warm pool and go back to it afterwards
+        session = sessions.acquire(capture_network=self.extract_mode == 'network')
         try:
-            await db.toptrader.upsert(
-                where={
-                    'tokenAddress_period_rank': {
-                        'tokenAddress': row[0],
-                        'period': row[1],
-                        'rank': int(row[2])
-                    }
-                },
-                data={
-                    'create': {
-                        'tokenAddress': row[0],
-                        'period': row[1],
-                        'rank': int(row[2]),
-                        'wallet': row[3],
-                        'boughtAmount': float(row[4]),
-                        'boughtVolume': float(row[5]),
-                        'soldAmount': float(row[6]),
-                        'soldVolume': float(row[7]),
-                        'pnl': float(row[8]),
-                        'unrealized': row[9],
-                        'balance': row[10],
-                        'transactions': row[11]
-                    },
-                    'update': {
-                        'wallet': row[3],
-                        'boughtAmount': float(row[4]),
-                        'boughtVolume': float(row[5]),
-                        'soldAmount': float(row[6]),
-                        'soldVolume': float(row[7]),
-                        'pnl': float(row[8]),
-                        'unrealized': row[9],
-                        'balance': row[10],
-                        'transactions': row[11]
-                    }
-                }
+            while True:
+                item = self.next_token()
+                if item is None:
+                    break
+                attempt, index, token = item
+
+                with self.concurrency:
+                    self.limiter.wait()
+                    token_start_time = time.time()
+                    if self.progress and attempt == 1:
+                        self.progress.token_started(token.token)
+                    error = None
+                    page = None
+                    try:
+                        session = sessions.renew(session)
+                        session.apply_cookies(token_url(token), self.cookies)
+                        token_traders_data = scrape_token(session.driver, token, self.periods, self.extract_mode)
+                    except Exception as e:
+                        print(f"Worker {worker_id}: error processing token {token.token} (attempt {attempt}/{self.max_attempts}): {str(e)}")
+                        error = str(e)
+                        token_traders_data = []
+                    finally:
+                        page = session.page_loaded()
+
+                if self.token_done(attempt, index, token, error):
+                    continue
+                if self.progress:
+                    self.progress.token_finished(token.token, error)
+                if self.on_token:
+                    self.on_token(token, token_traders_data, error)
+
+                token_time = time.time() - token_start_time
+                total_time = time.time() - self.start_time
+                page_info = f" | Page: {page['bytes'] / 1024:.0f} KB, loaded in {page['loadMs'] / 1000:.2f}s" if page else ""
+                print(f"Worker {worker_id} | Token {index}/{len(self.tokens)}: {token.token} | Time for token: {token_time:.2f}s | Total time: {total_time:.2f}s{page_info}")
+        finally:
+            with self.lock:
+                try:
+                    save_cookies(session.driver)
+                except Exception as e:
+                    print(f"Worker {worker_id}: could not save cookies: {str(e)}")
+            sessions.release(session)
+
+    def run(self):
+        self.start_time = time.time()
+        threads = [
+            threading.Thread(target=self.worker, args=(worker_id,), name=f"scraper-{worker_id}")
+            for worker_id in range(1, self.workers + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+def run_owner(progress=None):
+    # The queue job id when run by a worker, the process otherwise
+    job_id = getattr(progress, 'id', None)
+    return job_id or f"{socket.gethostname()}-{os.getpid()}"
+
+def orphaned(run, now, queue=None):
+    # A running run nobody is working on any more: its heartbeat stopped, or its job ended
+    if run.heartbeatAt is None or run.heartbeatAt < now - timedelta(seconds=JOB_STALE_AFTER):
+        return True
+    job = queue.get(run.owner) if queue and run.owner else None
+    return bool(job and job['status'] in FINISHED_STATUSES)
+
+async def start_run(db, total_tokens, resume=True, owner=None, queue=None):
+    # Takes over the latest run whose owner died before finishing it, with the tokens it already
+    # stored. Runs still heartbeating, cancelled runs and runs split across nodes (distributed.py)
+    # are left alone. The takeover only matches the owner and heartbeat it was read with, so of
+    # two processes starting at once one gets the run and the other starts its own.
+    now = datetime.now(timezone.utc)
+    if resume:
+        runs = await db.scraperun.find_many(
+            where={'status': 'running', 'distributed': False},
+            order={'startedAt': 'desc'}
+        )
+        for run in runs:
+            if not orphaned(run, now, queue):
+                continue
+            adopted = await db.scraperun.update_many(
+                where={'id': run.id, 'status': 'running', 'owner': run.owner, 'heartbeatAt': run.heartbeatAt},
+                data={'owner': owner, 'heartbeatAt': now}
+            )
+            if adopted:
+                checkpoints = await db.scrapecheckpoint.find_many(where={'runId': run.id})
+                return run, {checkpoint.tokenAddress for checkpoint in checkpoints}
+
+    run = await db.scraperun.create(data={
+        'status': 'running', 'totalTokens': total_tokens, 'owner': owner, 'heartbeatAt': now,
+    })
+    return run, set()
+
+async def run_heartbeat(db, run_id, owner):
+    # Keeps other processes from taking the run over while this one scrapes it
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            await db.scraperun.update_many(
+                where={'id': run_id, 'owner': owner},
+                data={'heartbeatAt': datetime.now(timezone.utc)}
             )
         except Exception as e:
-            print(f"Error storing trader data: {str(e)}")
+            print(f"Error renewing run {run_id}: {str(e)}")
 
-    await db.disconnect()
+async def save_checkpoint(db, run_id, token_address, rows):
+    await db.scrapecheckpoint.upsert(
+        where={
+            'runId_tokenAddress': {
+                'runId': run_id,
+                'tokenAddress': token_address
+            }
+        },
+        data={
+            'create': {'runId': run_id, 'tokenAddress': token_address, 'rows': rows},
+            'update': {'rows': rows}
+        }
+    )
 
-async def scrape_top_traders():
-    tokens = await get_tokens()
-    driver = setup_driver()
-    periods = ['30d', '7d', '3d', '1d']
-    all_traders_data = []
-    max_retries = 3
-    retry_delay = 10
+async def finish_run(db, run_id, status, owner):
+    # Nothing happens if another process took the run over meanwhile, it finishes the run itself
+    finished = await db.scraperun.update_many(
+        where={'id': run_id, 'owner': owner, 'status': 'running'},
+        data={'status': status, 'finishedAt': datetime.now(timezone.utc)}
+    )
+    if finished and status == 'completed':
+        await db.scrapecheckpoint.delete_many(where={'runId': run_id})
 
-    start_time = time.time()
-    total_tokens = len(tokens)
+async def write_tokens(db, run_id, rows_queue, progress=None):
+    # Drains finished tokens into the database while the browsers keep scraping.
+    # Failed tokens get no checkpoint, so a resumed run tries them again.
+    while True:
+        item = await rows_queue.get()
+        if item is None:
+            break
+        token, token_traders_data, error = item
+        if error:
+            continue
+        try:
+            written = await store_to_database(token_traders_data, db, strict=True, run_id=run_id)
+            await save_checkpoint(db, run_id, token.address, len(token_traders_data))
+            if progress and written:
+                progress.committed()
+        except Exception as e:
+            print(f"Error storing token {token.token}: {str(e)}")
+            if progress:
+                progress.error(f"{token.token}: {str(e)}")
 
-    cookies = load_cookies()
+async def scrape_tokens(db, run_id, tokens, workers=None, extract_mode=None, progress=None):
+    # Scrapes tokens with the browser pool while the writer stores them, checkpointing each one under run_id
+    loop = asyncio.get_running_loop()
+    rows_queue = asyncio.Queue(maxsize=SCRAPE_QUEUE_SIZE)
 
-    if tokens:
-        url = f"https://dexscreener.com/{tokens[0].chain.lower()}/{tokens[0].address}"
-        driver.get(url)
-    
-        if cookies:
-            for cookie in cookies:
-                driver.add_cookie(cookie)
+    def on_token(token, token_traders_data, error):
+        # Blocks the browser worker while the writer is SCRAPE_QUEUE_SIZE tokens behind
+        asyncio.run_coroutine_threadsafe(rows_queue.put((token, token_traders_data, error)), loop).result()
 
+    pool = TopTradersPool(tokens, workers=workers or SCRAPE_WORKERS,
+                          extract_mode=extract_mode or TOP_TRADERS_EXTRACT_MODE,
+                          progress=progress, on_token=on_token)
+    writer = asyncio.create_task(write_tokens(db, run_id, rows_queue, progress))
     try:
-        for index, token in enumerate(tokens, 1):
-            token_start_time = time.time()
-            token_traders_data = []
-            retries = 0
-            while retries < max_retries:
-                try:
-                    url = f"https://dexscreener.com/{token.chain.lower()}/{token.address}"
-                    driver.get(url)
+        # Selenium blocks, so keep the browser workers off the event loop
+        await asyncio.to_thread(pool.run)
+    finally:
+        await rows_queue.put(None)
+        await writer
+    print(f"Scraped {len(tokens)} tokens with {pool.workers} workers in {time.time() - pool.start_time:.2f}s")
+    return pool
 
-                    wait = WebDriverWait(driver, 60)
-                    wait.until(lambda d: d.execute_script('return document.readyState') == 'complete')
-                    break
-                
-                except Exception as e:
-                    retries += 1
-                    if retries == max_retries:
-                        print(f"Failed to process token {token.token} after {max_retries} attempts")
-                        continue
-                    print(f"Retry {retries}/{max_retries} for token {token.token}")
-                    time.sleep(retry_delay)
-            
-            # Scroll multiple times with longer pauses
-            scroll_height = 0
-            for _ in range(10):
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-                
-                new_height = driver.execute_script("return document.body.scrollHeight")
-                if new_height == scroll_height:
-                    break
-                scroll_height = new_height
-            
-            # Wait for and click the Top Traders button
-            wait = WebDriverWait(driver, 10)
-            top_traders_button = wait.until(
-                EC.element_to_be_clickable((By.CLASS_NAME, "custom-tv0t33"))
-            )
-            top_traders_button.click()
-            
-            # Wait for table to load
-            time.sleep(2)
-            
-            # Update the period button click part in scrape_top_traders function
-            for period in periods:
-                if period != '30d':
-                    # Find period button
-                    period_button = wait.until(
-                        EC.presence_of_element_located((By.XPATH, f"//button[.//span[text()='{period}']]"))
-                    )
-                    # Use JavaScript to click the button
-                    driver.execute_script("arguments[0].click();", period_button)
-                    time.sleep(2)
-                
-                # Find the table
-                table = wait.until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "custom-1vjv7zm"))
-                )
-                
-                # Parse table with BeautifulSoup
-                soup = BeautifulSoup(table.get_attribute('innerHTML'), 'html.parser')
-                traders_data = extract_table_data(soup)
-                
-                # Add token info and period to each row
-                for row in traders_data:
-                    row_data = [token.address, period] + row
-                    token_traders_data.append(row_data)
-                
-            # Store data for this token immediately
-            all_traders_data.extend(token_traders_data)
-                
-            token_time = time.time() - token_start_time
-            total_time = time.time() - start_time
-            print(f"Token {index}/{total_tokens}: {token.token} | Time for token: {token_time:.2f}s | Total time: {total_time:.2f}s")
-            time.sleep(2)
+async def scrape_top_traders(workers=None, extract_mode=None, progress=None, resume=True, select=None):
+    # select(db) returns the tokens to scrape in order, in place of every token minus the fresh ones
+    db = Prisma()
+    await db.connect()
+    try:
+        tokens = await select(db) if select else await get_tokens(db)
+        owner = run_owner(progress)
+        run, stored = await start_run(db, len(tokens), resume, owner, getattr(progress, 'queue', None))
+        fresh = set() if select else await fresh_tokens(db)
+        pending = [token for token in tokens if token.address not in stored and token.address not in fresh]
+        if stored:
+            print(f"Resuming run {run.id}: {len(stored)} tokens already stored, {len(pending)} left")
+        if fresh:
+            print(f"Skipping {len(fresh)} tokens scraped within the last {TOP_TRADERS_FRESH_TTL:.0f}s")
+        if progress:
+            progress.start(len(pending))
+
+        if pending:
+            start_trace(run.id)
+            wait_timings.reset()
+            page_stats.reset()
+            beat = asyncio.create_task(run_heartbeat(db, run.id, owner))
+            try:
+                await scrape_tokens(db, run.id, pending, workers, extract_mode, progress)
+            finally:
+                beat.cancel()
+                tracer.dump()
+            wait_timings.report()
+            page_stats.report()
 
+        await finish_run(db, run.id, 'cancelled' if progress and progress.cancelled else 'completed', owner)
     finally:
-        save_cookies(driver)
-        driver.quit()
-    
-    # Store all data in the database
-    batch_size = 100
-    for i in range(0, len(all_traders_data), batch_size):
-        batch = all_traders_data[i:i + batch_size]
-        await store_to_database(batch)
+        await db.disconnect()
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(scrape_top_traders())
+    # --fresh ignores checkpoints of an interrupted run
+    asyncio.run(scrape_top_traders(resume='--fresh' not in sys.argv))
@@ -0,0 +1,102 @@
+from browser import page_stats, sessions
+from jobs import JOB_HEARTBEAT_INTERVAL, JobQueue, QueuedJob
+from metrics import registry
+from scheduler import Scheduler, scrape_due_tokens
+from toptraders import scrape_top_traders
+import asyncio
+import os
+import socket
+import threading
+import time
+
+# Scraper process: takes jobs off the queue the API writes to and runs them with its own
+# browsers. Start as many as the host has room for Chrome instances.
+
+# Job name -> scraper coroutine, called with progress=
+JOB_TYPES = {
+    'top-traders': scrape_top_traders,
+    'scheduled': scrape_due_tokens,
+}
+# Seconds between queue polls while idle
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '1'))
+# Browsers started with the worker so the first scrape skips Chrome's startup
+BROWSER_WARM = int(os.getenv('BROWSER_WARM', '0'))
+
+class Worker:
+    def __init__(self, queue, worker_id=None):
+        self.queue = queue
+        self.id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.scheduler = Scheduler(queue)
+        self.stop_event = threading.Event()
+        self.job = None
+        self.started_at = time.time()
+
+    def heartbeat(self):
+        # Keeps the running job alive and publishes the browser stats and metrics the API serves
+        while not self.stop_event.wait(JOB_HEARTBEAT_INTERVAL):
+            self.publish()
+
+    def publish(self):
+        job = self.job
+        if job:
+            self.queue.heartbeat(job.id)
+        self.queue.set_state(f"worker:{self.id}", {
+            'browsers': sessions.stats(),
+            'pageStats': page_stats.summary(),
+            # The scrapers' Prometheus metrics, served by the API's /metrics
+            'metrics': registry.export(),
+            'currentJob': job.id if job else None,
+            'startedAt': self.started_at,
+            'seenAt': time.time(),
+        })
+
+    def run_job(self, claimed):
+        job = QueuedJob(self.queue, claimed)
+        func = JOB_TYPES.get(job.name)
+        if func is None:
+            job.error(f"Unknown job type {job.name}")
+            job.finish('failed')
+            return
+        self.job = job
+        print(f"Worker {self.id}: running {job.name} job {job.id}")
+        try:
+            # The scrapers are coroutines that block on Selenium, so each job gets its own event loop
+            asyncio.run(func(progress=job))
+            job.finish('cancelled' if job.cancelled else 'completed')
+        except KeyboardInterrupt:
+            job.finish('cancelled')
+            raise
+        except Exception as e:
+            job.error(str(e))
+            job.finish('failed')
+        finally:
+            self.job = None
+
+    def run(self):
+        if BROWSER_WARM:
+            sessions.warm(BROWSER_WARM)
+        self.scheduler.start()
+        threading.Thread(target=self.heartbeat, name='worker-heartbeat', daemon=True).start()
+        self.publish()
+        print(f"Worker {self.id} waiting for jobs in {self.queue.path}")
+        try:
+            while not self.stop_event.is_set():
+                claimed = self.queue.claim(self.id)
+                if claimed is None:
+                    self.stop_event.wait(WORKER_POLL_INTERVAL)
+                    continue
+                self.run_job(claimed)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        self.scheduler.stop()
+        sessions.close()
+
+if __name__ == "__main__":
+    worker = Worker(JobQueue())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        print(f"Worker {worker.id} stopped")